@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+
+
+class AudioRingBuffer:
+    """Fixed-capacity float32 ring buffer addressed by absolute sample positions.
+
+    `write_pos` counts every sample ever written and never wraps, so readers can
+    keep absolute offsets (e.g. "last processed sample") that stay valid while
+    the underlying storage is reused. Only the most recent `capacity` samples
+    are retained.
+    """
+
+    def __init__(self, capacity, dtype=np.float32):
+        self.capacity = int(capacity)
+        if self.capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive")
+        self._data = np.zeros(self.capacity, dtype=dtype)
+        self._lock = threading.Lock()
+        self.write_pos = 0
+
+    def __len__(self):
+        return min(self.write_pos, self.capacity)
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def start_pos(self):
+        # Oldest absolute position still held in the buffer
+        return max(0, self.write_pos - self.capacity)
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=self._data.dtype).reshape(-1)
+        n = samples.shape[0]
+        if n == 0:
+            return
+        with self._lock:
+            if n >= self.capacity:
+                # Only the tail survives; lay it out so it ends at the new cursor
+                tail = samples[-self.capacity:]
+                split = (self.write_pos + n) % self.capacity
+                self._data[split:] = tail[:self.capacity - split]
+                self._data[:split] = tail[self.capacity - split:]
+            else:
+                idx = self.write_pos % self.capacity
+                first = min(n, self.capacity - idx)
+                self._data[idx:idx + first] = samples[:first]
+                if first < n:
+                    self._data[:n - first] = samples[first:]
+            self.write_pos += n
+
+    def read(self, start, length, out=None):
+        """Return samples [start, start + length) by absolute position.
+
+        Without `out`, a contiguous window is returned as a view into the ring
+        (zero-copy) and a wrapped window as a fresh array. With `out`, the
+        window is copied into the caller's preallocated array, which is the
+        safe choice when the result outlives the next `write`.
+        """
+        length = int(length)
+        with self._lock:
+            if start < self.start_pos:
+                raise ValueError(f"Samples from {start} were already overwritten (oldest is {self.start_pos})")
+            if start + length > self.write_pos:
+                raise ValueError(f"Samples up to {start + length} not written yet (cursor is {self.write_pos})")
+            idx = start % self.capacity
+            first = min(length, self.capacity - idx)
+            if out is None:
+                if first == length:
+                    return self._data[idx:idx + length]
+                out = np.empty(length, dtype=self._data.dtype)
+            else:
+                out = out[:length]
+            out[:first] = self._data[idx:idx + first]
+            if first < length:
+                out[first:] = self._data[:length - first]
+            return out
+
+    def latest(self, length, out=None):
+        length = min(int(length), len(self))
+        return self.read(self.write_pos - length, length, out=out)
+
+    def clear(self):
+        with self._lock:
+            self.write_pos = 0
@@ -0,0 +1,108 @@
+import numpy as np
+
+AUDIO_FORMATS = ("pcm16", "float32", "opus")
+# Opus always decodes at one of its native rates; 48 kHz is what browsers encode
+OPUS_SAMPLE_RATE = 48000
+# Largest Opus frame (120 ms at 48 kHz)
+OPUS_MAX_FRAME = 5760
+
+
+class StreamingResampler:
+    """Resamples a chunked stream to `out_rate` without discontinuities at chunk edges.
+
+    Downsampling first runs a windowed-sinc low-pass at the input rate, then
+    output samples are linearly interpolated at fractional input positions.
+    Filter history and the fractional read position carry over between
+    chunks, so chunk sizes do not have to line up with the rate ratio.
+    """
+
+    def __init__(self, in_rate, out_rate, taps=63):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        self.step = in_rate / out_rate
+        self.passthrough = in_rate == out_rate
+        self.kernel = None
+        if in_rate > out_rate:
+            cutoff = 0.9 * out_rate / in_rate
+            n = np.arange(taps) - (taps - 1) / 2
+            kernel = cutoff * np.sinc(cutoff * n) * np.hamming(taps)
+            self.kernel = (kernel / kernel.sum()).astype(np.float32)
+            self.history = np.zeros(taps - 1, dtype=np.float32)
+        # Next output position relative to the start of the next chunk, and the
+        # last filtered sample so interpolation can reach across the chunk edge
+        self.position = 0.0
+        self.previous = np.float32(0.0)
+
+    def process(self, samples):
+        if self.passthrough or samples.size == 0:
+            return samples
+        if self.kernel is not None:
+            padded = np.concatenate((self.history, samples))
+            filtered = np.convolve(padded, self.kernel, mode="valid").astype(np.float32, copy=False)
+            self.history = padded[-(self.kernel.size - 1):]
+        else:
+            filtered = samples
+
+        last = filtered.size - 1
+        if self.position > last:
+            self.position -= filtered.size
+            self.previous = filtered[-1]
+            return np.empty(0, dtype=np.float32)
+        count = int((last - self.position) // self.step) + 1
+        positions = self.position + self.step * np.arange(count)
+        # Index 0 of `extended` is the previous chunk's last sample (position -1)
+        extended = np.concatenate(([self.previous], filtered))
+        out = np.interp(positions + 1, np.arange(extended.size), extended).astype(np.float32)
+        self.position = positions[-1] + self.step - filtered.size
+        self.previous = filtered[-1]
+        return out
+
+
+class ClientAudioDecoder:
+    """Decodes binary WebSocket frames from the browser into mono float32 at `target_rate`.
+
+    PCM frames are viewed with np.frombuffer, so no Python lists are built;
+    bytes that do not complete a sample frame are carried to the next message.
+    Opus frames (one packet per message) need the optional `opuslib` package.
+    """
+
+    def __init__(self, audio_format="pcm16", sample_rate=16000, channels=1, target_rate=16000):
+        if audio_format not in AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format '{audio_format}', expected one of {AUDIO_FORMATS}")
+        self.format = audio_format
+        self.channels = max(1, int(channels))
+        self.opus = None
+        if audio_format == "opus":
+            try:
+                import opuslib
+            except ImportError:
+                raise ImportError("Opus audio requires the 'opuslib' package")
+            self.opus = opuslib.Decoder(OPUS_SAMPLE_RATE, self.channels)
+            sample_rate = OPUS_SAMPLE_RATE
+        self.sample_rate = int(sample_rate)
+        self.sample_width = 4 if audio_format == "float32" else 2
+        self.frame_bytes = self.sample_width * self.channels
+        self.pending = b""
+        self.resampler = StreamingResampler(self.sample_rate, target_rate)
+
+    def decode(self, payload):
+        if self.opus is not None:
+            payload = self.opus.decode(bytes(payload), OPUS_MAX_FRAME)
+        elif self.pending:
+            payload = self.pending + payload
+            self.pending = b""
+
+        usable = len(payload) - len(payload) % self.frame_bytes
+        if usable < len(payload):
+            self.pending = bytes(payload[usable:])
+        if usable == 0:
+            return np.empty(0, dtype=np.float32)
+
+        if self.sample_width == 4:
+            samples = np.frombuffer(payload, dtype="<f4", count=usable // 4)
+        else:
+            samples = np.frombuffer(payload, dtype="<i2", count=usable // 2).astype(np.float32)
+            samples *= 1.0 / 32768.0
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1, dtype=np.float32)
+        return self.resampler.process(samples)
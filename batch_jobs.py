@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import uuid
+import wave
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+from audio_ingest import ClientAudioDecoder
+from vad import SpeechSegmenter, make_vad
+from worker_pool import WorkerPoolBusy
+
+logger = logging.getLogger(__name__)
+
+# Seconds of audio read from the file per step
+READ_BLOCK_SECONDS = 1.0
+UPLOAD_CHUNK = 1 << 20
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+
+
+async def read_audio_blocks(path, sample_rate=16000, block_seconds=READ_BLOCK_SECONDS):
+    """Yield mono float32 blocks at `sample_rate` without loading the whole file.
+
+    16-bit PCM WAV files are read directly; anything else is decoded by an
+    ffmpeg subprocess whose output is consumed as it is produced.
+    """
+    try:
+        reader = wave.open(path, "rb")
+    except (wave.Error, EOFError):
+        reader = None
+    if reader is not None and reader.getsampwidth() == 2 and reader.getcomptype() == "NONE":
+        with reader:
+            decoder = ClientAudioDecoder("pcm16", reader.getframerate(), reader.getnchannels(), target_rate=sample_rate)
+            frames = max(1, int(reader.getframerate() * block_seconds))
+            while True:
+                payload = await asyncio.to_thread(reader.readframes, frames)
+                if not payload:
+                    return
+                yield decoder.decode(payload)
+    if reader is not None:
+        reader.close()
+
+    process = await asyncio.create_subprocess_exec(
+        "ffmpeg", "-nostdin", "-loglevel", "error", "-i", path,
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-",
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    decoder = ClientAudioDecoder("pcm16", sample_rate, 1, target_rate=sample_rate)
+    block_bytes = int(sample_rate * block_seconds) * 2
+    try:
+        while True:
+            try:
+                payload = await process.stdout.readexactly(block_bytes)
+            except asyncio.IncompleteReadError as e:
+                payload = e.partial
+            if not payload:
+                break
+            yield decoder.decode(payload)
+        stderr = await process.stderr.read()
+        if await process.wait() != 0:
+            raise ValueError(f"Could not decode audio: {stderr.decode(errors='replace').strip()}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+
+def wav_duration(path):
+    try:
+        with wave.open(path, "rb") as reader:
+            return reader.getnframes() / reader.getframerate()
+    except (wave.Error, EOFError):
+        return None
+
+
+class TranscriptionJob:
+    def __init__(self, filename):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.duration = None
+        self.seconds_read = 0.0
+        self.reading = True
+        self.utterances_queued = 0
+        self.utterances_done = 0
+        self.segments = []
+        self.subscribers = set()
+        self.task = None
+
+    @property
+    def progress(self):
+        if self.status == "completed":
+            return 1.0
+        if not self.utterances_queued:
+            return 0.0
+        read = 1.0 if not self.reading else (self.seconds_read / self.duration if self.duration else 0.0)
+        return min(read, 1.0) * self.utterances_done / self.utterances_queued
+
+    def summary(self):
+        elapsed = (self.finished or time.time()) - self.started if self.started else 0.0
+        return {
+            "jobId": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "progress": round(self.progress, 4),
+            "duration": self.duration,
+            "secondsRead": round(self.seconds_read, 2),
+            "utterancesQueued": self.utterances_queued,
+            "utterancesDone": self.utterances_done,
+            "elapsed": round(elapsed, 2),
+            "realTimeFactor": round(elapsed / self.seconds_read, 4) if self.seconds_read and not self.reading else None,
+        }
+
+    def result(self):
+        segments = sorted(self.segments, key=lambda segment: segment["start"])
+        return {
+            **self.summary(),
+            "segments": segments,
+            "text": " ".join(segment["text"] for segment in segments),
+        }
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+class BatchTranscriber:
+    """Runs uploaded recordings through the shared inference path as background jobs.
+
+    Uploads are streamed to a temporary file, read back block by block and
+    split into utterances with the VAD segmenter. Up to `max_parallel`
+    utterances per job are in flight at once (which also bounds how far
+    reading runs ahead), so the scheduler can batch them or the worker pool
+    can spread them across processes. Segment timestamps are relative to the
+    start of the file. At most `max_jobs` jobs run at a time; finished jobs
+    are kept for `ttl` seconds.
+    """
+
+    def __init__(self, infer, sample_rate=16000, vad_backend="energy", max_parallel=16, max_jobs=2,
+                 upload_dir=None, max_upload_bytes=1 << 30, ttl=3600.0, min_speech=0.25, hangover=0.5,
+                 padding=0.2, max_utterance=25.0):
+        self.infer = infer
+        self.sample_rate = sample_rate
+        self.vad_backend = vad_backend
+        self.max_parallel = max_parallel
+        self.upload_dir = upload_dir or None
+        self.max_upload_bytes = max_upload_bytes
+        self.ttl = ttl
+        self.segmenter_options = {
+            "min_speech": min_speech,
+            "hangover": hangover,
+            "padding": padding,
+            "max_utterance": max_utterance,
+        }
+        self.jobs = {}
+        self._running = asyncio.Semaphore(max_jobs)
+
+    async def submit(self, chunks, filename="upload"):
+        """Store an upload given as an async iterator of byte chunks and queue its job."""
+        if self.upload_dir:
+            os.makedirs(self.upload_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix="job_", suffix=os.path.splitext(filename)[1], dir=self.upload_dir)
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_upload_bytes:
+                        raise ValueError(f"Upload exceeds {self.max_upload_bytes} bytes")
+                    await asyncio.to_thread(f.write, chunk)
+            if size == 0:
+                raise ValueError("Empty upload")
+        except BaseException:
+            os.remove(path)
+            raise
+
+        self._purge()
+        job = TranscriptionJob(filename)
+        job.duration = wav_duration(path)
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, path))
+        logger.info(f"Queued transcription job {job.id} ({filename}, {size} bytes)")
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None or job.status not in ("queued", "running"):
+            return False
+        job.task.cancel()
+        return True
+
+    def subscribe(self, job):
+        queue = asyncio.Queue()
+        job.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, job, queue):
+        job.subscribers.discard(queue)
+
+    def _purge(self):
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished and now - job.finished > self.ttl:
+                del self.jobs[job_id]
+
+    async def _run(self, job, path):
+        try:
+            async with self._running:
+                job.status = "running"
+                job.started = time.time()
+                job.publish({"type": "progress", **job.summary()})
+                await self._transcribe(job, path)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"Transcription job {job.id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished = time.time()
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            logger.info(f"Transcription job {job.id} {job.status} ({job.seconds_read:.1f}s of audio "
+                        f"in {job.finished - (job.started or job.created):.1f}s)")
+            job.publish({"type": "done", **job.summary()})
+
+    async def _transcribe(self, job, path):
+        # Sized so an utterance is still in the buffer when a decode slot frees up
+        max_utterance = self.segmenter_options["max_utterance"]
+        buffer = AudioRingBuffer(int(self.sample_rate * (max_utterance + 30)))
+        segmenter = SpeechSegmenter(make_vad(self.vad_backend, self.sample_rate), self.sample_rate, **self.segmenter_options)
+        slots = asyncio.Semaphore(self.max_parallel)
+        tasks = []
+
+        async def dispatch(start, end):
+            await slots.acquire()
+            # Copy out before reading on, the ring buffer reuses this memory
+            audio = buffer.read(start, end - start).copy()
+            job.utterances_queued += 1
+            tasks.append(asyncio.create_task(self._decode(job, start, audio, slots)))
+
+        try:
+            async for block in read_audio_blocks(path, self.sample_rate):
+                buffer.write(block)
+                job.seconds_read = buffer.write_pos / self.sample_rate
+                for start, end in segmenter.process(buffer):
+                    await dispatch(start, end)
+            for start, end in segmenter.flush():
+                await dispatch(start, end)
+            job.reading = False
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _decode(self, job, start, audio, slots):
+        try:
+            peak = np.abs(audio).max()
+            if peak > 0:
+                audio *= 1.0 / peak
+            while True:
+                try:
+                    result = await self.infer(f"job:{job.id}", audio)
+                    break
+                except WorkerPoolBusy:
+                    # Live sessions come first; wait for the pool instead of failing the job
+                    await asyncio.sleep(0.5)
+
+            offset = start / self.sample_rate
+            segments = result.get("segments") or []
+            if not segments and result["text"].strip():
+                segments = [{"start": 0.0, "end": len(audio) / self.sample_rate, "text": result["text"]}]
+            for segment in segments:
+                text = segment["text"].strip()
+                if not text:
+                    continue
+                entry = {
+                    # Decode order, so event subscribers can tell replayed segments from new ones
+                    "index": len(job.segments),
+                    "start": round(offset + segment["start"], 2),
+                    "end": round(offset + segment["end"], 2),
+                    "text": text,
+                }
+                job.segments.append(entry)
+                job.publish({"type": "segment", **entry})
+            job.utterances_done += 1
+            job.publish({"type": "progress", **job.summary()})
+        finally:
+            slots.release()
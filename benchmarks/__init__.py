@@ -0,0 +1,2 @@
+# Benchmarks for the transcription server. Run from the repository root, e.g.
+#   python -m benchmarks.bench_audio_buffer
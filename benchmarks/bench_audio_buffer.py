@@ -0,0 +1,73 @@
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = SAMPLE_RATE * 3
+BUFFER_DURATION = 10
+BLOCK_SIZE = SAMPLE_RATE // 2
+
+
+def bench_callbacks(write, blocks):
+    timings = []
+    for block in blocks:
+        start = time.perf_counter()
+        write(block)
+        timings.append(time.perf_counter() - start)
+    return np.array(timings)
+
+
+def bench_deque(blocks, extractions):
+    buffer = deque(maxlen=SAMPLE_RATE * BUFFER_DURATION)
+    callback_times = bench_callbacks(lambda block: buffer.extend(block[:, 0]), blocks)
+
+    extract_times = []
+    for _ in range(extractions):
+        start = time.perf_counter()
+        buffer_list = list(buffer)
+        np.array(buffer_list[0:CHUNK_SIZE], dtype=np.float32)
+        extract_times.append(time.perf_counter() - start)
+    return callback_times, np.array(extract_times)
+
+
+def bench_ring(blocks, extractions):
+    buffer = AudioRingBuffer(SAMPLE_RATE * BUFFER_DURATION)
+    window = np.zeros(CHUNK_SIZE, dtype=np.float32)
+    callback_times = bench_callbacks(lambda block: buffer.write(block[:, 0]), blocks)
+
+    extract_times = []
+    for _ in range(extractions):
+        start = time.perf_counter()
+        buffer.read(buffer.start_pos, CHUNK_SIZE, out=window)
+        extract_times.append(time.perf_counter() - start)
+    return callback_times, np.array(extract_times)
+
+
+def report(name, callback_times, extract_times):
+    print(f"{name:>6}: callback mean {callback_times.mean() * 1e6:8.1f} us  "
+          f"p99 {np.percentile(callback_times, 99) * 1e6:8.1f} us | "
+          f"extract mean {extract_times.mean() * 1e3:8.3f} ms  "
+          f"p99 {np.percentile(extract_times, 99) * 1e3:8.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare deque and ring buffer audio paths")
+    parser.add_argument("--seconds", type=int, default=120, help="Seconds of audio pushed through callbacks")
+    parser.add_argument("--extractions", type=int, default=200, help="Number of chunk extractions to time")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n_blocks = args.seconds * SAMPLE_RATE // BLOCK_SIZE
+    # sounddevice hands the callback (frames, channels) float32 arrays
+    blocks = [rng.standard_normal((BLOCK_SIZE, 1)).astype(np.float32) * 0.1 for _ in range(n_blocks)]
+
+    report("deque", *bench_deque(blocks, args.extractions))
+    report("ring", *bench_ring(blocks, args.extractions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE, load_corpus, word_errors
+from inference_backends import BACKENDS
+
+# Decode fixtures in whole model windows so every backend sees identical input
+WINDOW = SAMPLE_RATE * 30
+
+
+def run_backend(name, model_name, device, compute_type, threads, corpus, batch_size):
+    backend_class = BACKENDS[name]
+    compute_type = compute_type or backend_class.default_compute_type(device)
+    started = time.perf_counter()
+    backend = backend_class(model_name, device, compute_type, threads=threads).load()
+    load_seconds = time.perf_counter() - started
+
+    # Warm-up so the first fixture does not carry one-off allocation costs
+    backend.decode_batch([np.zeros(SAMPLE_RATE, dtype=np.float32)], [None])
+
+    audio_seconds = 0.0
+    decode_seconds = 0.0
+    errors = 0
+    words = 0
+    for _, audio, reference in corpus:
+        windows = [audio[start:start + WINDOW] for start in range(0, len(audio), WINDOW)]
+        texts = []
+        started = time.perf_counter()
+        for start in range(0, len(windows), batch_size):
+            batch = windows[start:start + batch_size]
+            texts.extend(result["text"] for result in backend.decode_batch(batch, [None] * len(batch)))
+        decode_seconds += time.perf_counter() - started
+        audio_seconds += len(audio) / SAMPLE_RATE
+        if reference:
+            file_errors, file_words = word_errors(reference, " ".join(texts))
+            errors += file_errors
+            words += file_words
+
+    return {
+        "backend": name,
+        "model": model_name,
+        "device": device,
+        "compute_type": compute_type,
+        "threads": threads,
+        "load_seconds": load_seconds,
+        "audio_seconds": audio_seconds,
+        "decode_seconds": decode_seconds,
+        "rtf": decode_seconds / audio_seconds if audio_seconds else None,
+        "wer": errors / words if words else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inference backends on a local audio corpus")
+    parser.add_argument("corpus", help="Directory of .wav files with matching .txt references")
+    parser.add_argument("--backends", nargs="+", default=sorted(BACKENDS), choices=sorted(BACKENDS))
+    parser.add_argument("--model", default="base.en")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--compute-type", default=None, help="Override the backend's default compute type")
+    parser.add_argument("--threads", type=int, nargs="+", default=[None], help="Thread counts to sweep")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = list(load_corpus(args.corpus))
+    if not corpus:
+        print("No WAV files found")
+        return
+
+    results = []
+    for name in args.backends:
+        for threads in args.threads:
+            try:
+                result = run_backend(name, args.model, args.device, args.compute_type, threads, corpus, args.batch_size)
+            except Exception as e:
+                print(f"{name} (threads={threads}): skipped, {e}")
+                continue
+            results.append(result)
+            wer = f"{result['wer']:.3f}" if result["wer"] is not None else "n/a"
+            print(f"{name:>15} threads={threads or 'default':>7} {result['compute_type']:>12}: "
+                  f"RTF {result['rtf']:.3f}  WER {wer}  load {result['load_seconds']:.1f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import argparse
+import time
+
+from audio_buffer import AudioRingBuffer
+from benchmarks.bench_vad import BLOCK_SIZE
+from benchmarks.common import SAMPLE_RATE, load_corpus
+from diarization import OnlineDiarizer
+from vad import SpeechSegmenter, VAD_BACKENDS, make_vad
+
+
+def replay(audio, backend, max_speakers, threshold):
+    """Diarize VAD utterances as the server does; returns (utterances, speakers, cpu_seconds)."""
+    segmenter = SpeechSegmenter(make_vad(backend, SAMPLE_RATE), SAMPLE_RATE)
+    buffer = AudioRingBuffer(SAMPLE_RATE * 30)
+    diarizer = OnlineDiarizer(SAMPLE_RATE, max_speakers=max_speakers, threshold=threshold)
+    labels = []
+    cpu = 0.0
+
+    def assign(utterances):
+        nonlocal cpu
+        for start, end in utterances:
+            segment = buffer.read(start, end - start)
+            started = time.process_time()
+            labels.append((start, end, diarizer.assign(segment)))
+            cpu += time.process_time() - started
+
+    for start in range(0, len(audio), BLOCK_SIZE):
+        buffer.write(audio[start:start + BLOCK_SIZE])
+        assign(segmenter.process(buffer))
+    assign(segmenter.flush())
+    return labels, diarizer, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the CPU cost of online speaker diarization")
+    parser.add_argument("corpus", help="Directory of .wav recordings")
+    parser.add_argument("--backend", default="energy", choices=sorted(VAD_BACKENDS))
+    parser.add_argument("--max-speakers", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=0.55)
+    parser.add_argument("--turns", action="store_true", help="Print each utterance's speaker")
+    args = parser.parse_args()
+
+    total_audio = total_cpu = 0.0
+    for name, audio, _ in load_corpus(args.corpus):
+        labels, diarizer, cpu = replay(audio, args.backend, args.max_speakers, args.threshold)
+        seconds = len(audio) / SAMPLE_RATE
+        total_audio += seconds
+        total_cpu += cpu
+        stats = diarizer.stats()
+        print(f"{name}: {seconds:.1f}s, {len(labels)} utterances, {stats['speakers']} speakers "
+              f"(seconds {stats['seconds']}), CPU {cpu * 60 / max(seconds, 1e-9) * 1000:.1f} ms per audio minute")
+        if args.turns:
+            for start, end, speaker in labels:
+                print(f"  {start / SAMPLE_RATE:7.2f}-{end / SAMPLE_RATE:7.2f}  speaker {speaker}")
+
+    if not total_audio:
+        print("No WAV files found")
+        return
+    print(f"Diarization CPU: {total_cpu * 60 / total_audio * 1000:.1f} ms per audio minute "
+          f"({total_cpu / total_audio:.2%} of one core)")
+
+
+if __name__ == "__main__":
+    main()
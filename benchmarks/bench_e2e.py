@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.common import SAMPLE_RATE, load_corpus, word_errors
+from benchmarks.stub_llm import start_stub_llm
+
+ROOT = Path(__file__).resolve().parent.parent
+# Audio is sent the way a browser AudioWorklet would, in 100 ms frames
+FRAME_SECONDS = 0.1
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+def process_usage(pid):
+    """(cpu_seconds, rss_bytes) of a process, from psutil or /proc."""
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        times = process.cpu_times()
+        return times.user + times.system, process.memory_info().rss
+    except ImportError:
+        pass
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/status") as f:
+        rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+    return cpu, rss
+
+
+def scrape_histogram(base_url, name):
+    """(sum, count) of a histogram on the server's /metrics, over all label sets."""
+    with urllib.request.urlopen(f"{base_url}/metrics", timeout=10) as response:
+        text = response.read().decode()
+    total = count = 0.0
+    for line in text.splitlines():
+        if line.startswith(f"{name}_sum"):
+            total += float(line.rsplit(" ", 1)[1])
+        elif line.startswith(f"{name}_count"):
+            count += float(line.rsplit(" ", 1)[1])
+    return total, count
+
+
+def wait_until_ready(base_url, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/ready", timeout=5) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        time.sleep(1.0)
+    raise RuntimeError(f"Server was not ready after {timeout}s")
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_session(index, url, name, audio, reference, mode, speed, tail, stop_timeout):
+    import websockets
+
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+    frame_bytes = int(SAMPLE_RATE * FRAME_SECONDS) * 2
+    messages = []
+    started_event = asyncio.Event()
+    analysis_event = asyncio.Event()
+
+    async with websockets.connect(url, max_size=None) as websocket:
+        async def receive():
+            async for raw in websocket:
+                message = json.loads(raw)
+                message["_received"] = time.perf_counter()
+                messages.append(message)
+                if message["type"] == "started":
+                    started_event.set()
+                elif message["type"] in ("final_analysis", "error") and stop_sent is not None:
+                    analysis_event.set()
+
+        stop_sent = None
+        receiver = asyncio.create_task(receive())
+        await websocket.send(json.dumps({
+            "command": "start",
+            "source": "client",
+            "format": "pcm16",
+            "sampleRate": SAMPLE_RATE,
+            "channels": 1,
+            "mode": mode,
+        }))
+        await asyncio.wait_for(started_event.wait(), 30)
+
+        # Positions in server messages count samples since this point
+        started = time.perf_counter()
+        for offset in range(0, len(pcm), frame_bytes):
+            delay = started + offset / 2 / SAMPLE_RATE / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await websocket.send(pcm[offset:offset + frame_bytes])
+        audio_end = time.perf_counter()
+
+        await asyncio.sleep(tail)
+        stop_sent = time.perf_counter()
+        await websocket.send(json.dumps({"command": "stop"}))
+        try:
+            await asyncio.wait_for(analysis_event.wait(), stop_timeout)
+        except asyncio.TimeoutError:
+            pass
+        receiver.cancel()
+
+    transcripts = [message for message in messages if message["type"] in ("transcription", "final")]
+    latencies = [
+        message["_received"] - (started + message["end"] / speed)
+        for message in transcripts
+        if message.get("end") is not None
+    ]
+    analysis = next((message for message in messages if message["type"] == "final_analysis"), None)
+    text = " ".join(message["text"] for message in transcripts)
+    errors, words = word_errors(reference, text) if reference else (None, None)
+    return {
+        "session": index,
+        "fixture": name,
+        "audio_seconds": len(audio) / SAMPLE_RATE,
+        "messages": len(transcripts),
+        "word_latency_p50": percentile(latencies, 50),
+        "word_latency_p95": percentile(latencies, 95),
+        "drain_lag": (transcripts[-1]["_received"] - audio_end) if transcripts else None,
+        "stop_to_analysis": (analysis["_received"] - stop_sent) if analysis else None,
+        "errors": errors,
+        "reference_words": words,
+        "wer": errors / words if words else None,
+        "server_errors": [message["message"] for message in messages if message["type"] == "error"],
+    }
+
+
+async def monitor_rss(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(process_usage(pid)[1])
+        try:
+            await asyncio.wait_for(stop.wait(), 0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args, corpus, ws_url, pid):
+    rss_samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_rss(pid, rss_samples, stop)) if pid else None
+
+    async def session(index):
+        await asyncio.sleep(index * args.stagger)
+        name, audio, reference = corpus[index % len(corpus)]
+        return await run_session(index, ws_url, name, audio, reference, args.mode, args.speed, args.tail, args.stop_timeout)
+
+    results = await asyncio.gather(*(session(index) for index in range(args.sessions)), return_exceptions=True)
+    stop.set()
+    if monitor:
+        await monitor
+    return results, rss_samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAV fixtures through simulated WebSocket clients end to end")
+    parser.add_argument("corpus", help="Directory of .wav files with matching .txt references")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent simulated clients")
+    parser.add_argument("--mode", choices=("overlap", "streaming", "vad"), default="overlap")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed relative to real time")
+    parser.add_argument("--stagger", type=float, default=0.5, help="Seconds between session starts")
+    parser.add_argument("--tail", type=float, default=3.0, help="Seconds to wait after the audio before 'stop'")
+    parser.add_argument("--stop-timeout", type=float, default=120.0)
+    parser.add_argument("--url", help="Existing server, e.g. http://localhost:8000 (default: start one)")
+    parser.add_argument("--server-pid", type=int, help="PID of an existing server for CPU and RSS figures")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the server this benchmark starts")
+    parser.add_argument("--model", default="base.en")
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="Stub LLM delay before each reply")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    try:
+        import websockets  # noqa: F401
+    except ImportError:
+        print("The end-to-end benchmark needs the 'websockets' package")
+        return
+
+    corpus = list(load_corpus(args.corpus))
+    if not corpus:
+        print("No WAV files found")
+        return
+
+    stub, llm_url = start_stub_llm(delay=args.llm_delay)
+    process = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        pid = args.server_pid
+        print(f"Using {base_url}; it must run with LLM_BASE_URL={llm_url}")
+    else:
+        base_url = f"http://127.0.0.1:{args.port}"
+        env = {
+            **os.environ,
+            "LLM_BASE_URL": llm_url,
+            "OPENROUTER_API_KEY": "stub",
+            "WHISPER_MODEL": args.model,
+            # Every session replays the same fixtures; cached reports would hide LLM time
+            "EMR_CACHE_SIZE": "0",
+            "EMR_CACHE_DB": "",
+        }
+        process = subprocess.Popen(
+            [sys.executable, "transcription_server.py", "--port", str(args.port), "--host", "127.0.0.1"],
+            cwd=ROOT,
+            env=env,
+        )
+        pid = process.pid
+
+    try:
+        wait_until_ready(base_url, process, args.startup_timeout)
+        ws_url = base_url.replace("http", "ws", 1) + "/transcription"
+        rtf_before = scrape_histogram(base_url, "transcription_window_rtf")
+        cpu_before = process_usage(pid)[0] if pid else None
+        rss_before = process_usage(pid)[1] if pid else None
+
+        started = time.perf_counter()
+        results, rss_samples = asyncio.run(run_load(args, corpus, ws_url, pid))
+        wall_seconds = time.perf_counter() - started
+
+        rtf_after = scrape_histogram(base_url, "transcription_window_rtf")
+        cpu_seconds = process_usage(pid)[0] - cpu_before if pid else None
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+        stub.shutdown()
+
+    sessions = [result for result in results if isinstance(result, dict)]
+    failures = [repr(result) for result in results if not isinstance(result, dict)]
+    windows = rtf_after[1] - rtf_before[1]
+    errors = sum(session["errors"] or 0 for session in sessions)
+    words = sum(session["reference_words"] or 0 for session in sessions)
+    summary = {
+        "sessions": len(sessions),
+        "failed_sessions": len(failures),
+        "wall_seconds": wall_seconds,
+        "audio_seconds": sum(session["audio_seconds"] for session in sessions),
+        "window_rtf_mean": (rtf_after[0] - rtf_before[0]) / windows if windows else None,
+        "word_latency_p50": percentile([s["word_latency_p50"] for s in sessions if s["word_latency_p50"] is not None], 50),
+        "word_latency_p95": percentile([s["word_latency_p95"] for s in sessions if s["word_latency_p95"] is not None], 95),
+        "stop_to_analysis_p50": percentile([s["stop_to_analysis"] for s in sessions if s["stop_to_analysis"] is not None], 50),
+        "stop_to_analysis_p95": percentile([s["stop_to_analysis"] for s in sessions if s["stop_to_analysis"] is not None], 95),
+        "wer": errors / words if words else None,
+        "cpu_seconds_per_session": cpu_seconds / args.sessions if cpu_seconds is not None else None,
+        "rss_bytes_per_session": (max(rss_samples) - rss_before) / args.sessions if rss_samples else None,
+        "peak_rss_bytes": max(rss_samples) if rss_samples else None,
+    }
+
+    for name, value in summary.items():
+        print(f"{name:>24}: {value:.4f}" if isinstance(value, float) else f"{name:>24}: {value}")
+    for failure in failures:
+        print(f"session failed: {failure}")
+
+    if args.output:
+        report = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "summary": summary,
+            "sessions": sessions,
+            "failures": failures,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import time
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+from benchmarks.bench_vad import BLOCK_SIZE
+from benchmarks.common import SAMPLE_RATE, load_corpus
+from mel_features import IncrementalLogMel, log_mel_spectrogram
+
+
+def full_front_end(n_mels):
+    """The per-window front end the decoder runs: whisper's own if installed, else the numpy equivalent."""
+    try:
+        import torch
+        import whisper
+    except ImportError:
+        return "numpy", lambda audio: log_mel_spectrogram(audio, n_mels)
+    return "whisper", lambda audio: whisper.log_mel_spectrogram(
+        whisper.pad_or_trim(torch.from_numpy(audio)), n_mels=n_mels
+    ).numpy()
+
+
+def replay(audio, chunk, overlap, n_mels, full):
+    """Feed `audio` through the ring buffer and build every overlap window's input both ways.
+
+    Returns (windows, full_cpu_seconds, incremental_cpu_seconds, max_difference).
+    """
+    chunk_size = int(chunk * SAMPLE_RATE)
+    hop = max(round(chunk_size * (1 - overlap)), 1)
+    buffer = AudioRingBuffer(SAMPLE_RATE * 30)
+    features = IncrementalLogMel(buffer.capacity, n_mels)
+    window = np.zeros(chunk_size, dtype=np.float32)
+    full_cpu = incremental_cpu = difference = 0.0
+    windows = 0
+    last_processed = 0
+
+    for start in range(0, len(audio), BLOCK_SIZE):
+        buffer.write(audio[start:start + BLOCK_SIZE])
+        while buffer.write_pos - last_processed >= chunk_size:
+            buffer.read(last_processed, chunk_size, out=window)
+            peak = np.abs(window).max()
+            if peak > 0:
+                window *= 1.0 / peak
+
+            started = time.process_time()
+            reference = full(window)
+            full_time = time.process_time() - started
+            full_cpu += full_time
+
+            started = time.process_time()
+            features.update(buffer, since=last_processed)
+            mel = features.window(last_processed, window, peak)
+            incremental_cpu += time.process_time() - started
+
+            if mel is None:
+                # Off the 10 ms frame grid: the server lets the decoder compute this window
+                incremental_cpu += full_time
+            else:
+                difference = max(difference, float(np.abs(mel - reference).max()))
+            windows += 1
+            last_processed += hop
+    return windows, full_cpu, incremental_cpu, difference
+
+
+def synthetic(seconds, seed=0):
+    # Speech-like bursts of harmonics over a noise floor
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.3 * t)
+    voice = sum(np.sin(2 * np.pi * k * np.cumsum(pitch) / SAMPLE_RATE) / k for k in range(1, 8))
+    envelope = (np.sin(2 * np.pi * 1.5 * t) > 0.2).astype(np.float32)
+    return (0.2 * voice * envelope + 0.01 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-window and incremental log-mel front ends")
+    parser.add_argument("corpus", nargs="?", help="Directory of .wav recordings (default: synthetic audio)")
+    parser.add_argument("--seconds", type=float, default=120, help="Length of the synthetic recording")
+    parser.add_argument("--chunk", type=float, default=3.0, help="Window length in seconds")
+    parser.add_argument("--overlap", type=float, default=0.5, help="Fraction of each window shared with the next")
+    parser.add_argument("--n-mels", type=int, default=80, choices=(80, 128))
+    args = parser.parse_args()
+
+    name, full = full_front_end(args.n_mels)
+    recordings = load_corpus(args.corpus) if args.corpus else [("synthetic", synthetic(args.seconds), None)]
+    total_audio = total_full = total_incremental = 0.0
+    for recording, audio, _ in recordings:
+        windows, full_cpu, incremental_cpu, difference = replay(audio, args.chunk, args.overlap, args.n_mels, full)
+        seconds = len(audio) / SAMPLE_RATE
+        total_audio += seconds
+        total_full += full_cpu
+        total_incremental += incremental_cpu
+        print(f"{recording}: {seconds:.1f}s, {windows} windows, max difference {difference:.2e}")
+
+    if not total_audio:
+        print("No WAV files found")
+        return
+    print(f"Front end CPU per second of audio ({args.chunk:g}s windows, {args.overlap:.0%} overlap):")
+    print(f"  full ({name}):  {total_full / total_audio * 1000:8.2f} ms")
+    print(f"  incremental:    {total_incremental / total_audio * 1000:8.2f} ms "
+          f"({total_full / max(total_incremental, 1e-9):.1f}x less)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import argparse
+import time
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+from benchmarks.common import SAMPLE_RATE, load_corpus, word_errors
+from vad import SpeechSegmenter, VAD_BACKENDS, make_vad
+
+CHUNK_SIZE = SAMPLE_RATE * 3
+# Audio is fed the way sounddevice delivers it in the server
+BLOCK_SIZE = SAMPLE_RATE // 2
+
+
+def transcribe(model, audio):
+    peak = np.abs(audio).max()
+    if peak > 0:
+        audio = audio / peak
+    return model.transcribe(audio, fp16=False, language="en", temperature=0)["text"].strip()
+
+
+def replay_fixed_windows(audio, model):
+    """The original path: 3 s windows, 50% overlap, mean-amplitude silence check."""
+    decoded = 0
+    texts = []
+    for start in range(0, len(audio) - CHUNK_SIZE + 1, CHUNK_SIZE // 2):
+        chunk = audio[start:start + CHUNK_SIZE]
+        if np.abs(chunk).mean() < 0.005:
+            continue
+        decoded += len(chunk)
+        if model:
+            texts.append(transcribe(model, chunk))
+    return decoded, " ".join(texts)
+
+
+def replay_vad(audio, model, backend):
+    vad = make_vad(backend, SAMPLE_RATE)
+    segmenter = SpeechSegmenter(vad, SAMPLE_RATE)
+    buffer = AudioRingBuffer(SAMPLE_RATE * 30)
+    utterances = []
+    vad_time = 0.0
+    for start in range(0, len(audio), BLOCK_SIZE):
+        buffer.write(audio[start:start + BLOCK_SIZE])
+        started = time.perf_counter()
+        for utterance in segmenter.process(buffer):
+            utterances.append(utterance)
+        vad_time += time.perf_counter() - started
+    utterances.extend(segmenter.flush())
+
+    decoded = 0
+    texts = []
+    for start, end in utterances:
+        decoded += end - start
+        if model:
+            texts.append(transcribe(model, audio[start:end]))
+    return decoded, " ".join(texts), vad_time, len(utterances)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay WAV recordings through the VAD segmenter")
+    parser.add_argument("corpus", help="Directory of .wav files with optional matching .txt references")
+    parser.add_argument("--backend", default="energy", choices=sorted(VAD_BACKENDS))
+    parser.add_argument("--model", default=None, help="Whisper model name; omit to only measure skipped audio")
+    args = parser.parse_args()
+
+    model = None
+    if args.model:
+        import whisper
+        model = whisper.load_model(args.model, device="cpu")
+
+    totals = {"audio": 0, "fixed": 0, "vad": 0, "fixed_err": 0, "vad_err": 0, "words": 0}
+    for name, audio, reference in load_corpus(args.corpus):
+        fixed_samples, fixed_text = replay_fixed_windows(audio, model)
+        vad_samples, vad_text, vad_time, n_utterances = replay_vad(audio, model, args.backend)
+        totals["audio"] += len(audio)
+        totals["fixed"] += fixed_samples
+        totals["vad"] += vad_samples
+
+        line = (f"{name}: {len(audio) / SAMPLE_RATE:.1f}s, {n_utterances} utterances, "
+                f"VAD cost {vad_time * 1000:.1f} ms, decoded fixed {fixed_samples / SAMPLE_RATE:.1f}s "
+                f"vs vad {vad_samples / SAMPLE_RATE:.1f}s")
+        if model and reference:
+            fixed_err, words = word_errors(reference, fixed_text)
+            vad_err, _ = word_errors(reference, vad_text)
+            totals["fixed_err"] += fixed_err
+            totals["vad_err"] += vad_err
+            totals["words"] += words
+            line += f", WER fixed {fixed_err / max(words, 1):.3f} vs vad {vad_err / max(words, 1):.3f}"
+        print(line)
+
+    if not totals["audio"]:
+        print("No WAV files found")
+        return
+    # Overlapping fixed windows can decode more audio than was recorded
+    print(f"Audio decoded per second recorded: fixed windows {totals['fixed'] / totals['audio']:.2f}s, "
+          f"VAD ({args.backend}) {totals['vad'] / totals['audio']:.2f}s")
+    print(f"Audio skipped by VAD: {1 - totals['vad'] / totals['audio']:.1%}")
+    if totals["words"]:
+        print(f"WER: fixed windows {totals['fixed_err'] / totals['words']:.3f}, "
+              f"VAD {totals['vad_err'] / totals['words']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
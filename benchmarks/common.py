@@ -0,0 +1,68 @@
+import re
+import wave
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def load_wav(path, sample_rate=SAMPLE_RATE):
+    """Read a PCM WAV file as mono float32 at `sample_rate`."""
+    with wave.open(str(path), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 2:
+        audio = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    elif width == 4:
+        audio = np.frombuffer(frames, dtype=np.int32).astype(np.float32) / 2147483648.0
+    elif width == 1:
+        audio = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        raise ValueError(f"Unsupported sample width {width} in {path}")
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if rate != sample_rate:
+        # Linear interpolation is enough for benchmark fixtures
+        duration = len(audio) / rate
+        target = np.arange(int(duration * sample_rate)) / sample_rate
+        audio = np.interp(target, np.arange(len(audio)) / rate, audio).astype(np.float32)
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def load_corpus(directory):
+    """Yield (name, audio, reference_text) for every WAV with a matching .txt transcript."""
+    for wav_path in sorted(Path(directory).glob("*.wav")):
+        txt_path = wav_path.with_suffix(".txt")
+        reference = txt_path.read_text().strip() if txt_path.exists() else None
+        yield wav_path.stem, load_wav(wav_path), reference
+
+
+def normalize_text(text):
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def word_errors(reference, hypothesis):
+    """Word-level Levenshtein distance between two transcripts, plus the reference length."""
+    ref = normalize_text(reference)
+    hyp = normalize_text(hypothesis)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            )
+        previous = current
+    return previous[-1], len(ref)
+
+
+def wer(reference, hypothesis):
+    errors, words = word_errors(reference, hypothesis)
+    return errors / words if words else 0.0
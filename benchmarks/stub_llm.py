@@ -0,0 +1,84 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from emr_schema import default_emr
+
+
+def stub_report():
+    report = default_emr()
+    report["consultationType"] = "Follow-up"
+    report["chiefComplaint"] = "Headache"
+    report["reviewOfSymptoms"]["neurological"]["headache"] = True
+    return report
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Answers /chat/completions like an OpenAI-compatible provider, with a fixed EMR.
+
+    `delay` seconds pass before the first byte and streamed replies are sent
+    in `chunk_chars` deltas, so LLM time is predictable across runs.
+    """
+
+    delay = 0.5
+    chunk_chars = 40
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        content = json.dumps(stub_report())
+        time.sleep(self.delay)
+
+        if not request.get("stream"):
+            body = json.dumps({"choices": [{"message": {"role": "assistant", "content": content}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        for start in range(0, len(content), self.chunk_chars):
+            event = {"choices": [{"delta": {"content": content[start:start + self.chunk_chars]}}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def start_stub_llm(port=0, delay=0.5):
+    """Serve the stub in a background thread; returns (server, base_url)."""
+    handler = type("ConfiguredStubLLMHandler", (StubLLMHandler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenRouter chat completions API")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--delay", type=float, default=0.5, help="Seconds before each reply starts")
+    args = parser.parse_args()
+    server, base_url = start_stub_llm(args.port, args.delay)
+    print(f"Stub LLM listening, set LLM_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
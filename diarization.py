@@ -0,0 +1,204 @@
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("Doctor", "Patient", "Other")
+# Openers that mark a sentence as a question even when Whisper leaves out the "?"
+QUESTION_PATTERN = re.compile(
+    r"(\?|^(how|what|when|where|which|why|who|do|does|did|is|are|have|has|any|can|could|would)\b)",
+    re.IGNORECASE,
+)
+
+# Mean natural-log mel power of voiced frames below which a segment is silence: noise at
+# about -67 dBFS RMS, where speech at -40 dBFS scores about -3
+MIN_VOICED_ENERGY = -9.0
+
+_FILTERBANKS = {}
+
+
+def mel_filterbank(sample_rate, n_fft, n_mels):
+    """Triangular mel filters as an (n_mels, n_fft // 2 + 1) matrix, cached per configuration."""
+    key = (sample_rate, n_fft, n_mels)
+    if key not in _FILTERBANKS:
+        def to_mel(hz):
+            return 2595.0 * np.log10(1.0 + hz / 700.0)
+
+        def to_hz(mel):
+            return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+        points = to_hz(np.linspace(to_mel(60.0), to_mel(sample_rate / 2 * 0.95), n_mels + 2))
+        bins = np.fft.rfftfreq(n_fft, 1.0 / sample_rate)
+        lower, centre, upper = points[:-2, None], points[1:-1, None], points[2:, None]
+        rising = (bins - lower) / (centre - lower)
+        falling = (upper - bins) / (upper - centre)
+        _FILTERBANKS[key] = np.maximum(0.0, np.minimum(rising, falling)).astype(np.float32)
+    return _FILTERBANKS[key]
+
+
+def speaker_embedding(audio, sample_rate=16000, n_mfcc=20, n_mels=40, energy_quantile=0.3, peak=1.0,
+                      min_energy=MIN_VOICED_ENERGY):
+    """Mean and variance of MFCCs over the voiced frames of `audio`.
+
+    A few milliseconds of numpy per second of audio, which is all that 2-3
+    clearly different voices in a consultation room need. c0 (loudness) is
+    left out so microphone distance does not split a speaker in two. `peak`
+    is the factor `audio` was divided by when it was normalized. Returns
+    (mean, variance, frame_count), or None when there are too few frames or
+    the voiced frames are quieter than `min_energy`.
+    """
+    frame = int(sample_rate * 0.025)
+    hop = int(sample_rate * 0.010)
+    if len(audio) < frame + hop * 10:
+        return None
+    n_fft = 1 << (frame - 1).bit_length()
+    n_frames = 1 + (len(audio) - frame) // hop
+    frames = np.lib.stride_tricks.as_strided(
+        audio, shape=(n_frames, frame), strides=(audio.strides[0] * hop, audio.strides[0])
+    )
+    frames = (frames - frames.mean(axis=1, keepdims=True)) * np.hamming(frame).astype(np.float32)
+    power = np.square(np.abs(np.fft.rfft(frames, n_fft)))
+    log_mel = np.log(power @ mel_filterbank(sample_rate, n_fft, n_mels).T + 1e-10)
+
+    # Only the louder frames carry the voice; pauses and breaths look alike for everyone
+    energy = log_mel.mean(axis=1)
+    voiced = energy >= np.quantile(energy, energy_quantile)
+    if np.count_nonzero(voiced) < 10:
+        return None
+    # The quantile is relative, so silence and hum would otherwise pass as a voice
+    level = energy[voiced].mean() + (2.0 * np.log(peak) if peak > 0 else 0.0)
+    if level < min_energy:
+        return None
+
+    n = np.arange(n_mels)
+    dct = np.cos(np.pi / n_mels * (n + 0.5)[None, :] * np.arange(1, n_mfcc)[:, None])
+    mfcc = log_mel[voiced] @ dct.T
+    return mfcc.mean(axis=0), mfcc.var(axis=0) + 1e-3, len(mfcc)
+
+
+class OnlineDiarizer:
+    """Assigns each transcribed segment to one of up to `max_speakers` speakers.
+
+    Segments arrive one at a time as they are transcribed, so clustering is
+    online: a segment joins the nearest speaker centroid unless it is further
+    than `threshold` from all of them, in which case it starts a new speaker
+    while fewer than `max_speakers` exist. Distance is the RMS difference of
+    MFCC means in units of their pooled standard deviation, so it needs no
+    session-wide statistics and works from the second segment on. Segments
+    shorter than `min_duration` are matched but never move a centroid or open
+    a speaker, and return None if no speaker exists yet.
+    """
+
+    def __init__(self, sample_rate=16000, max_speakers=3, threshold=0.55, min_duration=1.0, max_weight=3000):
+        self.sample_rate = sample_rate
+        self.max_speakers = max_speakers
+        self.threshold = threshold
+        self.min_samples = int(min_duration * sample_rate)
+        # Cap centroid weights so a voice that drifts (or a misassigned start) can still move them
+        self.max_weight = max_weight
+        self.means = []
+        self.variances = []
+        self.weights = []
+        self.durations = []
+
+    def distances(self, mean, variance):
+        return [
+            float(np.sqrt(np.mean(np.square(mean - centroid) / ((variance + spread) / 2))))
+            for centroid, spread in zip(self.means, self.variances)
+        ]
+
+    def assign(self, audio, peak=1.0):
+        """Speaker index for one segment of audio (divided by `peak`), or None if it cannot be told."""
+        embedding = speaker_embedding(audio, self.sample_rate, peak=peak)
+        if embedding is None:
+            return None
+        mean, variance, count = embedding
+        distances = self.distances(mean, variance)
+        nearest = int(np.argmin(distances)) if distances else None
+        reliable = len(audio) >= self.min_samples
+
+        if nearest is None or distances[nearest] > self.threshold:
+            if not reliable:
+                return nearest
+            if len(self.means) < self.max_speakers:
+                self.means.append(mean)
+                self.variances.append(variance)
+                self.weights.append(count)
+                self.durations.append(len(audio) / self.sample_rate)
+                logger.info(f"Diarization: new speaker {len(self.means) - 1}"
+                            + (f" (distance {distances[nearest]:.2f})" if distances else ""))
+                return len(self.means) - 1
+
+        self.durations[nearest] += len(audio) / self.sample_rate
+        if reliable:
+            weight = self.weights[nearest]
+            share = count / (weight + count)
+            self.means[nearest] = self.means[nearest] + share * (mean - self.means[nearest])
+            self.variances[nearest] = self.variances[nearest] + share * (variance - self.variances[nearest])
+            self.weights[nearest] = min(weight + count, self.max_weight)
+        return nearest
+
+    def reset(self):
+        self.means = []
+        self.variances = []
+        self.weights = []
+        self.durations = []
+
+    def stats(self):
+        return {
+            "speakers": len(self.means),
+            "seconds": [round(duration, 1) for duration in self.durations],
+        }
+
+
+def assign_roles(segments):
+    """Map speaker index -> role from what each speaker said.
+
+    The clinician asks most of the questions, so the speaker with the highest
+    share of question sentences is the doctor (ties go to whoever spoke
+    first); of the rest, whoever spoke the most is the patient and anyone
+    else, such as a relative, is "Other".
+    """
+    questions, sentences, words, first = {}, {}, {}, {}
+    for order, segment in enumerate(segments):
+        speaker = segment.get("speaker")
+        if speaker is None:
+            continue
+        first.setdefault(speaker, order)
+        parts = [part for part in re.split(r"(?<=[.?!])\s+", segment["text"]) if part]
+        sentences[speaker] = sentences.get(speaker, 0) + len(parts)
+        questions[speaker] = questions.get(speaker, 0) + sum(1 for part in parts if QUESTION_PATTERN.search(part))
+        words[speaker] = words.get(speaker, 0) + len(segment["text"].split())
+    if not first:
+        return {}
+
+    doctor = max(first, key=lambda speaker: (questions[speaker] / max(sentences[speaker], 1), -first[speaker]))
+    roles = {doctor: ROLES[0]}
+    others = sorted((speaker for speaker in first if speaker != doctor), key=lambda speaker: -words[speaker])
+    for rank, speaker in enumerate(others):
+        roles[speaker] = ROLES[1] if rank == 0 else ROLES[2]
+    return roles
+
+
+def labeled_transcript(segments, roles=None):
+    """Transcript as "Role: text" turns, one line per change of speaker.
+
+    Segments without a speaker continue the current turn.
+    """
+    segments = list(segments)
+    if roles is None:
+        roles = assign_roles(segments)
+    turns = []
+    for segment in segments:
+        text = segment["text"].strip()
+        if not text:
+            continue
+        speaker = segment.get("speaker")
+        label = roles.get(speaker, f"Speaker {speaker + 1}") if speaker is not None else None
+        if turns and (label is None or label == turns[-1][0]):
+            turns[-1][1].append(text)
+        else:
+            turns.append((label or "Unknown", [text]))
+    return "\n".join(f"{label}: {' '.join(texts)}" for label, texts in turns)
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_transcript(transcript):
+    # Whitespace and case differences between retries must not change the key
+    return re.sub(r"\s+", " ", transcript).strip().casefold()
+
+
+def prompt_version(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_key(model, version, transcript):
+    material = json.dumps([model, version, normalize_transcript(transcript)], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class EMRCache:
+    """Two-tier cache of parsed EMR analyses keyed by content hash.
+
+    The first tier is an in-process LRU; the optional second tier is a SQLite
+    file shared across restarts, with TTL expiry and eviction of the least
+    recently used rows beyond `max_disk_entries`. SQLite calls run in a
+    worker thread so the event loop never blocks on disk.
+    """
+
+    def __init__(self, max_entries=256, db_path=None, ttl=7 * 24 * 3600, max_disk_entries=10000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._db = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS emr_cache ("
+                "key TEXT PRIMARY KEY, analysis TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS emr_cache_accessed ON emr_cache (accessed)")
+            self._db.commit()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    async def get(self, key):
+        entry = self._memory.get(key)
+        if entry is not None:
+            created, analysis = entry
+            if time.time() - created <= self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return analysis
+            del self._memory[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None:
+                created, analysis = row
+                self.disk_hits += 1
+                self._remember(key, created, analysis)
+                return analysis
+
+        self.misses += 1
+        return None
+
+    async def put(self, key, analysis):
+        created = time.time()
+        self._remember(key, created, analysis)
+        self.stores += 1
+        if self._db is not None:
+            try:
+                await asyncio.to_thread(self._db_put, key, created, json.dumps(analysis))
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist EMR cache entry: {e}")
+
+    def _remember(self, key, created, analysis):
+        self._memory[key] = (created, analysis)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key):
+        with self._db_lock:
+            row = self._db.execute("SELECT analysis, created FROM emr_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            analysis, created = row
+            if time.time() - created > self.ttl:
+                self._db.execute("DELETE FROM emr_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE emr_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return created, json.loads(analysis)
+
+    def _db_put(self, key, created, analysis):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO emr_cache (key, analysis, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, analysis, created, created),
+            )
+            expired = self._db.execute("DELETE FROM emr_cache WHERE created < ?", (time.time() - self.ttl,)).rowcount
+            overflow = self._db.execute(
+                "DELETE FROM emr_cache WHERE key IN ("
+                "SELECT key FROM emr_cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_disk_entries,),
+            ).rowcount
+            self._db.commit()
+        self.evictions += max(expired, 0) + max(overflow, 0)
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "disk_enabled": self._db is not None,
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
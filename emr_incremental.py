@@ -0,0 +1,148 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_values(values, path, conflicts):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    if all(isinstance(value, dict) for value in values):
+        keys = []
+        for value in values:
+            keys.extend(key for key in value if key not in keys)
+        return {
+            key: _merge_values([value.get(key) for value in values], path + (key,), conflicts)
+            for key in keys
+        }
+    if all(isinstance(value, bool) for value in values):
+        # A symptom reported in any part of the consultation is reported
+        return any(values)
+    if all(isinstance(value, list) for value in values):
+        merged = []
+        seen = set()
+        for value in values:
+            for item in value:
+                marker = str(item).strip().casefold()
+                if marker and marker not in seen:
+                    seen.add(marker)
+                    merged.append(item)
+        return merged
+
+    texts = []
+    seen = set()
+    for value in values:
+        text = str(value).strip()
+        if text and text.casefold() not in seen:
+            seen.add(text.casefold())
+            texts.append(text)
+    if len(texts) > 1:
+        conflicts[".".join(path)] = texts
+    return texts[0] if texts else ""
+
+
+def merge_partials(partials):
+    """Merge per-segment EMR dicts deterministically.
+
+    Returns (merged, conflicts): booleans are OR-ed, lists are unioned and a
+    free-text field keeps its single distinct value. Fields where segments
+    disagree are listed in `conflicts` as {"dotted.path": [values...]} for a
+    text merge step.
+    """
+    conflicts = {}
+    merged = _merge_values(partials, (), conflicts) or {}
+    return merged, conflicts
+
+
+def apply_merged_text(merged, resolved):
+    for dotted, text in resolved.items():
+        target = merged
+        *parents, leaf = dotted.split(".")
+        for key in parents:
+            target = target.get(key)
+            if not isinstance(target, dict):
+                break
+        else:
+            if leaf in target:
+                target[leaf] = text
+    return merged
+
+
+class IncrementalEMRExtractor:
+    """Map-reduce EMR extraction that runs while the consultation is recorded.
+
+    Transcript text accumulates until `segment_chars` is reached, then that
+    segment is sent to `extract(text)` in the background (one call at a time
+    per session). `finalize()` maps only the remaining tail and merges the
+    partial reports, calling `merge_text(conflicts)` for free-text fields the
+    segments disagree on, so the work left at stop does not grow with the
+    length of the consultation.
+    """
+
+    def __init__(self, extract, merge_text, segment_chars=2500):
+        self.extract = extract
+        self.merge_text = merge_text
+        self.segment_chars = segment_chars
+        self.pending = []
+        self.pending_chars = 0
+        self.segments = []
+        self.partials = {}
+        self.failed = set()
+        self.tasks = set()
+        self._limit = asyncio.Semaphore(1)
+
+    def add_text(self, text):
+        self.pending.append(text)
+        self.pending_chars += len(text) + 1
+        if self.pending_chars >= self.segment_chars:
+            self._dispatch()
+
+    def _dispatch(self):
+        text = " ".join(self.pending).strip()
+        self.pending = []
+        self.pending_chars = 0
+        if not text:
+            return
+        index = len(self.segments)
+        self.segments.append(text)
+        task = asyncio.create_task(self._map(index))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _map(self, index):
+        async with self._limit:
+            try:
+                self.partials[index] = await self.extract(self.segments[index])
+                self.failed.discard(index)
+                logger.info(f"Extracted partial EMR for segment {index} ({len(self.segments[index])} chars)")
+            except Exception as e:
+                logger.warning(f"Partial EMR extraction failed for segment {index}: {e}")
+                self.failed.add(index)
+
+    async def finalize(self):
+        if self.pending:
+            self._dispatch()
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks))
+        # Segments that failed in the background get one more attempt now
+        for index in sorted(self.failed):
+            await self._map(index)
+        if self.failed:
+            raise RuntimeError(f"Partial EMR extraction failed for segments {sorted(self.failed)}")
+        if not self.partials:
+            raise RuntimeError("No transcript segments were extracted")
+
+        merged, conflicts = merge_partials([self.partials[index] for index in sorted(self.partials)])
+        if conflicts:
+            try:
+                resolved = await self.merge_text(conflicts)
+            except Exception as e:
+                logger.warning(f"Free-text EMR merge failed, concatenating values: {e}")
+                resolved = {path: "; ".join(values) for path, values in conflicts.items()}
+            apply_merged_text(merged, resolved)
+        return merged
+
+    def cancel(self):
+        for task in list(self.tasks):
+            task.cancel()
@@ -0,0 +1,194 @@
+import json
+
+LITERALS = {"true": True, "false": False, "null": None, "none": None}
+
+
+class StreamingJSONParser:
+    """Incremental, repairing parser for the JSON object in an LLM reply.
+
+    Text is fed in arbitrary chunks (e.g. LLM stream deltas) and the object is
+    built as tokens arrive, so `feed()` can return each top-level member as
+    soon as it is complete. Prose before the object is skipped and common
+    defects are repaired instead of failing the whole reply: trailing or
+    missing commas, unquoted keys and literals (True, yes, None), raw line
+    breaks in strings, mismatched closing brackets, and - in `finish()` - an
+    unterminated string or unclosed brackets from a truncated response.
+    Repairs made are listed in `repairs`.
+    """
+
+    def __init__(self):
+        self.root = None
+        # Each frame is [container, pending key, key the container is stored under]
+        self.stack = []
+        self.token = None
+        self.token_kind = None
+        self.escaped = False
+        self.done = False
+        self.repairs = []
+        self._fields = []
+
+    def feed(self, text):
+        for char in text:
+            if self.done:
+                break
+            self._char(char)
+        fields, self._fields = self._fields, []
+        return fields
+
+    def finish(self):
+        """Close whatever is still open and return the parsed object."""
+        if self.token_kind == "string":
+            self.repairs.append("unterminated string")
+            self._end_string()
+        elif self.token_kind == "literal":
+            self._end_literal()
+        if self.root is None:
+            raise ValueError("No JSON object found in response")
+        if self.stack:
+            self.repairs.append(f"{len(self.stack)} unclosed bracket(s)")
+            while self.stack:
+                self._close()
+        self.done = True
+        return self.root
+
+    def _char(self, char):
+        if self.token_kind == "string":
+            if self.escaped:
+                self.token.append(char)
+                self.escaped = False
+            elif char == "\\":
+                self.token.append(char)
+                self.escaped = True
+            elif char == '"':
+                self._end_string()
+            elif char == "\n":
+                self.token.append("\\n")
+            elif char in "\r\t":
+                self.token.append("\\r" if char == "\r" else "\\t")
+            else:
+                self.token.append(char)
+            return
+
+        if self.root is None:
+            if char == "{":
+                self._open({})
+            return
+
+        if self.token_kind == "literal":
+            if char.isalnum() or char in ".+-_":
+                self.token.append(char)
+                return
+            self._end_literal()
+
+        if char.isspace() or char == ":":
+            return
+        if char == ",":
+            frame = self.stack[-1]
+            if frame[1] is not None and isinstance(frame[0], dict):
+                # "key": , -> the value is missing
+                self.repairs.append(f"missing value for {frame[1]!r}")
+                frame[1] = None
+        elif char == '"':
+            self.token = []
+            self.token_kind = "string"
+        elif char == "{":
+            self._open({})
+        elif char == "[":
+            self._open([])
+        elif char in "}]":
+            expected = dict if char == "}" else list
+            if not isinstance(self.stack[-1][0], expected):
+                if not any(isinstance(frame[0], expected) for frame in self.stack):
+                    self.repairs.append(f"stray {char!r}")
+                    return
+                self.repairs.append(f"mismatched {char!r}")
+                while not isinstance(self.stack[-1][0], expected):
+                    self._close()
+                if len(self.stack) == 1:
+                    # It closed the inner containers; the rest of the object may follow
+                    return
+            self._close()
+        else:
+            self.token = [char]
+            self.token_kind = "literal"
+
+    def _end_string(self):
+        raw = "".join(self.token)
+        self.token = None
+        self.token_kind = None
+        try:
+            text = json.loads('"' + raw + '"')
+        except json.JSONDecodeError:
+            text = raw
+        self._value(text, is_key=True)
+
+    def _end_literal(self):
+        word = "".join(self.token)
+        self.token = None
+        self.token_kind = None
+        frame = self.stack[-1]
+        if isinstance(frame[0], dict) and frame[1] is None:
+            self.repairs.append(f"unquoted key {word!r}")
+            frame[1] = word
+            return
+        if word.lower() in LITERALS:
+            if word not in ("true", "false", "null"):
+                self.repairs.append(f"literal {word!r}")
+            value = LITERALS[word.lower()]
+        else:
+            try:
+                value = json.loads(word)
+            except json.JSONDecodeError:
+                self.repairs.append(f"unquoted value {word!r}")
+                value = word
+        self._value(value)
+
+    def _value(self, value, is_key=False):
+        frame = self.stack[-1]
+        container = frame[0]
+        if isinstance(container, list):
+            container.append(value)
+            return
+        if frame[1] is None:
+            if is_key:
+                frame[1] = value
+            return
+        key, frame[1] = frame[1], None
+        container[key] = value
+        if len(self.stack) == 1:
+            self._fields.append((key, value))
+
+    def _open(self, container):
+        if self.root is None:
+            self.root = container
+            self.stack.append([container, None, None])
+            return
+        frame = self.stack[-1]
+        parent = frame[0]
+        key = None
+        if isinstance(parent, list):
+            parent.append(container)
+        elif frame[1] is not None:
+            key, frame[1] = frame[1], None
+            parent[key] = container
+        else:
+            self.repairs.append("object value without a key")
+        self.stack.append([container, None, key])
+
+    def _close(self):
+        container, pending, key = self.stack.pop()
+        if pending is not None and isinstance(container, dict):
+            self.repairs.append(f"missing value for {pending!r}")
+        if not self.stack:
+            self.done = True
+        elif len(self.stack) == 1 and key is not None:
+            self._fields.append((key, container))
+
+
+def parse_json_object(text):
+    """Parse the JSON object in an LLM reply, repairing common defects."""
+    if not text.strip():
+        raise ValueError("Empty result from API")
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    return parser.finish()
@@ -0,0 +1,149 @@
+import math
+import re
+
+from emr_schema import EMR_SCHEMA, covered, leaf_paths, schema_template
+from token_budget import estimate_tokens, split_to_budget
+
+EMR_INSTRUCTIONS = """You are a medical professional analyzing doctor-patient conversations. Respond ONLY with one valid JSON object that has exactly the keys of the template below, filled in from the conversation. In the template "" marks a text field, false a yes/no field and [] a list of strings; keep that value when the conversation does not say. Keep text values concise and on one line. No other text.
+
+{schema}"""
+
+# Hesitations carry no content; "uh-huh" and "mm-hmm" are answers and are kept
+# Lowercase (or sentence-initial) only, so "ER" and "mm" survive; "er" needs a comma after it
+FILLERS = re.compile(r"(?:,\s*)?(?<![\w'-])(?:[Uu]u*m+|[Uu]u*h+|[Aa]a*h+|[Hh]h*m+|[Ee]r+m*(?=,))(?![\w'-]),?")
+HEDGES = re.compile(r"\b(?:you know|i mean|sort of|kind of),\s*", re.IGNORECASE)
+# Repeated words other than digits are stutters, except numbers ("two two") and grammatical doubles ("had had")
+REPEATED_WORD = re.compile(r"\b([^\W\d_]+)(?:[,\s]+\1\b)+", re.IGNORECASE)
+DOUBLED_WORDS = {
+    "had", "that", "zero", "oh", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+    "eleven", "twelve", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety", "hundred",
+}
+
+# Rough reply sizes in tokens, per field of each kind and per JSON key
+TEXT_FIELD_TOKENS = 24
+LIST_FIELD_TOKENS = 60
+BOOLEAN_FIELD_TOKENS = 2
+KEY_TOKENS = 6
+
+
+def system_prompt(sections=None, exclude=()):
+    """EMR system prompt with a compact template generated from EMR_SCHEMA."""
+    return EMR_INSTRUCTIONS.format(schema=schema_template(sections, exclude, compact=True))
+
+
+def completion_budget(sections=None, exclude=(), ceiling=2000, slack=1.25):
+    """`max_tokens` for a reply covering the requested fields, capped at `ceiling`."""
+    tokens = 0
+    for path in leaf_paths():
+        if covered(path, exclude) or (sections and path.split(".", 1)[0] not in sections):
+            continue
+        default = EMR_SCHEMA
+        for key in path.split("."):
+            default = default[key]
+        if isinstance(default, bool):
+            tokens += BOOLEAN_FIELD_TOKENS + KEY_TOKENS
+        elif isinstance(default, list):
+            tokens += LIST_FIELD_TOKENS + KEY_TOKENS
+        else:
+            tokens += TEXT_FIELD_TOKENS + KEY_TOKENS
+    return min(int(tokens * slack) + 50, ceiling)
+
+
+def _collapse_repeat(match):
+    word = match.group(1)
+    return match.group(0) if word.lower() in DOUBLED_WORDS else word
+
+
+def clean_text(text):
+    """Drop hesitations, comma-delimited hedges and stuttered repeats from one segment."""
+    text = FILLERS.sub("", text)
+    text = HEDGES.sub("", text)
+    text = REPEATED_WORD.sub(_collapse_repeat, text)
+    return re.sub(r"\s{2,}", " ", text).strip(" ,")
+
+
+def _normalize(word):
+    return word.lower().strip(".,?!;:\"")
+
+
+class TranscriptCompactor:
+    """Cleans transcript segments one at a time for LLM prompts.
+
+    With `overlapping` set (overlap mode), consecutive windows share audio,
+    so a segment that starts before the previous one ended can repeat its
+    last words, give or take a word cut off at one boundary. The longest
+    such repeat of at least `min_overlap` words, within the share of the
+    segment that overlaps in time, is dropped so each spoken sentence
+    reaches the LLM once. Segments that do not overlap in time are only
+    cleaned.
+    """
+
+    def __init__(self, overlapping=True, min_overlap=2, max_overlap=40, boundary_slack=1):
+        self.overlapping = overlapping
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+        self.boundary_slack = boundary_slack
+        self.tail = []
+        self.last_end = None
+        self.input_chars = 0
+        self.output_chars = 0
+
+    def _overlap(self, words, limit):
+        """Number of leading words of `words` (at most `limit`) that repeat the tail, or 0."""
+        best = 0
+        for skip_tail in range(self.boundary_slack + 1):
+            tail = self.tail[:len(self.tail) - skip_tail] if skip_tail else self.tail
+            # A cut-off word is skipped at one boundary or the other, never both
+            for skip_head in range(self.boundary_slack - skip_tail + 1):
+                head = words[skip_head:]
+                for size in range(min(len(tail), len(head), limit - skip_head), self.min_overlap - 1, -1):
+                    if size + skip_head <= best:
+                        break
+                    if tail[-size:] == head[:size]:
+                        best = size + skip_head
+                        break
+        return best
+
+    def _overlap_limit(self, words, start, end):
+        """Leading words that can fall in the time shared with the previous segment."""
+        if not self.overlapping or self.last_end is None or start < 0 or end <= start or start >= self.last_end:
+            return 0
+        share = min((self.last_end - start) / (end - start), 1.0)
+        return min(math.ceil(share * len(words)) + self.boundary_slack, self.max_overlap)
+
+    def add(self, text, start=-1, end=-1):
+        """The new part of one segment, cleaned; "" if it only repeated earlier text.
+
+        `start` and `end` are the segment's position (any unit, -1 if unknown).
+        """
+        self.input_chars += len(text)
+        words = clean_text(text).split()
+        normalized = [_normalize(word) for word in words]
+        limit = self._overlap_limit(words, start, end)
+        drop = self._overlap(normalized, limit) if limit else 0
+        kept = words[drop:]
+        self.tail = (self.tail + normalized[drop:])[-self.max_overlap:]
+        if end >= 0:
+            self.last_end = end
+        text = " ".join(kept)
+        self.output_chars += len(text)
+        return text
+
+
+def compact_segments(segments, overlapping=False):
+    """Segment dicts with cleaned text, de-overlapped if they come from overlapping windows; emptied segments are dropped."""
+    compactor = TranscriptCompactor(overlapping)
+    compacted = []
+    for segment in segments:
+        text = compactor.add(segment["text"], segment.get("start", -1), segment.get("end", -1))
+        if text:
+            compacted.append({**segment, "text": text})
+    return compacted, compactor
+
+
+def fit_transcript(transcript, budget):
+    """The transcript as one piece if it fits `budget` tokens, else split into pieces that do."""
+    tokens = estimate_tokens(transcript)
+    if tokens <= budget:
+        return [transcript], tokens
+    return split_to_budget(transcript, budget), tokens
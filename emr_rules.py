@@ -0,0 +1,424 @@
+import re
+
+from emr_schema import default_emr, leaf_paths
+
+# Synonyms for every boolean symptom field, matched on whole words in lower case
+SYMPTOM_LEXICON = {
+    "reviewOfSymptoms.constitutional.fever": [
+        r"fevers?", r"feverish", r"febrile", r"pyrexia", r"(?:running|ran|had) a (?:high )?temperature", r"felt hot",
+    ],
+    "reviewOfSymptoms.constitutional.chills": [r"chills?", r"chilly", r"shivering", r"shivers", r"rigors?"],
+    "reviewOfSymptoms.constitutional.nightSweats": [
+        r"night sweats?", r"sweat(?:s|ing)? (?:at|during the|through the) night", r"wak(?:e|ing) up (?:all )?sweaty",
+    ],
+    "reviewOfSymptoms.constitutional.fatigue": [
+        r"fatigued?", r"tired(?:ness)?", r"exhausted", r"exhaustion", r"worn out", r"run down", r"lethargic",
+        r"lethargy", r"(?:no|low|little) energy",
+    ],
+    "reviewOfSymptoms.neurological.headache": [
+        r"headaches?", r"migraines?", r"head (?:hurts|is hurting|pain|ache)",
+    ],
+    "reviewOfSymptoms.neurological.numbness": [r"numb(?:ness)?", r"tingling", r"pins and needles"],
+    "reviewOfSymptoms.neurological.weakness": [r"weakness", r"(?:feel|feels|feeling|felt) weak"],
+    "reviewOfSymptoms.neurological.dizziness": [
+        r"dizzy", r"dizziness", r"light ?-?headed(?:ness)?", r"vertigo", r"(?:room|everything) (?:is )?spinning",
+    ],
+    "reviewOfSymptoms.cardiovascular.chestPain": [
+        r"chest (?:pains?|tightness|pressure|discomfort|hurts|is hurting)", r"pain in (?:my|the|his|her) chest",
+        r"angina",
+    ],
+    "reviewOfSymptoms.cardiovascular.palpitations": [
+        r"palpitations?", r"heart (?:is )?(?:racing|pounding|fluttering)", r"racing heart", r"fluttering",
+    ],
+    "reviewOfSymptoms.cardiovascular.dyspnea": [
+        r"short(?:ness)? of breath", r"breathless(?:ness)?", r"dyspn(?:o)?ea", r"(?:trouble|difficulty) breathing",
+        r"can'?t (?:catch|get) (?:my|his|her) breath", r"winded",
+    ],
+    "reviewOfSymptoms.cardiovascular.heartbeatIrregular": [
+        r"irregular (?:heart ?beats?|pulse|rhythm)", r"skipp(?:ed|ing) (?:a )?beats?", r"arrhythmias?",
+        r"atrial fibrillation", r"a-?fib",
+    ],
+    "reviewOfSymptoms.musculoskeletal.arthralgias": [
+        r"joint (?:pains?|aches?)", r"joints? (?:hurt|hurts|ache|aches|aching)", r"arthralgias?",
+        r"(?:knee|hip|shoulder|elbow|wrist|ankle) (?:pain|ache)s?",
+    ],
+    "reviewOfSymptoms.musculoskeletal.myalgias": [
+        r"muscle (?:pains?|aches?|soreness)", r"myalgias?", r"body aches?", r"sore muscles", r"aching all over",
+    ],
+    "reviewOfSymptoms.musculoskeletal.swellingInJoints": [
+        r"swollen (?:joints?|knees?|ankles?|wrists?|fingers?)", r"joint swelling",
+        r"swelling (?:in|of|around) (?:my|the|his|her) (?:joints?|knees?|ankles?|wrists?|fingers?)",
+        r"(?:joints?|knees?|ankles?|wrists?|fingers?) (?:are|is|look|looks|got|get|have been) (?:all )?swollen",
+    ],
+    "reviewOfSymptoms.musculoskeletal.other": [
+        r"back pain", r"neck pain", r"stiff(?:ness)?", r"(?:muscle )?cramps?", r"sprain(?:ed)?",
+    ],
+}
+
+# NegEx trigger sets: negations before and after a concept, phrases that look like
+# negations but are not, hypotheticals that assert nothing, and words that end a scope
+PRE_NEGATIONS = [
+    r"no", r"not", r"nor", r"neither", r"never", r"without", r"den(?:y|ies|ied)", r"negative for", r"free of",
+    r"absence of", r"no (?:signs?|history|complaints?|episodes?) of", r"(?:do|does|did)(?: not|n'?t) (?:have|get|feel|notice)",
+    r"(?:have|has|had)(?: not|n'?t) (?:had|been|noticed|felt)", r"not (?:had|having|experiencing|feeling)",
+    r"none", r"no more", r"no longer",
+]
+POST_NEGATIONS = [
+    r"(?:is|are|was|were|has|have) (?:gone|resolved|absent)", r"went away", r"ruled out", r"not present",
+    r"(?:is|are) not an issue",
+]
+PSEUDO_NEGATIONS = [
+    r"not only", r"no change", r"no increase", r"no better", r"not improv\w*", r"not go(?:ne)? away",
+    r"never went away", r"no relief",
+]
+# Hypothetical or uncertain mentions are left for a later definite statement
+HYPOTHETICALS = [
+    r"if", r"in case", r"watch (?:out )?for", r"call (?:us|me)?\s*if", r"should you", r"come back if",
+    r"return if", r"warning signs?", r"risk of", r"not sure", r"not certain", r"maybe", r"possibly", r"might",
+]
+TERMINATORS = [
+    r"but", r"however", r"although", r"though", r"except", r"apart from", r"aside from", r"yet", r"still",
+    r"which", r"who", r"since", r"because", r";", r",\s*(?:and|just)",
+]
+# Words allowed between a trigger and the concept it negates
+SCOPE_WORDS = 6
+POST_SCOPE_WORDS = 3
+
+YES_ANSWER = re.compile(r"^\s*(?:yes|yeah|yep|yup|i do|i have|i did|it does|a (?:little|bit)|sometimes|definitely|uh-huh|mm-hmm)\b", re.IGNORECASE)
+NO_ANSWER = re.compile(r"^\s*(?:no|nope|nah|not really|never|none|i don'?t|i haven'?t|i didn'?t|it doesn'?t)\b", re.IGNORECASE)
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "a couple of": 2, "a couple": 2, "a few": 3, "several": 3,
+}
+_NUMBER = r"(?:\d+(?:\.\d+)?|a couple(?: of)?|a few|several|an?|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve)"
+DURATION = re.compile(
+    rf"\b(?:for|over|since|past|last|about|almost|nearly|around)\s+(?:the\s+)?(?:(?:past|last)\s+)?"
+    rf"({_NUMBER})\s+(minutes?|hours?|days?|nights?|weeks?|months?|years?)\b"
+    r"|\bsince\s+(yesterday|last (?:night|week|month|year)|this morning|(?:mon|tues|wednes|thurs|fri|satur|sun)day)\b"
+    rf"|\b({_NUMBER})\s+(minutes?|hours?|days?|weeks?|months?|years?)\s+ago\b",
+    re.IGNORECASE,
+)
+SCORE = re.compile(
+    r"\b(10|[0-9]|ten|nine|eight|seven|six|five|four|three|two|one|zero)\s*(?:out of|/|over)\s*(?:10|ten)\b",
+    re.IGNORECASE,
+)
+SCALE_ANSWER = re.compile(r"\b(?:it'?s|about|around|maybe|probably|like)\s+(?:an?\s+)?(10|[0-9]|ten|nine|eight|seven|six|five|four|three|two|one)\b", re.IGNORECASE)
+SEVERITY_WORDS = {
+    "mild": "mild", "slight": "mild", "minor": "mild",
+    "moderate": "moderate",
+    "severe": "severe", "bad": "severe", "terrible": "severe", "unbearable": "severe", "excruciating": "severe",
+    "worst": "severe", "intense": "severe",
+}
+SEVERITY = re.compile(r"\b(" + "|".join(SEVERITY_WORDS) + r")\b", re.IGNORECASE)
+BODY_PARTS = [
+    "lower back", "upper back", "back", "head", "chest", "neck", "stomach", "abdomen", "belly", "throat", "ear",
+    "eye", "jaw", "shoulder", "arm", "elbow", "wrist", "hand", "finger", "hip", "leg", "knee", "ankle", "foot",
+    "side", "pelvis", "joint",
+]
+_PARTS = "|".join(part.replace(" ", r"\s+") for part in BODY_PARTS)
+PAIN_WORD = r"(?:pain|pains|ache|aches|aching|hurts|hurting|sore|soreness|discomfort)"
+PAIN = re.compile(rf"\b{PAIN_WORD}\b", re.IGNORECASE)
+PAIN_LOCATION = re.compile(
+    rf"\b({_PARTS})s?\s+{PAIN_WORD}\b|\b{PAIN_WORD}\s+(?:in|on|around)\s+(?:my|the|his|her|your)\s+(?:(?:left|right)\s+)?({_PARTS})s?\b"
+    rf"|\b(?:my|his|her)\s+((?:left|right)\s+)?({_PARTS})s?\s+(?:hurts|is hurting|aches|is sore)\b",
+    re.IGNORECASE,
+)
+CHARACTER = re.compile(
+    r"\b(sharp|dull|throbbing|burning|stabbing|aching|cramping|squeezing|shooting|pounding|crushing|pressure-like"
+    r"|pressing|gnawing|radiating|tight)\b",
+    re.IGNORECASE,
+)
+FREQUENCY = re.compile(
+    r"\b(constant(?:ly)?|all the time|comes and goes|on and off|off and on|intermittent(?:ly)?|every (?:day|morning|night|evening)"
+    r"|in the (?:morning|evening)s?|at night|(?:once|twice|\d+ times) a (?:day|week|month)|after (?:eating|meals|exercise|exertion)"
+    r"|when (?:i|he|she) (?:walk|walks|lie down|lies down|bend|bends|climb stairs|exercise|exercises))\b",
+    re.IGNORECASE,
+)
+VITALS = [
+    ("BP", re.compile(r"\b(?:blood pressure|bp)\b\D{0,20}?(\d{2,3})\s*(?:/|over)\s*(\d{2,3})", re.IGNORECASE), "{0}/{1} mmHg"),
+    ("HR", re.compile(r"\b(?:heart rate|pulse)\b\D{0,20}?(\d{2,3})\b", re.IGNORECASE), "{0} bpm"),
+    ("Temp", re.compile(r"\b(?:temperature|temp)\b\D{0,20}?(\d{2,3}(?:\.\d)?)\s*(?:degrees\s*)?(c|f|celsius|fahrenheit)?\b", re.IGNORECASE), "{0}{1}"),
+    ("RR", re.compile(r"\b(?:respiratory rate|breathing rate|respirations)\b\D{0,20}?(\d{1,2})\b", re.IGNORECASE), "{0}/min"),
+    ("SpO2", re.compile(r"\b(?:oxygen(?: saturation)?|saturation|sats|spo2|o2 sat)\b\D{0,20}?(\d{2,3})\s*(?:%|percent)", re.IGNORECASE), "{0}%"),
+]
+
+BOOLEAN_PATHS = [path for path in leaf_paths() if path.startswith("reviewOfSymptoms.")]
+# Symptoms that are pain, so affirming one answers the pain screening
+PAIN_SYMPTOMS = [
+    "reviewOfSymptoms.neurological.headache",
+    "reviewOfSymptoms.cardiovascular.chestPain",
+    "reviewOfSymptoms.musculoskeletal.arthralgias",
+    "reviewOfSymptoms.musculoskeletal.myalgias",
+]
+# Text fields the span extractors can fill; the LLM is asked for them only when they stay empty
+SPAN_PATHS = [
+    "historyOfPresentIllness.location",
+    "historyOfPresentIllness.duration",
+    "historyOfPresentIllness.quality",
+    "historyOfPresentIllness.timing",
+    "historyOfPresentIllness.severity",
+    "physicalExamination.constitutional.recordThreeVitalSigns",
+    "painScreening.pain",
+    "painScreening.location",
+    "painScreening.duration",
+    "painScreening.frequency",
+    "painScreening.character",
+    "painScreening.score",
+]
+
+
+def _alternation(patterns):
+    return re.compile(r"(?<![\w'])(?:" + "|".join(patterns) + r")(?![\w'])", re.IGNORECASE)
+
+
+_CONCEPT_GROUPS = {f"c{index}": path for index, path in enumerate(SYMPTOM_LEXICON)}
+CONCEPTS = re.compile(
+    "|".join(
+        rf"(?<![\w'])(?P<{group}>" + "|".join(SYMPTOM_LEXICON[path]) + r")(?![\w'])"
+        for group, path in _CONCEPT_GROUPS.items()
+    ),
+    re.IGNORECASE,
+)
+PRE_NEGATION = _alternation(PRE_NEGATIONS)
+POST_NEGATION = _alternation(POST_NEGATIONS)
+PSEUDO_NEGATION = _alternation(PSEUDO_NEGATIONS)
+HYPOTHETICAL = _alternation(HYPOTHETICALS)
+TERMINATOR = re.compile(r"(?<![\w'])(?:" + "|".join(TERMINATORS) + r")(?![\w'])", re.IGNORECASE)
+# A period between digits ("37.2") does not end a sentence
+SENTENCE = re.compile(r"(?:[^.?!\n]|\.(?=\d))+[.?!]*")
+WORD = re.compile(r"[\w']+")
+
+AFFIRMED, NEGATED, HYPOTHETICAL_MENTION, QUESTIONED = "affirmed", "negated", "hypothetical", "questioned"
+
+
+def sentences(texts):
+    """Split transcript segment texts into sentences, keeping "?" so questions can be told apart."""
+    for text in texts:
+        for match in SENTENCE.finditer(text):
+            sentence = match.group().strip()
+            if WORD.search(sentence):
+                yield sentence
+
+
+def _in_scope(sentence, start, end, max_words):
+    """No terminator between `start` and `end`, and at most `max_words` words."""
+    between = sentence[start:end]
+    return not TERMINATOR.search(between) and len(WORD.findall(between)) <= max_words
+
+
+def mention_status(sentence, start, end):
+    """NegEx status of the concept at sentence[start:end]."""
+    pseudo = [(match.start(), match.end()) for match in PSEUDO_NEGATION.finditer(sentence)]
+
+    def genuine(match):
+        return not any(low <= match.start() < high for low, high in pseudo)
+
+    for match in HYPOTHETICAL.finditer(sentence, 0, start):
+        if _in_scope(sentence, match.end(), start, SCOPE_WORDS):
+            return HYPOTHETICAL_MENTION
+    for match in PRE_NEGATION.finditer(sentence, 0, start):
+        if genuine(match) and _in_scope(sentence, match.end(), start, SCOPE_WORDS):
+            return NEGATED
+    for match in POST_NEGATION.finditer(sentence, end):
+        if _in_scope(sentence, end, match.start(), POST_SCOPE_WORDS):
+            return NEGATED
+    if sentence.rstrip().endswith("?"):
+        return QUESTIONED
+    return AFFIRMED
+
+
+def _number(text):
+    text = text.lower()
+    if text in NUMBER_WORDS:
+        return NUMBER_WORDS[text]
+    try:
+        value = float(text)
+    except ValueError:
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def _duration(match):
+    if match.group(3):
+        return f"since {match.group(3).lower()}"
+    amount, unit = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(5))
+    value = _number(amount)
+    unit = unit.lower().rstrip("s")
+    if value is None:
+        return f"{amount} {unit}s"
+    return f"{value} {unit}" + ("" if value == 1 else "s")
+
+
+def _join(values):
+    seen = []
+    for value in values:
+        if value not in seen:
+            seen.append(value)
+    return ", ".join(seen)
+
+
+class RuleExtraction:
+    """Result of `extract_fields`: filled values plus the sentence behind each one."""
+
+    def __init__(self):
+        self.values = {}
+        self.evidence = {}
+        self.statuses = {}
+
+    @property
+    def paths(self):
+        """Paths the rules decide: every symptom boolean and each filled span field."""
+        return set(BOOLEAN_PATHS) | {path for path in SPAN_PATHS if self.values.get(path)}
+
+    def report(self, base=None):
+        """`base` (default: an empty report) with the rule values written in."""
+        return self.apply(base if base is not None else default_emr())
+
+    def apply(self, target, section=None):
+        """Write the rule values into `target`, the whole report or just one top-level `section` of it."""
+        prefix = f"{section}." if section else ""
+        for path, value in self.values.items():
+            if not path.startswith(prefix) or not isinstance(target, dict):
+                continue
+            node = target
+            *parents, leaf = path[len(prefix):].split(".")
+            for key in parents:
+                node = node.setdefault(key, {})
+            node[leaf] = value
+        return target
+
+
+def extract_fields(texts):
+    """Fill symptom booleans and short span fields from transcript text in one pass.
+
+    Symptom mentions are classified NegEx-style (affirmed, negated within a
+    few words of a trigger, hypothetical, or asked about); a question is
+    resolved by a yes/no at the start of the next sentence. The last definite
+    statement about a symptom wins, so "no fever ... actually I did have a
+    fever last night" ends up true.
+    """
+    result = RuleExtraction()
+    statuses = {}
+    pending = []
+    durations, pain_durations = [], []
+    severities, scores, characters, frequencies, locations = [], [], [], [], []
+    vitals = {}
+    pain = None
+    scale_asked = False
+
+    for sentence in sentences(texts):
+        # Answers to the previous question
+        if pending:
+            if YES_ANSWER.search(sentence):
+                for path in pending:
+                    statuses[path] = True
+                    result.evidence[path] = sentence
+            elif NO_ANSWER.search(sentence):
+                for path in pending:
+                    statuses[path] = False
+                    result.evidence[path] = sentence
+            pending = []
+
+        question = sentence.rstrip().endswith("?")
+        pain_match = None
+        concept_spans = []
+        for match in CONCEPTS.finditer(sentence):
+            path = _CONCEPT_GROUPS[match.lastgroup]
+            status = mention_status(sentence, match.start(), match.end())
+            concept_spans.append((match.start(), match.end()))
+            if status == QUESTIONED:
+                pending.append(path)
+            elif status in (AFFIRMED, NEGATED):
+                statuses[path] = status == AFFIRMED
+                result.evidence[path] = sentence
+                if status == AFFIRMED and path in PAIN_SYMPTOMS:
+                    pain_match = match
+
+        # Pain is reported if any mention affirms it, e.g. "no chest pain" after a headache
+        for match in PAIN.finditer(sentence):
+            if any(low <= match.start() < high for low, high in concept_spans):
+                # The "pain" of "chest pain" belongs to that symptom, which the statuses decide
+                continue
+            status = mention_status(sentence, match.start(), match.end())
+            if status == AFFIRMED:
+                pain_match = match
+                pain = True
+                result.evidence["painScreening.pain"] = sentence
+            elif status == NEGATED and pain is None:
+                pain = False
+                result.evidence["painScreening.pain"] = sentence
+            elif status == QUESTIONED and "painScreening.pain" not in pending:
+                pending.append("painScreening.pain")
+
+        if question:
+            scale_asked = "scale" in sentence.lower()
+            continue
+
+        for match in DURATION.finditer(sentence):
+            durations.append(_duration(match))
+            if pain_match:
+                pain_durations.append(_duration(match))
+        for match in SEVERITY.finditer(sentence):
+            if mention_status(sentence, match.start(), match.end()) == AFFIRMED:
+                severities.append(SEVERITY_WORDS[match.group(1).lower()])
+        score = SCORE.search(sentence) or (SCALE_ANSWER.search(sentence) if scale_asked else None)
+        if score:
+            scores.append(f"{_number(score.group(1)) if score.group(1).lower() != 'zero' else 0}/10")
+        scale_asked = False
+        if pain_match:
+            characters.extend(match.group(1).lower() for match in CHARACTER.finditer(sentence))
+            frequencies.extend(match.group(1).lower() for match in FREQUENCY.finditer(sentence))
+        for match in PAIN_LOCATION.finditer(sentence):
+            if mention_status(sentence, match.start(), match.end()) != AFFIRMED:
+                continue
+            part = match.group(1) or match.group(2) or match.group(4)
+            side = match.group(3) or ""
+            locations.append(re.sub(r"\s+", " ", f"{side}{part}".lower()))
+        for name, pattern, template in VITALS:
+            match = pattern.search(sentence)
+            if match and name not in vitals:
+                groups = [group.upper()[0] if group and group.isalpha() else (group or "") for group in match.groups()]
+                vitals[name] = f"{name} " + template.format(*groups)
+
+    # "pain" answered by a pending question is recorded as a status, not a symptom
+    answered_pain = statuses.pop("painScreening.pain", None)
+    if not pain and answered_pain is not None:
+        pain = answered_pain
+    felt = [path for path in PAIN_SYMPTOMS if statuses.get(path)]
+    if felt and not pain:
+        pain = True
+        result.evidence["painScreening.pain"] = result.evidence[felt[0]]
+    for path in BOOLEAN_PATHS:
+        result.values[path] = statuses.get(path, False)
+    result.statuses = statuses
+
+    if pain is not None:
+        result.values["painScreening.pain"] = "Yes" if pain else "No"
+    if durations:
+        result.values["historyOfPresentIllness.duration"] = durations[0]
+    if pain and (pain_durations or durations):
+        result.values["painScreening.duration"] = (pain_durations or durations)[0]
+    # Severity and score describe pain; a denied pain leaves them to the LLM
+    if pain is False:
+        severities, scores = [], []
+    if severities:
+        result.values["historyOfPresentIllness.severity"] = severities[-1]
+    if scores:
+        result.values["painScreening.score"] = scores[-1]
+        if not severities:
+            result.values["historyOfPresentIllness.severity"] = scores[-1]
+    if locations:
+        result.values["historyOfPresentIllness.location"] = _join(locations)
+        if pain:
+            result.values["painScreening.location"] = _join(locations)
+    if characters and pain:
+        result.values["painScreening.character"] = _join(characters)
+        result.values["historyOfPresentIllness.quality"] = _join(characters)
+    if frequencies:
+        result.values["historyOfPresentIllness.timing"] = _join(frequencies)
+        if pain:
+            result.values["painScreening.frequency"] = _join(frequencies)
+    if vitals:
+        result.values["physicalExamination.constitutional.recordThreeVitalSigns"] = ", ".join(vitals.values())
+    return result
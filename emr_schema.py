@@ -0,0 +1,210 @@
+import copy
+import json
+
+# The EMR report structure. Leaves are the documented defaults and also fix
+# each field's type: "" for text, False for booleans, [] for lists of text.
+EMR_SCHEMA = {
+    "consultationDetails": "",
+    "consultationType": "",
+    "chiefComplaint": "",
+    "otherComplaints": [],
+    "historyOfPresentIllness": {
+        "location": "",
+        "duration": "",
+        "quality": "",
+        "timing": "",
+        "severity": "",
+        "associatedSignsSymptoms": "",
+        "other": "",
+    },
+    "reviewOfSymptoms": {
+        "constitutional": {
+            "fever": False,
+            "chills": False,
+            "nightSweats": False,
+            "fatigue": False,
+        },
+        "neurological": {
+            "headache": False,
+            "numbness": False,
+            "weakness": False,
+            "dizziness": False,
+        },
+        "cardiovascular": {
+            "chestPain": False,
+            "palpitations": False,
+            "dyspnea": False,
+            "heartbeatIrregular": False,
+        },
+        "musculoskeletal": {
+            "arthralgias": False,
+            "myalgias": False,
+            "swellingInJoints": False,
+            "other": False,
+        },
+    },
+    "physicalExamination": {
+        "constitutional": {
+            "recordThreeVitalSigns": "",
+            "nutritionGood": "",
+            "appearance": "",
+            "other": "",
+        },
+        "neurological": {
+            "focalNeuroDeficits": "",
+            "asterixis": "",
+            "other": "",
+        },
+        "cardiovascular": {
+            "heartSoundsAbnormal": "",
+            "pulseHeartRhythmAbnormal": "",
+            "peripheralEdema": "",
+            "other": "",
+        },
+        "musculoskeletal": {
+            "normalGaitAndStation": "",
+            "clubbing": "",
+            "muscleWeakness": "",
+            "other": "",
+        },
+    },
+    "painScreening": {
+        "pain": "",
+        "location": "",
+        "duration": "",
+        "frequency": "",
+        "character": "",
+        "score": "",
+        "management": "",
+    },
+}
+
+TRUE_STRINGS = {"true", "yes", "y", "1", "present", "positive"}
+
+
+def default_emr():
+    return copy.deepcopy(EMR_SCHEMA)
+
+
+def _coerce(value, default):
+    if isinstance(default, bool):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            return value.strip().lower() in TRUE_STRINGS
+        if isinstance(value, (int, float)):
+            return bool(value)
+        return default
+    if isinstance(default, list):
+        if isinstance(value, list):
+            return [str(item) for item in value if item not in (None, "")]
+        if isinstance(value, str) and value.strip():
+            return [value.strip()]
+        return []
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value if item not in (None, ""))
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value)
+
+
+def _validate(value, schema, path, missing):
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            value = {}
+            if path:
+                missing.append(".".join(path))
+        normalized = {}
+        for key, child in schema.items():
+            if key not in value:
+                missing.append(".".join(path + (key,)))
+                normalized[key] = copy.deepcopy(child)
+            else:
+                normalized[key] = _validate(value[key], child, path + (key,), missing)
+        return normalized
+    return _coerce(value, schema)
+
+
+def validate_emr(data):
+    """Coerce `data` to the EMR schema.
+
+    Returns (report, missing) where `report` has every documented field, with
+    types fixed (e.g. "true" -> True) and absent fields set to their
+    defaults, and `missing` lists the dotted paths that were absent.
+    """
+    missing = []
+    report = _validate(data if isinstance(data, dict) else {}, EMR_SCHEMA, (), missing)
+    return report, missing
+
+
+def validate_field(key, value):
+    """Coerce a single top-level member, e.g. one streamed as soon as it is complete."""
+    if key not in EMR_SCHEMA:
+        return value
+    return _validate(value, EMR_SCHEMA[key], (key,), [])
+
+
+def missing_sections(missing):
+    """Top-level keys that need to be requested again for the given missing paths."""
+    sections = []
+    for path in missing:
+        section = path.split(".", 1)[0]
+        if section not in sections:
+            sections.append(section)
+    return sections
+
+
+def leaf_paths(schema=EMR_SCHEMA, prefix=()):
+    """Dotted paths of every leaf field, in schema order."""
+    paths = []
+    for key, child in schema.items():
+        if isinstance(child, dict):
+            paths.extend(leaf_paths(child, prefix + (key,)))
+        else:
+            paths.append(".".join(prefix + (key,)))
+    return paths
+
+
+def covered(path, paths):
+    """True if `path` or every leaf below it is in `paths`."""
+    if path in paths:
+        return True
+    schema = EMR_SCHEMA
+    for key in path.split("."):
+        schema = schema.get(key) if isinstance(schema, dict) else None
+    if not isinstance(schema, dict):
+        return False
+    return all(f"{path}.{leaf}" in paths for leaf in leaf_paths(schema))
+
+
+def _template(schema, path, exclude, compact):
+    if isinstance(schema, dict):
+        children = {}
+        for key, child in schema.items():
+            child_path = f"{path}.{key}"
+            if not covered(child_path, exclude):
+                children[key] = _template(child, child_path, exclude, compact)
+        return children
+    if compact:
+        return copy.deepcopy(schema)
+    if isinstance(schema, bool):
+        return False
+    if isinstance(schema, list):
+        return ["string"]
+    return "string"
+
+
+def schema_template(sections=None, exclude=(), compact=False):
+    """JSON structure with type placeholders, optionally limited to some top-level keys.
+
+    Leaf paths in `exclude` (and sections left empty by it) are left out.
+    `compact` renders each leaf as its default ("", false, []) on one line,
+    which takes about a third fewer tokens than the indented placeholders.
+    """
+    keys = [key for key in sections or list(EMR_SCHEMA) if not covered(key, exclude)]
+    structure = {key: _template(EMR_SCHEMA[key], key, exclude, compact) for key in keys}
+    if compact:
+        return json.dumps(structure, separators=(",", ":"))
+    return json.dumps(structure, indent=4)
@@ -0,0 +1,266 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS emr_reports ("
+    "appointment_id TEXT PRIMARY KEY, patient_id TEXT, session_id TEXT, "
+    "created REAL NOT NULL, updated REAL NOT NULL, report BLOB NOT NULL, transcript BLOB, analysis BLOB)",
+    "CREATE INDEX IF NOT EXISTS emr_reports_patient ON emr_reports (patient_id, created)",
+    "CREATE INDEX IF NOT EXISTS emr_reports_created ON emr_reports (created)",
+)
+# The primary key indexes appointment IDs; a second save of an appointment replaces the report
+UPSERT = (
+    "INSERT INTO emr_reports (appointment_id, patient_id, session_id, created, updated, report, transcript, analysis) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (appointment_id) DO UPDATE SET "
+    "patient_id = COALESCE(excluded.patient_id, patient_id), session_id = COALESCE(excluded.session_id, session_id), "
+    "updated = excluded.updated, report = excluded.report, "
+    "transcript = COALESCE(excluded.transcript, transcript), analysis = COALESCE(excluded.analysis, analysis)"
+)
+SUMMARY_COLUMNS = "appointment_id, patient_id, session_id, created, updated"
+
+
+def compress(value, level=6):
+    """zlib-compressed compact JSON (or plain text) for a BLOB column; None stays None."""
+    if value is None:
+        return None
+    text = value if isinstance(value, str) else json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+    return zlib.compress(text.encode("utf-8"), level)
+
+
+def decompress(blob, as_json=True):
+    if blob is None:
+        return None
+    text = zlib.decompress(blob).decode("utf-8")
+    return json.loads(text) if as_json else text
+
+
+def parse_time(value):
+    """Epoch seconds from epoch seconds or an ISO 8601 date/time string (local time if no zone); None passes through."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def encode_cursor(created, appointment_id):
+    return f"{created!r}:{appointment_id}"
+
+
+def decode_cursor(cursor):
+    created, _, appointment_id = cursor.partition(":")
+    if not appointment_id:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return float(created), appointment_id
+
+
+def _summary(row):
+    appointment_id, patient_id, session_id, created, updated = row
+    return {
+        "appointmentId": appointment_id,
+        "patientId": patient_id,
+        "sessionId": session_id,
+        "created": created,
+        "updated": updated,
+    }
+
+
+class EMRStore:
+    """Saved EMR reports in one SQLite file, indexed by appointment, patient and time.
+
+    The database runs in WAL mode so queries never wait for a write.
+    `save()` queues the record and resolves once it is committed; a
+    background task writes whatever has queued up in one transaction, so
+    concurrent saves share a commit (and its fsync). Reports, transcripts
+    and analyses are stored as zlib-compressed JSON. Compression and all
+    SQLite calls run in worker threads so the event loop never blocks on them.
+    """
+
+    def __init__(self, db_path, batch_size=64, batch_wait=0.01, compression_level=6):
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait = max(0.0, float(batch_wait))
+        self.compression_level = compression_level
+        self._writer_db = self._connect()
+        for statement in SCHEMA:
+            self._writer_db.execute(statement)
+        self._writer_db.commit()
+        self._reader_db = self._connect()
+        self._writer_lock = threading.Lock()
+        self._reader_lock = threading.Lock()
+        self._queue = None
+        self._writer = None
+        # Metrics
+        self.saves = 0
+        self.batches = 0
+        self.failures = 0
+        self.stored_bytes = 0
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        # Every commit reaches the disk; batching keeps that to one sync per batch
+        db.execute("PRAGMA synchronous=FULL")
+        return db
+
+    @property
+    def running(self):
+        return self._writer is not None and not self._writer.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+        logger.info(f"EMR store opened at {self.db_path} (batch_size={self.batch_size})")
+
+    async def stop(self):
+        if self._writer is not None:
+            # Commit what was already accepted before closing
+            await self._queue.join()
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        with self._writer_lock, self._reader_lock:
+            self._writer_db.close()
+            self._reader_db.close()
+
+    async def save(self, appointment_id, report, patient_id=None, session_id=None, transcript=None, analysis=None):
+        """Store the report for an appointment, replacing an earlier one; returns its summary once committed."""
+        if not self.running:
+            raise RuntimeError("EMR store is not running")
+        # Compressed per save, so a value that cannot be serialized fails this save only,
+        # and in a worker thread, so a long transcript does not hold up the event loop
+        row = await asyncio.to_thread(
+            self._row, appointment_id, report, patient_id, session_id, transcript, analysis
+        )
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    def _row(self, appointment_id, report, patient_id, session_id, transcript, analysis):
+        now = time.time()
+        return (
+            str(appointment_id),
+            str(patient_id) if patient_id is not None else None,
+            session_id,
+            now,
+            now,
+            *(compress(value, self.compression_level) for value in (report, transcript, analysis)),
+        )
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            # Let concurrent saves join this commit
+            if self.batch_wait:
+                await asyncio.sleep(self.batch_wait)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                summaries = await asyncio.to_thread(self._write_batch, [row for row, _ in batch])
+            except Exception as e:
+                # Fail this batch's saves but keep the writer running for the next ones
+                self.failures += len(batch)
+                logger.error(f"Failed to write {len(batch)} EMR reports: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), summary in zip(batch, summaries):
+                    if not future.done():
+                        future.set_result(summary)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, rows):
+        with self._writer_lock:
+            with self._writer_db:
+                self._writer_db.executemany(UPSERT, rows)
+            summaries = [
+                _summary(self._writer_db.execute(
+                    f"SELECT {SUMMARY_COLUMNS} FROM emr_reports WHERE appointment_id = ?", (row[0],)
+                ).fetchone())
+                for row in rows
+            ]
+        self.saves += len(rows)
+        self.batches += 1
+        self.stored_bytes += sum(len(blob) for row in rows for blob in row[5:] if blob is not None)
+        return summaries
+
+    async def get(self, appointment_id):
+        """The full record for an appointment, or None."""
+        return await asyncio.to_thread(self._get, str(appointment_id))
+
+    def _get(self, appointment_id):
+        with self._reader_lock:
+            row = self._reader_db.execute(
+                f"SELECT {SUMMARY_COLUMNS}, report, transcript, analysis FROM emr_reports WHERE appointment_id = ?",
+                (appointment_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            **_summary(row[:5]),
+            "emrReport": decompress(row[5]),
+            "transcript": decompress(row[6], as_json=False),
+            "analysis": decompress(row[7]),
+        }
+
+    async def query(self, patient_id=None, since=None, until=None, limit=50, cursor=None):
+        """Summaries newest first, with a cursor for the next page (None on the last one).
+
+        `since` and `until` bound the creation time in epoch seconds. Pages
+        are keyed on (created, appointment_id), so saves made while paging
+        neither repeat nor skip rows.
+        """
+        return await asyncio.to_thread(self._query, patient_id, since, until, limit, cursor)
+
+    def _query(self, patient_id, since, until, limit, cursor):
+        conditions, parameters = [], []
+        if patient_id is not None:
+            conditions.append("patient_id = ?")
+            parameters.append(str(patient_id))
+        if since is not None:
+            conditions.append("created >= ?")
+            parameters.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            parameters.append(until)
+        if cursor:
+            created, appointment_id = decode_cursor(cursor)
+            conditions.append("(created < ? OR (created = ? AND appointment_id < ?))")
+            parameters.extend((created, created, appointment_id))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._reader_lock:
+            rows = self._reader_db.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM emr_reports {where} "
+                "ORDER BY created DESC, appointment_id DESC LIMIT ?",
+                (*parameters, limit + 1),
+            ).fetchall()
+        items = [_summary(row) for row in rows[:limit]]
+        next_cursor = encode_cursor(rows[limit - 1][3], rows[limit - 1][0]) if len(rows) > limit else None
+        return {"items": items, "next": next_cursor}
+
+    def stats(self):
+        return {
+            "saves": self.saves,
+            "batches": self.batches,
+            "avg_batch_size": self.saves / self.batches if self.batches else 0.0,
+            "failures": self.failures,
+            "pending": self._queue.qsize() if self._queue else 0,
+            "stored_bytes": self.stored_bytes,
+        }
@@ -0,0 +1,413 @@
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+
+import httpx
+import websockets
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from metrics import DEFAULT_REGISTRY as METRICS, Counter, Gauge
+from session_store import valid_session_id
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = FastAPI()
+
+# Transcription nodes (transcription_server.py instances), comma separated base URLs
+GATEWAY_NODES = os.getenv("GATEWAY_NODES", "http://127.0.0.1:8001")
+# Health checks: poll interval and timeout in seconds, and failed polls before a node is taken out
+HEALTH_INTERVAL = float(os.getenv("GATEWAY_HEALTH_INTERVAL", "2"))
+HEALTH_TIMEOUT = float(os.getenv("GATEWAY_HEALTH_TIMEOUT", "2"))
+HEALTH_FAILURES = int(os.getenv("GATEWAY_HEALTH_FAILURES", "3"))
+# Session routes kept for resumes; older sessions are looked up on the nodes
+AFFINITY_SIZE = int(os.getenv("GATEWAY_AFFINITY_SIZE", "10000"))
+
+# WebSocket close codes: "service restart" (reconnect and resume) and "try again later"
+CLOSE_NODE_LOST = 1012
+CLOSE_NO_NODES = 1013
+
+
+class Node:
+    """One transcription node as the gateway sees it, from its last /node/status poll."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.ws_url = self.url.replace("http", "ws", 1) + "/transcription"
+        self.status = {}
+        self.healthy = False
+        # Reported by the node, and set through the gateway (kept even if the node missed it)
+        self.draining = False
+        self.drained = False
+        self.failures = 0
+        self.connections = 0
+        # Sessions placed here since the last poll, which the node has not reported yet
+        self.routed = 0
+
+    @property
+    def available(self):
+        return self.healthy and not self.draining and not self.drained
+
+    def load(self):
+        """(busy fraction, queue depth); degraded sessions count twice since they show the node is behind."""
+        busy = self.status.get("recording", 0) + self.status.get("degraded", 0) + self.routed
+        return busy / max(self.status.get("capacity", 1), 1), self.status.get("queue_depth", 0)
+
+    def update(self, status):
+        self.status = status
+        self.routed = 0
+        self.failures = 0
+        self.draining = bool(status.get("draining"))
+        if status.get("ready") and not self.healthy:
+            logger.info(f"Node {self.url} is healthy")
+        self.healthy = bool(status.get("ready"))
+
+    def fail(self, error, threshold):
+        self.failures += 1
+        if self.healthy and self.failures >= threshold:
+            logger.warning(f"Node {self.url} failed {self.failures} health checks ({error}), taking it out")
+            self.healthy = False
+
+    def describe(self):
+        busy, queue_depth = self.load()
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "draining": self.draining,
+            "drained": self.drained,
+            "failures": self.failures,
+            "connections": self.connections,
+            "load": busy,
+            "queue_depth": queue_depth,
+            "status": self.status,
+        }
+
+
+class NodeRouter:
+    """Places sessions on transcription nodes and remembers where they went.
+
+    New sessions go to the healthy, non-draining node with the lowest
+    recording load per unit of capacity. A resumed session goes back to the
+    node that holds it: known routes are kept in a bounded LRU map, and an
+    unknown session (e.g. after a gateway restart) is looked up on every
+    node, so the gateway itself holds nothing that cannot be rebuilt.
+    """
+
+    def __init__(self, urls, interval=2.0, timeout=2.0, failures=3, affinity_size=10000):
+        self.nodes = [Node(url) for url in urls]
+        self.interval = interval
+        self.timeout = timeout
+        self.failures = failures
+        self.affinity_size = affinity_size
+        self.affinity = OrderedDict()
+        self._client = None
+        self._poller = None
+
+    async def start(self):
+        self._client = httpx.AsyncClient(timeout=self.timeout)
+        await self.check_all()
+        self._poller = asyncio.create_task(self._poll_loop())
+        logger.info(f"Routing to {len(self.nodes)} nodes ({sum(node.healthy for node in self.nodes)} healthy)")
+
+    async def stop(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except asyncio.CancelledError:
+                pass
+            self._poller = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def check(self, node):
+        try:
+            response = await self._client.get(f"{node.url}/node/status")
+            response.raise_for_status()
+            node.update(response.json())
+        except Exception as e:
+            node.fail(e, self.failures)
+
+    async def check_all(self):
+        await asyncio.gather(*(self.check(node) for node in self.nodes))
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.check_all()
+
+    def pick(self):
+        """The least loaded available node for a new session, or None."""
+        candidates = [node for node in self.nodes if node.available]
+        if not candidates:
+            return None
+        node = min(candidates, key=Node.load)
+        node.routed += 1
+        return node
+
+    def remember(self, session_id, node):
+        self.affinity[session_id] = node
+        self.affinity.move_to_end(session_id)
+        while len(self.affinity) > self.affinity_size:
+            self.affinity.popitem(last=False)
+
+    async def lookup(self, node, session_id):
+        """The node's /sessions entry for `session_id`, or None."""
+        try:
+            response = await self._client.get(f"{node.url}/sessions/{session_id}")
+        except Exception as e:
+            logger.warning(f"Session lookup on {node.url} failed: {e}")
+            return None
+        return response.json() if response.status_code == 200 else None
+
+    async def locate(self, session_id):
+        """The node holding `session_id`, or None if no healthy node knows it.
+
+        Every node is asked: the node running the session wins over one that
+        only has its journal on shared storage, and among those a node still
+        taking sessions wins over a draining one.
+        """
+        node = self.affinity.get(session_id)
+        if node is not None and node.healthy:
+            return node
+        if not valid_session_id(session_id):
+            return None
+        # Draining nodes still serve their own sessions
+        nodes = [node for node in self.nodes if node.healthy]
+        found = await asyncio.gather(*(self.lookup(node, session_id) for node in nodes))
+        holders = [(node, info) for node, info in zip(nodes, found) if info is not None]
+        if not holders:
+            return None
+        node, _ = min(holders, key=lambda holder: (not holder[1].get("live"), not holder[0].available))
+        self.remember(session_id, node)
+        return node
+
+    async def drain(self, node, draining=True):
+        """Stop (or resume) placing new sessions on `node`, and tell the node."""
+        node.drained = draining
+        response = await (self._client.post if draining else self._client.delete)(f"{node.url}/node/drain")
+        response.raise_for_status()
+        node.update(response.json())
+        return node.describe()
+
+
+ROUTER = NodeRouter(
+    [url.strip() for url in GATEWAY_NODES.split(",") if url.strip()],
+    interval=HEALTH_INTERVAL,
+    timeout=HEALTH_TIMEOUT,
+    failures=HEALTH_FAILURES,
+    affinity_size=AFFINITY_SIZE,
+)
+
+ROUTED_SESSIONS = Counter("gateway_routed_connections", "Client connections opened to a node, by node", labels=("node",))
+REJECTED_SESSIONS = Counter("gateway_rejected_connections", "Client connections refused because no node was available")
+UPSTREAM_FAILURES = Counter("gateway_upstream_failures", "Failed or lost node connections, by node", labels=("node",))
+Gauge("gateway_available_nodes", "Healthy nodes taking new sessions", function=lambda: sum(node.available for node in ROUTER.nodes))
+Gauge("gateway_connections", "Client connections being relayed", function=lambda: sum(node.connections for node in ROUTER.nodes))
+
+
+class RelayedConnection:
+    """Relays one client WebSocket to the node serving its session.
+
+    The first command opens the node connection: a "resume" goes to the
+    node holding that session, anything else to the least loaded node. A
+    later "resume" for a session on another node moves the connection
+    there. Session IDs in "started" and "resumed" replies are recorded so
+    reconnects find their node. If the node connection drops, the client
+    is closed with 1012 so it reconnects and resumes.
+    """
+
+    def __init__(self, websocket, router):
+        self.websocket = websocket
+        self.router = router
+        self.node = None
+        self.upstream = None
+        self.reader = None
+
+    async def target(self, text):
+        """The node a client command must go to, or None if any node will do."""
+        if '"resume"' not in text:
+            return None
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return None
+        if data.get("command") != "resume":
+            return None
+        return await self.router.locate(data.get("sessionId"))
+
+    async def connect(self, node):
+        await self.disconnect()
+        try:
+            self.upstream = await websockets.connect(node.ws_url, max_size=None)
+        except Exception:
+            UPSTREAM_FAILURES.inc(node=node.url)
+            raise
+        self.node = node
+        node.connections += 1
+        ROUTED_SESSIONS.inc(node=node.url)
+        self.reader = asyncio.create_task(self.relay_replies(self.upstream, node))
+
+    async def disconnect(self):
+        if self.reader is not None:
+            self.reader.cancel()
+            try:
+                await self.reader
+            except asyncio.CancelledError:
+                pass
+            self.reader = None
+        if self.upstream is not None:
+            self.node.connections -= 1
+            await self.upstream.close()
+            self.upstream = None
+
+    async def relay_replies(self, upstream, node):
+        try:
+            async for message in upstream:
+                if isinstance(message, bytes):
+                    await self.websocket.send_bytes(message)
+                    continue
+                if '"sessionId"' in message:
+                    data = json.loads(message)
+                    if data.get("type") in ("started", "resumed"):
+                        self.router.remember(data["sessionId"], node)
+                await self.websocket.send_text(message)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception as e:
+            # The client went away; run() notices and cleans up
+            logger.debug(f"Relaying from {node.url} stopped: {e}")
+            return
+        # The node went away under a live client; it can resume wherever the session is now
+        UPSTREAM_FAILURES.inc(node=node.url)
+        logger.warning(f"Lost connection to {node.url}, closing client")
+        try:
+            await self.websocket.close(code=CLOSE_NODE_LOST)
+        except Exception:
+            pass
+
+    async def reject(self):
+        REJECTED_SESSIONS.inc()
+        await self.websocket.send_text(json.dumps({
+            "type": "error",
+            "message": "No transcription nodes available"
+        }))
+        await self.websocket.close(code=CLOSE_NO_NODES)
+
+    async def run(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    # Audio only means something to the node a "start" already went to
+                    if self.upstream is not None:
+                        await self.upstream.send(message["bytes"])
+                    continue
+                text = message.get("text") or "{}"
+                node = await self.target(text)
+                if self.upstream is None or (node is not None and node is not self.node):
+                    node = node or self.router.pick()
+                    if node is None:
+                        await self.reject()
+                        break
+                    await self.connect(node)
+                await self.upstream.send(text)
+        finally:
+            await self.disconnect()
+
+
+@app.on_event("startup")
+async def start_router():
+    await ROUTER.start()
+
+@app.on_event("shutdown")
+async def stop_router():
+    await ROUTER.stop()
+
+@app.get("/ready")
+async def readiness():
+    available = sum(node.available for node in ROUTER.nodes)
+    return JSONResponse({"ready": available > 0, "available_nodes": available}, status_code=200 if available else 503)
+
+@app.get("/nodes")
+async def list_nodes():
+    return [node.describe() for node in ROUTER.nodes]
+
+@app.post("/nodes/{index}/drain")
+async def drain_node(index: int):
+    return await set_draining(index, True)
+
+@app.delete("/nodes/{index}/drain")
+async def undrain_node(index: int):
+    return await set_draining(index, False)
+
+async def set_draining(index, draining):
+    if not 0 <= index < len(ROUTER.nodes):
+        return JSONResponse({"error": "No such node"}, status_code=404)
+    try:
+        return await ROUTER.drain(ROUTER.nodes[index], draining)
+    except httpx.HTTPError as e:
+        # The gateway keeps the new state even if the node did not hear about it
+        return JSONResponse({"error": f"Node did not respond: {e}", **ROUTER.nodes[index].describe()}, status_code=502)
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+@app.websocket("/transcription")
+async def transcription_endpoint(websocket: WebSocket):
+    await websocket.accept()
+    connection = RelayedConnection(websocket, ROUTER)
+    try:
+        await connection.run()
+    except Exception as e:
+        logger.error(f"Relay for client {id(websocket)} failed: {e}")
+
+
+def spawn_nodes(count, first_port):
+    """Start `count` local transcription nodes on consecutive ports; returns (urls, processes)."""
+    root = os.path.dirname(os.path.abspath(__file__))
+    urls, processes = [], []
+    for port in range(first_port, first_port + count):
+        processes.append(subprocess.Popen(
+            [sys.executable, "transcription_server.py", "--port", str(port), "--host", "127.0.0.1"],
+            cwd=root,
+        ))
+        urls.append(f"http://127.0.0.1:{port}")
+        logger.info(f"Started local node on port {port} (pid {processes[-1].pid})")
+    return urls, processes
+
+
+if __name__ == "__main__":
+    import argparse
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Vitalis gateway: routes transcription sessions across nodes")
+    parser.add_argument("--nodes", help="Comma separated node URLs (default: $GATEWAY_NODES)")
+    parser.add_argument("--spawn", type=int, default=0, help="Start this many local nodes on the ports after --port")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        urls, processes = spawn_nodes(args.spawn, args.port + 1)
+    else:
+        urls = [url.strip() for url in (args.nodes or GATEWAY_NODES).split(",") if url.strip()]
+    ROUTER.nodes = [Node(url) for url in urls]
+
+    try:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="info")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=30)
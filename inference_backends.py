@@ -0,0 +1,137 @@
+from inference_scheduler import LOGPROB_THRESHOLD, NO_SPEECH_THRESHOLD, make_whisper_batch_decoder
+
+
+class WhisperBackend:
+    """Reference openai-whisper model decoded in padded log-mel batches.
+
+    Every backend exposes the same `decode_batch(audios, prompts)` callable
+    returning one dict per window with "text", "segments", "avg_logprob" and
+    "no_speech_prob", so the scheduler does not care which engine runs.
+    """
+
+    name = "whisper"
+    compute_types = ("float16", "float32")
+    # Accepts precomputed Whisper log-mel inputs through decode_batch(..., mels=)
+    log_mel_input = True
+
+    def __init__(self, model_name, device, compute_type, threads=None):
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type
+        self.threads = threads
+        self.model = None
+        self._decode = None
+
+    @classmethod
+    def default_compute_type(cls, device):
+        return "float16" if device == "cuda" else "float32"
+
+    def _set_threads(self):
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+
+    def _load_model(self):
+        import whisper
+        return whisper.load_model(self.model_name, device=self.device)
+
+    def load(self):
+        self._set_threads()
+        self.model = self._load_model()
+        self._decode = make_whisper_batch_decoder(self.model, fp16=self.compute_type == "float16")
+        return self
+
+    def decode_batch(self, audios, prompts, mels=None):
+        return self._decode(audios, prompts, mels)
+
+
+class QuantizedWhisperBackend(WhisperBackend):
+    """openai-whisper with its Linear layers dynamically quantized to int8 (CPU only)."""
+
+    name = "whisper-int8"
+    compute_types = ("int8",)
+
+    @classmethod
+    def default_compute_type(cls, device):
+        return "int8"
+
+    def _load_model(self):
+        import torch
+        import whisper
+
+        if self.device != "cpu":
+            raise ValueError("Dynamic int8 quantization is only supported on CPU")
+        model = whisper.load_model(self.model_name, device="cpu")
+        # whisper.model.Linear only adds dtype casting, which is a no-op in float32;
+        # swap it for nn.Linear so quantize_dynamic recognizes the layers
+        for module in model.modules():
+            if isinstance(module, whisper.model.Linear):
+                module.__class__ = torch.nn.Linear
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class FasterWhisperBackend:
+    """CTranslate2 engine through the optional faster-whisper package."""
+
+    name = "faster-whisper"
+    compute_types = ("int8", "int8_float16", "float16", "float32")
+    # CTranslate2 computes its own features from the audio
+    log_mel_input = False
+
+    def __init__(self, model_name, device, compute_type, threads=None):
+        self.model_name = model_name
+        self.device = device
+        self.compute_type = compute_type
+        self.threads = threads
+        self.model = None
+
+    @classmethod
+    def default_compute_type(cls, device):
+        return "float16" if device == "cuda" else "int8"
+
+    def load(self):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise ImportError("The faster-whisper backend requires the 'faster-whisper' package")
+        self.model = WhisperModel(
+            self.model_name,
+            device=self.device,
+            compute_type=self.compute_type,
+            cpu_threads=self.threads or 0,
+        )
+        return self
+
+    def decode_batch(self, audios, prompts):
+        decoded = []
+        for audio, prompt in zip(audios, prompts):
+            segments, _ = self.model.transcribe(
+                audio,
+                language="en",
+                beam_size=1,
+                best_of=1,
+                temperature=0.0,
+                initial_prompt=prompt,
+                condition_on_previous_text=False,
+            )
+            kept = [
+                segment for segment in segments
+                if not (segment.no_speech_prob > NO_SPEECH_THRESHOLD and segment.avg_logprob < LOGPROB_THRESHOLD)
+            ]
+            decoded.append({
+                "text": " ".join(segment.text.strip() for segment in kept).strip(),
+                "segments": [
+                    {"start": segment.start, "end": segment.end, "text": segment.text.strip()}
+                    for segment in kept
+                ],
+                "avg_logprob": min((segment.avg_logprob for segment in kept), default=0.0),
+                "no_speech_prob": max((segment.no_speech_prob for segment in kept), default=1.0),
+            })
+        return decoded
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    QuantizedWhisperBackend.name: QuantizedWhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
@@ -0,0 +1,279 @@
+import asyncio
+import logging
+import time
+from dataclasses import replace
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from metrics import Histogram, RATIO_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Same thresholds whisper.transcribe uses to drop segments that are probably silence
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+SAMPLE_RATE = 16000
+# Seconds per Whisper timestamp token
+TIME_PRECISION = 0.02
+
+QUEUE_WAIT = Histogram(
+    "inference_queue_wait_seconds", "Time a window waited before decoding started", labels=("executor",)
+)
+INFERENCE_TIME = Histogram(
+    "inference_seconds", "Time spent decoding a batch (scheduler) or window (workers)", labels=("executor",)
+)
+BATCH_FILL = Histogram(
+    "inference_batch_fill_ratio", "Windows per batch relative to the maximum batch size", buckets=RATIO_BUCKETS
+)
+
+
+class _PendingWindow:
+    __slots__ = ("session_id", "audio", "prompt", "model", "mel", "future", "enqueued_at")
+
+    def __init__(self, session_id, audio, prompt, model, mel, future):
+        self.session_id = session_id
+        self.audio = audio
+        self.prompt = prompt
+        self.model = model
+        self.mel = mel
+        self.future = future
+        self.enqueued_at = time.perf_counter()
+
+
+class InferenceScheduler:
+    """Collects audio windows from all sessions and decodes them in batches.
+
+    Windows are queued per session and batches are filled round-robin across
+    sessions, so one busy connection cannot starve the others. A single worker
+    thread owns the model; a batch is dispatched as soon as it is full or the
+    oldest window has waited `max_wait` seconds. Windows submitted with a
+    `model` (e.g. a fallback under load) are batched only with windows for
+    the same model, and decode_batch receives it as a third argument.
+    Windows submitted with a precomputed log-mel input (see mel_features)
+    pass it on as `mels=`, one entry per window with None for the rest.
+    """
+
+    def __init__(self, decode_batch, max_batch_size=8, max_wait=0.05):
+        self.decode_batch = decode_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queues = OrderedDict()
+        self._pending = 0
+        self._wakeup = None
+        self._worker = None
+        self._executor = None
+        # Metrics
+        self.batches_run = 0
+        self.windows_decoded = 0
+        self.total_queue_wait = 0.0
+        self.last_batch_size = 0
+
+    @property
+    def queue_depth(self):
+        return self._pending
+
+    @property
+    def running(self):
+        return self._worker is not None and not self._worker.done()
+
+    def start(self):
+        if self.running:
+            return
+        self._wakeup = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper-batch")
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"Inference scheduler started (max_batch_size={self.max_batch_size}, max_wait={self.max_wait}s)")
+
+    async def stop(self):
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for queue in self._queues.values():
+            for item in queue:
+                if not item.future.done():
+                    item.future.cancel()
+        self._queues.clear()
+        self._pending = 0
+        if self._executor:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def submit(self, session_id, audio, prompt=None, model=None, mel=None):
+        if not self.running:
+            raise RuntimeError("Inference scheduler is not running")
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(session_id, deque()).append(_PendingWindow(session_id, audio, prompt, model, mel, future))
+        self._pending += 1
+        self._wakeup.set()
+        return await future
+
+    def metrics(self):
+        return {
+            "queue_depth": self._pending,
+            "sessions_waiting": len(self._queues),
+            "batches_run": self.batches_run,
+            "windows_decoded": self.windows_decoded,
+            "max_batch_size": self.max_batch_size,
+            "last_batch_size": self.last_batch_size,
+            "avg_batch_fill": (self.windows_decoded / (self.batches_run * self.max_batch_size)) if self.batches_run else 0.0,
+            "avg_queue_wait_ms": (self.total_queue_wait / self.windows_decoded * 1000) if self.windows_decoded else 0.0,
+        }
+
+    def _take_batch(self):
+        batch = []
+        model = next(iter(self._queues.values()))[0].model if self._queues else None
+        while self._queues and len(batch) < self.max_batch_size:
+            taken = False
+            # One window per session per round, then rotate the session to the back
+            for session_id in list(self._queues):
+                queue = self._queues[session_id]
+                if queue[0].model != model:
+                    continue
+                taken = True
+                item = queue.popleft()
+                self._pending -= 1
+                if queue:
+                    self._queues.move_to_end(session_id)
+                else:
+                    del self._queues[session_id]
+                if not item.future.done():
+                    batch.append(item)
+                if len(batch) >= self.max_batch_size:
+                    break
+            if not taken:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+
+            # Give other sessions a short window to fill the batch
+            deadline = loop.time() + self.max_wait
+            while self._pending < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            batch = self._take_batch()
+            if self._pending == 0:
+                self._wakeup.clear()
+            else:
+                self._wakeup.set()
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            for item in batch:
+                self.total_queue_wait += started - item.enqueued_at
+                QUEUE_WAIT.observe(started - item.enqueued_at, executor="scheduler")
+            BATCH_FILL.observe(len(batch) / self.max_batch_size)
+            arguments = [[item.audio for item in batch], [item.prompt for item in batch]]
+            if batch[0].model is not None:
+                arguments.append(batch[0].model)
+            decode_batch = self.decode_batch
+            if any(item.mel is not None for item in batch):
+                decode_batch = partial(decode_batch, mels=[item.mel for item in batch])
+            try:
+                results = await loop.run_in_executor(self._executor, decode_batch, *arguments)
+            except Exception as e:
+                logger.error(f"Batched inference failed: {e}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+
+            INFERENCE_TIME.observe(time.perf_counter() - started, executor="scheduler")
+            self.batches_run += 1
+            self.windows_decoded += len(batch)
+            self.last_batch_size = len(batch)
+            for item, result in zip(batch, results):
+                if not item.future.done():
+                    item.future.set_result(result)
+
+
+def _split_segments(tokens, tokenizer, duration):
+    # Rebuild timed segments from the timestamp tokens interleaved in the output
+    segments = []
+    start = 0.0
+    text_tokens = []
+    for token in tokens:
+        if token >= tokenizer.timestamp_begin:
+            timestamp = (token - tokenizer.timestamp_begin) * TIME_PRECISION
+            if text_tokens:
+                text = tokenizer.decode(text_tokens).strip()
+                if text:
+                    segments.append({"start": start, "end": timestamp, "text": text})
+                text_tokens = []
+            start = timestamp
+        else:
+            text_tokens.append(token)
+    if text_tokens:
+        text = tokenizer.decode(text_tokens).strip()
+        if text:
+            segments.append({"start": start, "end": max(start, duration), "text": text})
+    return segments
+
+
+def make_whisper_batch_decoder(model, fp16=False, language="en"):
+    """Build a decode_batch callable running padded log-mel batches through `model`.
+
+    Windows sharing the same prompt go through one batched forward pass; a
+    prompt is part of the decoder prefix, so differing prompts need separate
+    passes. A window with a matching entry in `mels` uses that log-mel input
+    instead of computing it from the audio.
+    """
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    tokenizer = get_tokenizer(model.is_multilingual, language=language, task="transcribe")
+    options = whisper.DecodingOptions(
+        language=language,
+        fp16=fp16,
+        temperature=0.0,
+    )
+
+    def features(audio, mel):
+        if mel is not None and mel.shape[0] == model.dims.n_mels:
+            return torch.from_numpy(mel)
+        return whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), n_mels=model.dims.n_mels)
+
+    def decode_batch(audios, prompts, mels=None):
+        mels = mels or [None] * len(audios)
+        decoded = [None] * len(audios)
+        groups = {}
+        for index, prompt in enumerate(prompts):
+            groups.setdefault(prompt or None, []).append(index)
+
+        for prompt, indices in groups.items():
+            batch = torch.stack([features(audios[i], mels[i]) for i in indices]).to(model.device)
+            with torch.no_grad():
+                results = whisper.decode(model, batch, replace(options, prompt=prompt))
+
+            for index, result in zip(indices, results):
+                text = result.text.strip()
+                segments = _split_segments(result.tokens, tokenizer, len(audios[index]) / SAMPLE_RATE)
+                if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+                    text = ""
+                    segments = []
+                decoded[index] = {
+                    "text": text,
+                    "segments": segments,
+                    "avg_logprob": result.avg_logprob,
+                    "no_speech_prob": result.no_speech_prob,
+                }
+        return decoded
+
+    return decode_batch
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+import httpx
+
+from metrics import Counter, Histogram, SIZE_BUCKETS
+from token_budget import estimate_tokens, message_tokens
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+LLM_ROUND_TRIP = Histogram("llm_request_seconds", "LLM round-trip time of a successful request", labels=("mode",))
+LLM_RESPONSE_SIZE = Histogram(
+    "llm_response_bytes", "Size of the LLM response content", labels=("mode",), buckets=SIZE_BUCKETS
+)
+LLM_ERRORS = Counter("llm_errors", "Failed LLM attempts, including retried ones")
+LLM_TOKENS = Counter(
+    "llm_tokens", "Prompt and completion tokens, as reported by the provider or estimated", labels=("kind", "source")
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM request", labels=("mode",), buckets=SIZE_BUCKETS
+)
+
+
+class LLMRequestError(Exception):
+    pass
+
+
+class LLMClient:
+    """Async chat-completions client sharing one keep-alive connection pool.
+
+    Transport errors, timeouts and retryable status codes are retried with
+    exponential backoff and full jitter (honouring Retry-After). `stream()`
+    consumes the provider's server-sent events and yields content deltas as
+    they arrive; a streamed request is only retried before its first delta.
+    Token usage is taken from the provider's "usage" when it sends one and
+    estimated locally otherwise.
+    """
+
+    def __init__(self, base_url, api_key, model, headers=None, timeout=60.0, connect_timeout=5.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, max_connections=20):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.headers = dict(headers or {})
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.timeout,
+                limits=self.limits,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                    **self.headers,
+                },
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _usage(self, messages, content, reported, mode):
+        """Log and count one request's token usage; returns it as a dict."""
+        estimated = not reported or reported.get("prompt_tokens") is None
+        usage = {
+            "prompt_tokens": message_tokens(messages) if estimated else reported["prompt_tokens"],
+            "completion_tokens": estimate_tokens(content) if estimated else reported.get("completion_tokens", 0),
+            "estimated": estimated,
+        }
+        source = "estimated" if estimated else "reported"
+        LLM_TOKENS.inc(usage["prompt_tokens"], kind="prompt", source=source)
+        LLM_TOKENS.inc(usage["completion_tokens"], kind="completion", source=source)
+        LLM_PROMPT_TOKENS.observe(usage["prompt_tokens"], mode=mode)
+        logger.info(f"LLM tokens: {usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion"
+                    + (" (estimated)" if estimated else ""))
+        return usage
+
+    def _payload(self, messages, stream, params):
+        return {"model": self.model, "messages": messages, "stream": stream, **params}
+
+    def _backoff(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return min(float(retry_after), self.backoff_max)
+                except ValueError:
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def _retry_or_raise(self, attempt, error, response=None):
+        LLM_ERRORS.inc()
+        if attempt >= self.max_retries:
+            raise LLMRequestError(f"LLM request failed after {attempt + 1} attempts: {error}") from error
+        delay = self._backoff(attempt, response)
+        logger.warning(f"LLM request failed ({error}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def complete(self, messages, **params):
+        """Return (content, response_data) for a non-streaming completion.
+
+        response_data["usage"] always holds prompt and completion token counts.
+        """
+        payload = self._payload(messages, False, params)
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                response = await self.client.post("/chat/completions", json=payload)
+            except httpx.TransportError as e:
+                await self._retry_or_raise(attempt, e)
+                continue
+            if response.status_code in RETRY_STATUS_CODES:
+                await self._retry_or_raise(attempt, httpx.HTTPStatusError(
+                    f"HTTP {response.status_code}", request=response.request, response=response
+                ), response)
+                continue
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                LLM_ERRORS.inc()
+                raise LLMRequestError(f"LLM request rejected: {e}") from e
+
+            data = response.json()
+            LLM_ROUND_TRIP.observe(time.perf_counter() - started, mode="complete")
+            LLM_RESPONSE_SIZE.observe(len(response.content), mode="complete")
+            logger.info(f"LLM response in {time.perf_counter() - started:.2f}s ({len(response.content)} bytes)")
+            logger.debug(f"Raw LLM response: {data}")
+            if not data.get("choices") or "message" not in data["choices"][0]:
+                raise ValueError(f"Invalid response structure: {data}")
+            content = data["choices"][0]["message"]["content"]
+            data["usage"] = self._usage(messages, content or "", data.get("usage"), "complete")
+            return content, data
+
+    async def stream(self, messages, usage=None, **params):
+        """Yield content deltas from a streamed completion.
+
+        If `usage` is a dict it receives the token counts once the stream ends.
+        """
+        payload = self._payload(messages, True, params)
+        for attempt in range(self.max_retries + 1):
+            received = False
+            size = 0
+            deltas = []
+            reported = None
+            started = time.perf_counter()
+            try:
+                async with self.client.stream("POST", "/chat/completions", json=payload) as response:
+                    if response.status_code in RETRY_STATUS_CODES:
+                        await response.aread()
+                        await self._retry_or_raise(attempt, httpx.HTTPStatusError(
+                            f"HTTP {response.status_code}", request=response.request, response=response
+                        ), response)
+                        continue
+                    if response.is_error:
+                        await response.aread()
+                        LLM_ERRORS.inc()
+                        raise LLMRequestError(f"LLM request rejected: HTTP {response.status_code} {response.text}")
+
+                    async for line in response.aiter_lines():
+                        # SSE comments (": keep-alive") and blank separators carry no data
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        event = json.loads(data)
+                        if "error" in event:
+                            LLM_ERRORS.inc()
+                            raise LLMRequestError(f"LLM stream error: {event['error']}")
+                        # Providers that report usage do so in the last event
+                        reported = event.get("usage") or reported
+                        choices = event.get("choices") or []
+                        delta = choices[0].get("delta", {}).get("content") if choices else None
+                        if delta:
+                            if not received:
+                                logger.info(f"First LLM delta after {time.perf_counter() - started:.2f}s")
+                            received = True
+                            size += len(delta.encode("utf-8"))
+                            deltas.append(delta)
+                            yield delta
+                LLM_ROUND_TRIP.observe(time.perf_counter() - started, mode="stream")
+                LLM_RESPONSE_SIZE.observe(size, mode="stream")
+                logger.info(f"LLM stream finished in {time.perf_counter() - started:.2f}s")
+                counted = self._usage(messages, "".join(deltas), reported, "stream")
+                if usage is not None:
+                    usage.update(counted)
+                return
+            except httpx.TransportError as e:
+                if received:
+                    LLM_ERRORS.inc()
+                    raise LLMRequestError(f"LLM stream interrupted: {e}") from e
+                await self._retry_or_raise(attempt, e)
@@ -0,0 +1,110 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Degradation ladder, cheapest first. chunk/overlap shape the overlapping
+# windows, step is the streaming decode interval, prompt keeps the committed
+# text as decoder context and model switches to a fallback model.
+LOAD_LEVELS = (
+    {"name": "normal", "chunk": 3.0, "overlap": 0.5, "step": 1.0, "prompt": True, "model": None},
+    {"name": "reduced-overlap", "chunk": 4.0, "overlap": 0.25, "step": 2.0, "prompt": True, "model": None},
+    {"name": "large-windows", "chunk": 6.0, "overlap": 0.1, "step": 3.0, "prompt": False, "model": None},
+    {"name": "fallback-model", "chunk": 8.0, "overlap": 0.0, "step": 4.0, "prompt": False, "model": "fallback"},
+)
+
+
+def load_levels(fallback_model=None):
+    """The ladder for this deployment; the last rung needs a fallback model."""
+    levels = [dict(level) for level in LOAD_LEVELS]
+    if not fallback_model:
+        return [level for level in levels if level["model"] is None]
+    for level in levels:
+        if level["model"] is not None:
+            level["model"] = fallback_model
+    return levels
+
+
+class AdaptiveController:
+    """Picks a degradation level for one session from how far inference lags.
+
+    Each decoded window reports its load (processing time over the audio time
+    it has to keep up with), the shared inference queue depth and the
+    untranscribed backlog as a fraction of the ring buffer. Load is smoothed
+    with an exponential moving average. The level goes up after `patience`
+    overloaded windows in a row, or at once when the backlog passes
+    `backlog_high`, and comes back down one step after `recovery`
+    comfortable windows in a row, so it does not flap around a threshold.
+    """
+
+    def __init__(self, levels, load_high=0.8, load_low=0.4, queue_high=16, queue_low=4, backlog_high=0.5,
+                 patience=3, recovery=10, smoothing=0.3):
+        self.levels = list(levels)
+        self.load_high = load_high
+        self.load_low = load_low
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.backlog_high = backlog_high
+        self.patience = patience
+        self.recovery = recovery
+        self.smoothing = smoothing
+        self.index = 0
+        self.load = 0.0
+        self.over = 0
+        self.under = 0
+        self.reason = None
+
+    @property
+    def level(self):
+        return self.levels[self.index]
+
+    @property
+    def degraded(self):
+        return self.index > 0
+
+    def observe(self, load, queue_depth=0, backlog=0.0):
+        """Record one decoded window; returns the new level if it changed, else None."""
+        self.load += self.smoothing * (load - self.load)
+        if backlog >= self.backlog_high:
+            reason = f"backlog at {backlog:.0%} of the buffer"
+            self.over = self.patience
+        elif self.load > self.load_high or queue_depth > self.queue_high:
+            reason = f"load {self.load:.2f}, queue depth {queue_depth}"
+            self.over += 1
+        else:
+            reason = None
+            self.over = 0
+
+        if self.load < self.load_low and queue_depth <= self.queue_low and backlog < self.backlog_high / 2:
+            self.under += 1
+        else:
+            self.under = 0
+
+        if self.over >= self.patience and self.index < len(self.levels) - 1:
+            return self._move(self.index + 1, reason)
+        if self.under >= self.recovery and self.index > 0:
+            return self._move(self.index - 1, "load subsided")
+        return None
+
+    def escalate(self, reason):
+        """Jump one level immediately, e.g. when audio had to be skipped."""
+        if self.index < len(self.levels) - 1:
+            return self._move(self.index + 1, reason)
+        return None
+
+    def _move(self, index, reason):
+        self.index = index
+        self.over = 0
+        self.under = 0
+        self.reason = reason
+        logger.info(f"Load level -> {self.level['name']} ({reason})")
+        return self.level
+
+    def status(self):
+        return {
+            "level": self.index,
+            "name": self.level["name"],
+            "degraded": self.degraded,
+            "reason": self.reason,
+            "load": round(self.load, 3),
+            "settings": {key: value for key, value in self.level.items() if key != "name"},
+        }
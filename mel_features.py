@@ -0,0 +1,191 @@
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Whisper's front end: 25 ms Hann frames every 10 ms over a 30 s padded window
+SAMPLE_RATE = 16000
+N_FFT = 400
+HOP_LENGTH = 160
+N_SAMPLES = SAMPLE_RATE * 30
+N_FRAMES = N_SAMPLES // HOP_LENGTH
+# Frames whose 400-sample span lies inside the window: the first needs samples from -200
+FIRST_INNER_FRAME = -(-(N_FFT // 2) // HOP_LENGTH)
+# log10 floor of the power spectrum, as in whisper.log_mel_spectrogram
+LOG_FLOOR = -10.0
+
+_FILTERS = {}
+_WINDOW = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+
+
+def n_mels_for(model_name):
+    """Mel bands the named Whisper model expects (large-v3 moved to 128)."""
+    return 128 if model_name and "large-v3" in model_name else 80
+
+
+def _slaney_filters(n_mels):
+    # librosa.filters.mel(sr=16000, n_fft=400, n_mels=n_mels), which Whisper's asset file stores
+    f_sp, min_log_hz, min_log_mel, log_step = 200.0 / 3, 1000.0, 15.0, np.log(6.4) / 27.0
+
+    def to_mel(hz):
+        return np.where(hz >= min_log_hz, min_log_mel + np.log(np.maximum(hz, 1e-10) / min_log_hz) / log_step, hz / f_sp)
+
+    def to_hz(mel):
+        return np.where(mel >= min_log_mel, min_log_hz * np.exp(log_step * (mel - min_log_mel)), f_sp * mel)
+
+    bins = np.linspace(0, SAMPLE_RATE / 2, N_FFT // 2 + 1)
+    points = to_hz(np.linspace(to_mel(np.array(0.0)), to_mel(np.array(SAMPLE_RATE / 2)), n_mels + 2))
+    widths = np.diff(points)
+    ramps = points[:, None] - bins[None, :]
+    rising = -ramps[:-2] / widths[:-1, None]
+    falling = ramps[2:] / widths[1:, None]
+    filters = np.maximum(0.0, np.minimum(rising, falling))
+    filters *= (2.0 / (points[2:] - points[:-2]))[:, None]
+    return filters
+
+
+def mel_filters(n_mels=80):
+    """Whisper's (n_mels, 201) mel filterbank, from its asset file when installed."""
+    if n_mels not in _FILTERS:
+        try:
+            import whisper.audio
+            path = os.path.join(os.path.dirname(whisper.audio.__file__), "assets", "mel_filters.npz")
+            with np.load(path) as assets:
+                filters = assets[f"mel_{n_mels}"]
+        except Exception:
+            filters = _slaney_filters(n_mels)
+        _FILTERS[n_mels] = np.ascontiguousarray(filters, dtype=np.float32)
+    return _FILTERS[n_mels]
+
+
+def log_mel_frames(signal, n_mels=80):
+    """log10 mel power of every full hop-spaced frame in `signal`, as (n_mels, frames)."""
+    n_frames = 1 + (len(signal) - N_FFT) // HOP_LENGTH
+    if n_frames <= 0:
+        return np.empty((n_mels, 0), dtype=np.float32)
+    signal = np.ascontiguousarray(signal, dtype=np.float32)
+    frames = np.lib.stride_tricks.as_strided(
+        signal, shape=(n_frames, N_FFT), strides=(signal.strides[0] * HOP_LENGTH, signal.strides[0])
+    )
+    spectrum = np.fft.rfft(frames * _WINDOW)
+    power = np.square(spectrum.real, dtype=np.float32) + np.square(spectrum.imag, dtype=np.float32)
+    mel = mel_filters(n_mels) @ power.T
+    return np.log10(np.maximum(mel, 1e-30, out=mel), out=mel)
+
+
+def _finish(log_spec):
+    # Whisper's dynamic range clamp and scaling, in place
+    np.maximum(log_spec, log_spec.max() - 8.0, out=log_spec)
+    log_spec += 4.0
+    log_spec *= 0.25
+    return log_spec
+
+
+def _padded(audio, start, end):
+    """Samples [start, end) of `audio` zero-padded to 30 s and reflect-padded like torch.stft."""
+    positions = np.abs(np.arange(start, end))
+    positions = np.where(positions >= N_SAMPLES, 2 * (N_SAMPLES - 1) - positions, positions)
+    inside = positions < len(audio)
+    return np.where(inside, audio[np.minimum(positions, len(audio) - 1)], 0.0).astype(np.float32)
+
+
+def log_mel_spectrogram(audio, n_mels=80):
+    """numpy equivalent of whisper.log_mel_spectrogram(whisper.pad_or_trim(audio))."""
+    audio = np.asarray(audio, dtype=np.float32)[:N_SAMPLES]
+    signal = _padded(audio, -(N_FFT // 2), N_SAMPLES + N_FFT // 2)
+    log_spec = log_mel_frames(signal, n_mels)[:, :N_FRAMES]
+    np.maximum(log_spec, LOG_FLOOR, out=log_spec)
+    return _finish(log_spec)
+
+
+class IncrementalLogMel:
+    """Rolling cache of log-mel frames over a session's audio ring buffer.
+
+    Frames sit on a fixed 10 ms grid of absolute sample positions and are
+    computed once, when the audio they span has arrived. A window starting
+    on the grid then reuses every frame that lies fully inside it; only the
+    couple of frames that Whisper pads at each edge are computed again.
+    Peak normalization only shifts log power, so frames are cached for the
+    raw audio and shifted per window. Returns the same (n_mels, 3000) input
+    `whisper.log_mel_spectrogram(pad_or_trim(audio / peak))` would.
+    """
+
+    def __init__(self, capacity, n_mels=80):
+        self.n_mels = n_mels
+        self.capacity = int(capacity) // HOP_LENGTH + 1
+        self._frames = np.zeros((n_mels, self.capacity), dtype=np.float32)
+        self._mel = np.empty((n_mels, N_FRAMES), dtype=np.float32)
+        # Absolute index of the next frame to compute and of the oldest one held
+        self.next_frame = 0
+        self.first_frame = 0
+        self.frames_computed = 0
+        self.windows_served = 0
+
+    def reset(self):
+        self.next_frame = self.first_frame = 0
+
+    def update(self, buffer, since=0):
+        """Compute the frames that became complete in `buffer`, skipping any before sample `since`."""
+        oldest = max(buffer.start_pos, since - N_FFT)
+        first = max(self.next_frame, -(-(oldest + N_FFT // 2) // HOP_LENGTH))
+        last = (buffer.write_pos - N_FFT // 2) // HOP_LENGTH
+        if last < first:
+            return 0
+        first = max(first, last + 1 - self.capacity)
+        if first > self.next_frame:
+            self.first_frame = first
+        signal = buffer.read(first * HOP_LENGTH - N_FFT // 2, (last - first) * HOP_LENGTH + N_FFT)
+        frames = log_mel_frames(signal, self.n_mels)
+        index = first % self.capacity
+        split = min(frames.shape[1], self.capacity - index)
+        self._frames[:, index:index + split] = frames[:, :split]
+        self._frames[:, :frames.shape[1] - split] = frames[:, split:]
+        self.next_frame = last + 1
+        self.first_frame = max(self.first_frame, self.next_frame - self.capacity)
+        self.frames_computed += frames.shape[1]
+        return frames.shape[1]
+
+    def window(self, start, audio, peak=1.0):
+        """Model input for `audio` read from absolute sample `start`, or None if it is not cached.
+
+        `audio` is the window as it will be decoded (already divided by
+        `peak`); it is only read for the edge frames. The returned array is
+        reused by the next call.
+        """
+        length = min(len(audio), N_SAMPLES)
+        if start % HOP_LENGTH or length < N_FFT + HOP_LENGTH:
+            return None
+        first = start // HOP_LENGTH
+        inner_end = min((length - N_FFT // 2) // HOP_LENGTH + 1, N_FRAMES)
+        if first + FIRST_INNER_FRAME < self.first_frame or first + inner_end > self.next_frame:
+            return None
+
+        mel = self._mel
+        # Frames fully inside the window, shifted by the normalization gain
+        index = (first + FIRST_INNER_FRAME) % self.capacity
+        count = inner_end - FIRST_INNER_FRAME
+        split = min(count, self.capacity - index)
+        mel[:, FIRST_INNER_FRAME:FIRST_INNER_FRAME + split] = self._frames[:, index:index + split]
+        mel[:, FIRST_INNER_FRAME + split:inner_end] = self._frames[:, :count - split]
+        if peak > 0 and peak != 1.0:
+            mel[:, FIRST_INNER_FRAME:inner_end] -= 2.0 * np.log10(peak)
+        np.maximum(mel[:, FIRST_INNER_FRAME:inner_end], LOG_FLOOR, out=mel[:, FIRST_INNER_FRAME:inner_end])
+
+        # Edge frames see Whisper's reflection and zero padding rather than the neighbouring audio
+        mel[:, :FIRST_INNER_FRAME] = log_mel_frames(
+            _padded(audio, -(N_FFT // 2), (FIRST_INNER_FRAME - 1) * HOP_LENGTH + N_FFT // 2), self.n_mels
+        )
+        tail_end = min(-(-(length + N_FFT // 2) // HOP_LENGTH), N_FRAMES)
+        if tail_end > inner_end:
+            mel[:, inner_end:tail_end] = log_mel_frames(
+                _padded(audio[:length], inner_end * HOP_LENGTH - N_FFT // 2, (tail_end - 1) * HOP_LENGTH + N_FFT // 2),
+                self.n_mels,
+            )
+        np.maximum(mel[:, :FIRST_INNER_FRAME], LOG_FLOOR, out=mel[:, :FIRST_INNER_FRAME])
+        np.maximum(mel[:, inner_end:tail_end], LOG_FLOOR, out=mel[:, inner_end:tail_end])
+        # Silence padding up to 30 s
+        mel[:, tail_end:] = LOG_FLOOR
+        self.windows_served += 1
+        return _finish(mel)
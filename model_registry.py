@@ -0,0 +1,141 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from inference_backends import BACKENDS
+
+logger = logging.getLogger(__name__)
+
+WHISPER_MODELS = ("tiny", "tiny.en", "base", "base.en", "small", "small.en", "medium", "medium.en", "large-v3")
+COMPUTE_TYPES = ("float16", "float32", "int8", "int8_float16")
+
+
+class ModelRegistry:
+    """Loads Whisper models on first use (or at startup) and keeps them for reuse.
+
+    Importing this module never touches torch; the first `get()` pays for the
+    import and the load, and `warm_up()` runs one throwaway decode so the
+    first real request does not pay for kernel selection and allocations.
+    Models are served by the configured inference backend (see
+    inference_backends.BACKENDS).
+    """
+
+    def __init__(self, default_model="medium.en", device="auto", compute_type=None, backend="whisper", threads=None):
+        self.default_model = default_model
+        self.requested_device = device
+        self.requested_compute_type = compute_type
+        self.backend = backend
+        self.threads = threads
+        self.device = None
+        self.compute_type = None
+        self.error = None
+        self._backends = {}
+        self._timings = {}
+        self._warm = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        threads = os.getenv("WHISPER_THREADS")
+        return cls(
+            default_model=os.getenv("WHISPER_MODEL", "medium.en"),
+            device=os.getenv("WHISPER_DEVICE", "auto"),
+            compute_type=os.getenv("WHISPER_COMPUTE_TYPE") or None,
+            backend=os.getenv("WHISPER_BACKEND", "whisper"),
+            threads=int(threads) if threads else None,
+        )
+
+    def configure(self, model=None, device=None, compute_type=None, backend=None, threads=None):
+        with self._lock:
+            if self._backends:
+                raise RuntimeError("Cannot reconfigure the model registry after a model was loaded")
+            if model:
+                self.default_model = model
+            if device:
+                self.requested_device = device
+            if compute_type:
+                self.requested_compute_type = compute_type
+            if backend:
+                self.backend = backend
+            if threads:
+                self.threads = threads
+
+    def _resolve_device(self):
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{self.backend}', expected one of {sorted(BACKENDS)}")
+        backend_class = BACKENDS[self.backend]
+
+        device = self.requested_device
+        if device == "auto":
+            import torch
+            device = "cuda" if torch.cuda.is_available() else "cpu"
+        compute_type = self.requested_compute_type or backend_class.default_compute_type(device)
+        if device == "cpu" and compute_type == "float16":
+            logger.warning("float16 is not supported on CPU, using float32")
+            compute_type = "float32"
+        if compute_type not in backend_class.compute_types:
+            raise ValueError(f"Backend '{self.backend}' does not support compute type '{compute_type}', "
+                             f"expected one of {backend_class.compute_types}")
+        self.device = device
+        self.compute_type = compute_type
+
+    def get(self, name=None):
+        name = name or self.default_model
+        backend = self._backends.get(name)
+        if backend is not None:
+            return backend
+        with self._lock:
+            if name in self._backends:
+                return self._backends[name]
+            try:
+                if self.device is None:
+                    self._resolve_device()
+                logger.info(f"Loading Whisper model '{name}' with {self.backend} on {self.device} ({self.compute_type})")
+                started = time.perf_counter()
+                backend = BACKENDS[self.backend](name, self.device, self.compute_type, threads=self.threads).load()
+                self._timings[name] = {"load_seconds": time.perf_counter() - started}
+                logger.info(f"Loaded Whisper model '{name}' in {self._timings[name]['load_seconds']:.1f}s")
+            except Exception as e:
+                self.error = str(e)
+                logger.error(f"Failed to load Whisper model '{name}': {e}")
+                raise
+            self._backends[name] = backend
+            return backend
+
+    @property
+    def log_mel_input(self):
+        """True if the configured backend decodes precomputed Whisper log-mel inputs."""
+        return getattr(BACKENDS.get(self.backend), "log_mel_input", False)
+
+    def decoder(self, name=None):
+        return self.get(name).decode_batch
+
+    def warm_up(self, name=None, sample_rate=16000):
+        name = name or self.default_model
+        if name in self._warm:
+            return
+        decoder = self.decoder(name)
+        started = time.perf_counter()
+        decoder([np.zeros(sample_rate, dtype=np.float32)], [None])
+        self._timings[name]["warmup_seconds"] = time.perf_counter() - started
+        self._warm.add(name)
+        logger.info(f"Warmed up Whisper model '{name}' in {self._timings[name]['warmup_seconds']:.1f}s")
+
+    def is_ready(self, name=None):
+        return (name or self.default_model) in self._warm
+
+    def status(self):
+        return {
+            "ready": self.is_ready(),
+            "model": self.default_model,
+            "backend": self.backend,
+            "device": self.device,
+            "compute_type": self.compute_type,
+            "threads": self.threads,
+            "loaded": sorted(self._backends),
+            "timings": self._timings,
+            "error": self.error,
+        }
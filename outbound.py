@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+
+from metrics import Counter, Histogram
+
+# orjson is several times faster for the small, frequent transcript messages
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Only the newest of these matters; a queued one is replaced by the next
+COALESCED_TYPES = {"partial"}
+# Dropped first when the queue is full; everything else is never dropped
+DROPPABLE_TYPES = {"partial", "emr_partial", "heartbeat"}
+
+SEND_TIME = Histogram("websocket_send_seconds", "Time to send one WebSocket message")
+QUEUE_WAIT = Histogram("websocket_queue_wait_seconds", "Time a message waited in the outbound queue")
+DROPPED = Counter("websocket_dropped_messages", "Outbound messages dropped or coalesced", labels=("type",))
+DEAD_CLIENTS = Counter("websocket_dead_clients", "Connections closed as stalled or too slow", labels=("reason",))
+
+
+def encode(message):
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=float)
+
+
+class OutboundQueue:
+    """Per-connection send queue drained by a dedicated writer task.
+
+    `put` never blocks, so a slow browser cannot stall transcription. The
+    queue holds at most `max_size` messages: a new "partial" replaces the
+    queued one, and when full the oldest droppable message (partial,
+    emr_partial, heartbeat) makes room. If only undroppable messages are
+    queued, or a single send takes longer than `send_timeout`, the client is
+    declared dead and the socket closed so it can reconnect and resume.
+    A heartbeat is sent after `heartbeat_interval` seconds without traffic;
+    clients that answer with "pong" are also declared dead after
+    `client_timeout` seconds of silence.
+    """
+
+    def __init__(self, websocket, max_size=256, heartbeat_interval=15.0, send_timeout=10.0, client_timeout=45.0):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.heartbeat_interval = heartbeat_interval
+        self.send_timeout = send_timeout
+        self.client_timeout = client_timeout
+        # Entries are [message, enqueued_at]; a coalesced or dropped entry has message None
+        self._queue = deque()
+        self._live = 0
+        self._partial = None
+        self._ready = asyncio.Event()
+        self._writer = None
+        self._heartbeat = None
+        self.last_sent = time.monotonic()
+        self.last_seen = time.monotonic()
+        self.pong_seen = False
+        self.dead = False
+        self._sending = False
+        self.sent = 0
+
+    def start(self):
+        self._writer = asyncio.create_task(self._run())
+        if self.heartbeat_interval:
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+
+    def stop(self):
+        for task in (self._writer, self._heartbeat):
+            if task is not None:
+                task.cancel()
+        self._writer = self._heartbeat = None
+
+    async def drain(self, timeout=5.0):
+        """Wait until everything queued so far has been sent."""
+        deadline = time.monotonic() + timeout
+        while (self._live or self._sending) and not self.dead and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+
+    def mark_alive(self, pong=False):
+        self.last_seen = time.monotonic()
+        self.pong_seen = self.pong_seen or pong
+
+    def put(self, message):
+        """Queue a message; returns False once the client is dead."""
+        if self.dead:
+            return False
+        kind = message.get("type")
+        if kind in COALESCED_TYPES and self._partial is not None and self._partial[0] is not None:
+            self._partial[0] = None
+            self._live -= 1
+            DROPPED.inc(type=kind)
+
+        if self._live >= self.max_size and not self._drop_oldest():
+            self._kill("overflow", f"outbound queue full ({self._live} undroppable messages)")
+            return False
+
+        entry = [message, time.perf_counter()]
+        self._queue.append(entry)
+        self._live += 1
+        if kind in COALESCED_TYPES:
+            self._partial = entry
+        self._ready.set()
+        return True
+
+    def _drop_oldest(self):
+        for entry in self._queue:
+            message = entry[0]
+            if message is not None and message.get("type") in DROPPABLE_TYPES:
+                entry[0] = None
+                self._live -= 1
+                DROPPED.inc(type=message["type"])
+                return True
+        return False
+
+    def _kill(self, reason, detail):
+        if self.dead:
+            return
+        self.dead = True
+        DEAD_CLIENTS.inc(reason=reason)
+        logger.warning(f"Closing WebSocket client: {detail}")
+        self._queue.clear()
+        self._live = 0
+        # Closing makes the receive loop see a disconnect, which detaches the session
+        asyncio.create_task(self._close())
+
+    async def _close(self):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=1013), 5.0)
+        except Exception:
+            pass
+        self.stop()
+
+    async def _run(self):
+        while True:
+            await self._ready.wait()
+            while self._queue:
+                entry = self._queue.popleft()
+                if entry is self._partial:
+                    # Sent or dropped: a new partial must not coalesce with it
+                    self._partial = None
+                message, enqueued_at = entry
+                if message is None:
+                    continue
+                self._live -= 1
+                QUEUE_WAIT.observe(time.perf_counter() - enqueued_at)
+                started = time.perf_counter()
+                self._sending = True
+                try:
+                    await asyncio.wait_for(self.websocket.send_text(encode(message)), self.send_timeout)
+                except asyncio.TimeoutError:
+                    self._kill("stalled", f"send took longer than {self.send_timeout}s")
+                    return
+                except Exception as e:
+                    self._kill("error", f"send failed: {e}")
+                    return
+                finally:
+                    self._sending = False
+                SEND_TIME.observe(time.perf_counter() - started)
+                self.last_sent = time.monotonic()
+                self.sent += 1
+            self._ready.clear()
+
+    async def _run_heartbeat(self):
+        while not self.dead:
+            await asyncio.sleep(self.heartbeat_interval / 2)
+            now = time.monotonic()
+            if self.pong_seen and now - self.last_seen > self.client_timeout:
+                self._kill("timeout", f"no message from client for {now - self.last_seen:.0f}s")
+                return
+            if now - self.last_sent >= self.heartbeat_interval and not self._live:
+                self.put({"type": "heartbeat", "time": time.time()})
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def valid_session_id(session_id):
+    return isinstance(session_id, str) and SESSION_ID_PATTERN.fullmatch(session_id) is not None
+
+
+class SessionJournal:
+    """Append-only on-disk record of one session.
+
+    Transcript segments go to `segments.jsonl` as they are committed and raw
+    16-bit PCM audio to `audio.pcm`, so a session can be rebuilt after the
+    process restarts and the recording is never lost with the connection.
+    """
+
+    def __init__(self, directory, session_id):
+        self.path = os.path.join(directory, session_id)
+        os.makedirs(self.path, exist_ok=True)
+        self._segments = open(os.path.join(self.path, "segments.jsonl"), "a", encoding="utf-8")
+        self._audio = open(os.path.join(self.path, "audio.pcm"), "ab")
+        # Audio arrives from the capture thread, segments from the event loop
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def exists(directory, session_id):
+        return os.path.exists(os.path.join(directory, session_id, "segments.jsonl"))
+
+    @staticmethod
+    def load_segments(directory, session_id):
+        segments = []
+        with open(os.path.join(directory, session_id, "segments.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                try:
+                    segment = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash can leave the last line half written
+                    logger.warning(f"Skipping damaged journal line for session {session_id}")
+                    continue
+                # A new recording in the same session starts a new transcript
+                if segment.get("reset"):
+                    segments = []
+                else:
+                    segments.append(segment)
+        return segments
+
+    def write_segment(self, segment):
+        with self._lock:
+            if self._segments.closed:
+                return
+            self._segments.write(json.dumps(segment, ensure_ascii=False) + "\n")
+            self._segments.flush()
+
+    def write_audio(self, samples):
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+        with self._lock:
+            if not self._audio.closed:
+                self._audio.write(pcm.tobytes())
+
+    def close(self):
+        with self._lock:
+            self._segments.close()
+            self._audio.close()
+
+
+class SessionRegistry:
+    """In-process registry of transcription sessions that outlive their socket.
+
+    A session is detached when its WebSocket closes and kept for `ttl`
+    seconds so a reconnecting client can resume it; sessions left detached
+    longer than that are evicted by a background sweep, which calls their
+    `cleanup()`.
+    """
+
+    def __init__(self, ttl=300.0, sweep_interval=None):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval or max(min(ttl / 4, 30.0), 1.0)
+        self.sessions = {}
+        self.detached = {}
+        self.evicted = 0
+        self._sweeper = None
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def start(self):
+        if self.enabled and self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        for session_id in list(self.sessions):
+            self.remove(session_id)
+
+    def add(self, session_id, session):
+        self.sessions[session_id] = session
+
+    def get(self, session_id):
+        return self.sessions.get(session_id)
+
+    def attach(self, session_id):
+        self.detached.pop(session_id, None)
+        return self.sessions.get(session_id)
+
+    def detach(self, session_id):
+        if session_id in self.sessions:
+            self.detached[session_id] = time.monotonic()
+
+    def remove(self, session_id):
+        self.detached.pop(session_id, None)
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.cleanup()
+        return session
+
+    def sweep(self):
+        now = time.monotonic()
+        expired = [session_id for session_id, since in self.detached.items() if now - since > self.ttl]
+        for session_id in expired:
+            logger.info(f"Evicting idle session {session_id}")
+            self.remove(session_id)
+            self.evicted += 1
+        return len(expired)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Session sweep failed: {e}")
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "detached": len(self.detached),
+            "evicted": self.evicted,
+            "ttl": self.ttl,
+        }
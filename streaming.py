@@ -0,0 +1,198 @@
+import numpy as np
+
+from vad import contains_speech
+
+# Longest n-gram checked when removing words a new decode repeats from the committed tail
+MAX_OVERLAP_NGRAM = 5
+# Characters of committed text fed back to the decoder as a prompt
+PROMPT_CHARS = 200
+
+
+def words_from_segments(segments, offset):
+    """Split timed segments into (start, end, word) tuples in absolute seconds.
+
+    Whisper only gives segment-level times without word timestamps, so word
+    times are interpolated by character position inside each segment.
+    """
+    words = []
+    for segment in segments:
+        tokens = segment["text"].split()
+        if not tokens:
+            continue
+        start = offset + segment["start"]
+        duration = max(0.0, segment["end"] - segment["start"])
+        total_chars = sum(len(token) for token in tokens)
+        position = 0
+        for token in tokens:
+            word_start = start + duration * position / total_chars
+            position += len(token)
+            words.append((word_start, start + duration * position / total_chars, token))
+    return words
+
+
+def _normalize(word):
+    return word.lower().strip(".,!?;:\"'")
+
+
+class HypothesisBuffer:
+    """LocalAgreement-2 commit policy.
+
+    A word is committed once two consecutive decodes of the growing audio
+    prefix agree on it; everything after the agreed prefix stays tentative.
+    """
+
+    def __init__(self):
+        self.committed = []
+        self.last_committed_time = 0.0
+        # Index into `committed` of the first word spoken inside the current audio prefix
+        self.prefix_index = 0
+        self.previous = []
+        self.current = []
+
+    def reset_prefix(self):
+        self.prefix_index = len(self.committed)
+
+    def advance_prefix(self, count):
+        self.prefix_index = min(len(self.committed), self.prefix_index + count)
+
+    def insert(self, words):
+        # The prefix is decoded again from its start, so it normally repeats the
+        # words already committed from it; skip them by text
+        in_prefix = self.committed[self.prefix_index:]
+        matched = 0
+        while (matched < len(in_prefix) and matched < len(words)
+               and _normalize(in_prefix[matched][2]) == _normalize(words[matched][2])):
+            matched += 1
+        if matched == len(in_prefix):
+            self.current = words[matched:]
+            return
+
+        # The decoder revised committed words; fall back to dropping them by time
+        new = [word for word in words if word[0] > self.last_committed_time - 0.1]
+        if new and self.committed and abs(new[0][0] - self.last_committed_time) < 1:
+            # The decoder often repeats the committed tail; remove the longest repeated n-gram
+            for n in range(min(len(self.committed), len(new), MAX_OVERLAP_NGRAM), 0, -1):
+                tail = [_normalize(word[2]) for word in self.committed[-n:]]
+                head = [_normalize(word[2]) for word in new[:n]]
+                if tail == head:
+                    new = new[n:]
+                    break
+        self.current = new
+
+    def flush(self):
+        agreed = []
+        for previous, current in zip(self.previous, self.current):
+            if _normalize(previous[2]) != _normalize(current[2]):
+                break
+            agreed.append(current)
+        self.previous = self.current[len(agreed):]
+        self.current = []
+        if agreed:
+            self.committed.extend(agreed)
+            self.last_committed_time = agreed[-1][1]
+        return agreed
+
+    def force_commit(self):
+        # Commit whatever is tentative, used when the audio prefix has to be dropped
+        pending = self.previous
+        self.previous = []
+        if pending:
+            self.committed.extend(pending)
+            self.last_committed_time = pending[-1][1]
+        return pending
+
+    def tentative(self):
+        return self.previous
+
+
+class StreamingTranscriber:
+    """Incremental decoder over a growing audio prefix of an AudioRingBuffer.
+
+    Each step re-decodes the prefix since `prefix_start` with the committed
+    text as prompt, commits the words that agree with the previous step and
+    moves `prefix_start` past fully committed segments, so audio is only
+    decoded again while its words are still unstable.
+    """
+
+    def __init__(self, audio_buffer, decode, sample_rate, min_step, trim_duration, max_duration, vad):
+        self.audio_buffer = audio_buffer
+        self.decode = decode
+        self.sample_rate = sample_rate
+        self.vad = vad
+        self.min_step = int(min_step * sample_rate)
+        self.trim_duration = trim_duration
+        self.max_samples = int(max_duration * sample_rate)
+        self.window = np.zeros(self.max_samples, dtype=np.float32)
+        self.hypothesis = HypothesisBuffer()
+        self.prefix_start = audio_buffer.write_pos
+        self.decoded_until = self.prefix_start
+        # Conditioning on committed text can be switched off to shorten decoding under load
+        self.use_prompt = True
+
+    def ready(self):
+        return self.audio_buffer.write_pos - self.decoded_until >= self.min_step
+
+    def prompt(self):
+        # Committed words before the current prefix; words inside it are re-decoded anyway
+        prefix_time = self.prefix_start / self.sample_rate
+        words = [word[2] for word in self.hypothesis.committed if word[1] <= prefix_time]
+        return " ".join(words)[-PROMPT_CHARS:] or None
+
+    async def step(self):
+        """Decode the current prefix and return (final_words, partial_words)."""
+        end = self.audio_buffer.write_pos
+        if self.prefix_start < self.audio_buffer.start_pos:
+            self.prefix_start = self.audio_buffer.start_pos
+        start = max(self.prefix_start, end - self.max_samples)
+        audio = self.audio_buffer.read(start, end - start, out=self.window)
+        new_samples = end - max(start, self.decoded_until)
+        self.decoded_until = end
+
+        # Nothing tentative and only silence since the last step: no need to decode
+        if not self.hypothesis.tentative() and not contains_speech(self.vad, audio[-new_samples:]):
+            self.hypothesis.reset_prefix()
+            self.prefix_start = end
+            return [], []
+
+        # Normalize audio in place
+        peak = np.abs(audio).max()
+        if peak > 0:
+            audio *= 1.0 / peak
+
+        result = await self.decode(audio, self.prompt() if self.use_prompt else None)
+        if result is None:
+            # Decode was shed under load; the next step covers this audio again
+            return [], list(self.hypothesis.tentative())
+        offset = start / self.sample_rate
+        self.hypothesis.insert(words_from_segments(result.get("segments", []), offset))
+        final = self.hypothesis.flush()
+
+        duration = (end - self.prefix_start) / self.sample_rate
+        if end - self.prefix_start >= self.max_samples:
+            # Prefix would outgrow the window; accept the tentative words and start over
+            final += self.hypothesis.force_commit()
+            self.hypothesis.reset_prefix()
+            self.prefix_start = end
+        elif duration > self.trim_duration:
+            self._trim(result.get("segments", []), offset)
+
+        return final, list(self.hypothesis.tentative())
+
+    def finish(self):
+        return self.hypothesis.force_commit()
+
+    def _trim(self, segments, offset):
+        # Cut the prefix at the end of the last segment whose words are all committed
+        committed_words = len(self.hypothesis.committed) - self.hypothesis.prefix_index
+        cut = None
+        cut_words = 0
+        words = 0
+        for segment in segments:
+            words += len(segment["text"].split())
+            if words > committed_words:
+                break
+            cut = offset + segment["end"]
+            cut_words = words
+        if cut is not None:
+            self.prefix_start = max(self.prefix_start, int(cut * self.sample_rate))
+            self.hypothesis.advance_prefix(cut_words)
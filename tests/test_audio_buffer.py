@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from audio_buffer import AudioRingBuffer
+
+
+def samples(start, count):
+    return np.arange(start, start + count, dtype=np.float32)
+
+
+def test_reads_across_the_wrap():
+    buffer = AudioRingBuffer(10)
+    buffer.write(samples(0, 7))
+    buffer.write(samples(7, 6))
+    assert buffer.start_pos == 3
+    assert len(buffer) == 10
+    np.testing.assert_array_equal(buffer.read(5, 7), samples(5, 7))
+    out = np.zeros(10, dtype=np.float32)
+    np.testing.assert_array_equal(buffer.read(3, 10, out=out), samples(3, 10))
+    np.testing.assert_array_equal(buffer.latest(4), samples(9, 4))
+
+
+def test_contiguous_read_is_a_view():
+    buffer = AudioRingBuffer(10)
+    buffer.write(samples(0, 6))
+    view = buffer.read(1, 4)
+    buffer.write(samples(6, 10))
+    assert not np.array_equal(view, samples(1, 4))
+
+
+def test_write_longer_than_capacity_keeps_the_tail():
+    buffer = AudioRingBuffer(8)
+    buffer.write(samples(0, 3))
+    buffer.write(samples(3, 20))
+    assert buffer.write_pos == 23
+    np.testing.assert_array_equal(buffer.read(15, 8), samples(15, 8))
+
+
+def test_overwritten_and_unwritten_reads_fail():
+    buffer = AudioRingBuffer(8)
+    buffer.write(samples(0, 12))
+    with pytest.raises(ValueError, match="overwritten"):
+        buffer.read(3, 2)
+    with pytest.raises(ValueError, match="not written yet"):
+        buffer.read(10, 3)
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        AudioRingBuffer(0)
@@ -0,0 +1,32 @@
+import numpy as np
+
+from diarization import OnlineDiarizer, speaker_embedding
+
+SAMPLE_RATE = 16000
+
+
+def voice(seconds=2.0, pitch=120.0):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    harmonics = sum(np.sin(2 * np.pi * k * pitch * t) / k for k in range(1, 8))
+    return (0.2 * harmonics).astype(np.float32)
+
+
+def test_silence_opens_no_speaker():
+    diarizer = OnlineDiarizer()
+    assert diarizer.assign(np.zeros(2 * SAMPLE_RATE, dtype=np.float32)) is None
+    assert diarizer.means == []
+
+
+def test_quiet_noise_is_silence_even_after_normalization():
+    noise = (1e-4 * np.random.default_rng(0).standard_normal(2 * SAMPLE_RATE)).astype(np.float32)
+    peak = np.abs(noise).max()
+    assert speaker_embedding(noise) is None
+    assert speaker_embedding(noise / peak, peak=peak) is None
+
+
+def test_voice_opens_a_speaker():
+    audio = voice()
+    peak = np.abs(audio).max()
+    diarizer = OnlineDiarizer()
+    assert diarizer.assign(audio / peak, peak) == 0
+    assert len(diarizer.means) == 1
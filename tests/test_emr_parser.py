@@ -0,0 +1,17 @@
+from emr_parser import StreamingJSONParser, parse_json_object
+
+
+def test_mismatched_closer_keeps_later_members():
+    parser = StreamingJSONParser()
+    fields = parser.feed('{"a":[1,2},"b":3}')
+    assert fields == [("a", [1, 2]), ("b", 3)]
+    assert parser.finish() == {"a": [1, 2], "b": 3}
+    assert parser.repairs == ["mismatched '}'"]
+
+
+def test_mismatched_closer_in_nested_object():
+    assert parse_json_object('{"a":{"x":[1}, "b":2}') == {"a": {"x": [1]}, "b": 2}
+
+
+def test_mismatched_closer_at_the_end():
+    assert parse_json_object('{"a":[1,2}') == {"a": [1, 2]}
@@ -0,0 +1,57 @@
+from emr_prompt import TranscriptCompactor, clean_text, compact_segments
+
+SAMPLE_RATE = 16000
+
+
+def segment(text, start, end):
+    return {"text": text, "start": int(start * SAMPLE_RATE), "end": int(end * SAMPLE_RATE)}
+
+
+def test_non_overlapping_segments_keep_repeated_openings():
+    segments = [
+        segment("I have a headache.", 0, 2),
+        segment("I have a fever.", 2, 4),
+        segment("Do you have any pain?", 4, 6),
+        segment("Do you have any allergies?", 6, 8),
+    ]
+    for overlapping in (False, True):
+        compacted, _ = compact_segments(segments, overlapping=overlapping)
+        assert [item["text"] for item in compacted] == [item["text"] for item in segments]
+
+
+def test_overlap_only_removed_in_overlap_mode():
+    segments = [
+        segment("the pain started three days ago in my chest", 0, 3),
+        segment("days ago in my chest and it gets worse at night", 1.5, 4.5),
+    ]
+    compacted, _ = compact_segments(segments, overlapping=True)
+    assert compacted[1]["text"] == "and it gets worse at night"
+    compacted, _ = compact_segments(segments, overlapping=False)
+    assert compacted[1]["text"] == segments[1]["text"]
+
+
+def test_overlap_limited_to_shared_time():
+    compactor = TranscriptCompactor()
+    compactor.add("I have a fever and a cough", 0, 48000)
+    # Only the first quarter of this segment overlaps the previous one in time
+    text = compactor.add("a cough I have a fever and a cough again today", 36000, 84000)
+    assert text == "I have a fever and a cough again today"
+
+
+def test_segments_without_timing_are_only_cleaned():
+    compactor = TranscriptCompactor()
+    compactor.add("I have a headache.")
+    assert compactor.add("I have a fever.") == "I have a fever."
+
+
+def test_clean_text_keeps_clinical_abbreviations():
+    assert clean_text("I went to the ER last night") == "I went to the ER last night"
+    assert clean_text("A 5 mm lesion, um, on the left") == "A 5 mm lesion on the left"
+    assert clean_text("Uh, hmm, the pain is, erm, sharp") == "the pain is sharp"
+
+
+def test_clean_text_collapses_only_stutters():
+    assert clean_text("I I I have the the pain") == "I have the pain"
+    assert clean_text("It started two two weeks ago") == "It started two two weeks ago"
+    assert clean_text("Pressure was 5 5 on the scale") == "Pressure was 5 5 on the scale"
+    assert clean_text("He had had a fall") == "He had had a fall"
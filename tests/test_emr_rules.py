@@ -0,0 +1,64 @@
+from emr_rules import AFFIRMED, HYPOTHETICAL_MENTION, NEGATED, QUESTIONED, extract_fields, mention_status
+
+
+def status_of(sentence, concept):
+    start = sentence.index(concept)
+    return mention_status(sentence, start, start + len(concept))
+
+
+def filled(result):
+    return {path: value for path, value in result.values.items() if value}
+
+
+def test_mention_status():
+    assert status_of("I have had a fever since Monday.", "fever") == AFFIRMED
+    assert status_of("No fever or chills.", "chills") == NEGATED
+    assert status_of("She denies any shortness of breath.", "shortness of breath") == NEGATED
+    assert status_of("The headache went away.", "headache") == NEGATED
+    assert status_of("No fever, but the cough is worse.", "cough") == AFFIRMED
+    assert status_of("The pain is not improving.", "pain") == AFFIRMED
+    assert status_of("Call us if you get a fever.", "fever") == HYPOTHETICAL_MENTION
+    assert status_of("Any fever?", "fever") == QUESTIONED
+
+
+def test_later_definite_statement_wins():
+    result = extract_fields(["No fever.", "Actually I did have a fever last night."])
+    assert result.values["reviewOfSymptoms.constitutional.fever"] is True
+
+
+def test_question_answers_set_the_asked_symptom():
+    result = extract_fields(["Any chills?", "Yes, at night.", "Any dizziness?", "No."])
+    assert result.values["reviewOfSymptoms.constitutional.chills"] is True
+    assert result.values["reviewOfSymptoms.neurological.dizziness"] is False
+    assert result.evidence["reviewOfSymptoms.constitutional.chills"] == "Yes, at night."
+
+
+def test_denied_chest_pain_does_not_deny_a_headache():
+    result = extract_fields(["I have a headache. It is 7/10.", "Any chest pain?", "No."])
+    assert filled(result) == {
+        "reviewOfSymptoms.neurological.headache": True,
+        "painScreening.pain": "Yes",
+        "painScreening.score": "7/10",
+        "historyOfPresentIllness.severity": "7/10",
+    }
+    assert result.values["reviewOfSymptoms.cardiovascular.chestPain"] is False
+
+
+def test_answered_pain_question():
+    result = extract_fields(["Are you in any pain?", "No.", "How is your mood out of ten?", "Maybe 7/10."])
+    assert result.values["painScreening.pain"] == "No"
+    assert "painScreening.score" not in result.values
+    assert "historyOfPresentIllness.severity" not in result.values
+
+    result = extract_fields(["Are you in any pain?", "Yes.", "My knee hurts, about 4/10."])
+    assert result.values["painScreening.pain"] == "Yes"
+    assert result.values["painScreening.score"] == "4/10"
+    assert result.values["painScreening.location"] == "knee"
+
+
+def test_spans():
+    result = extract_fields(["I have had a throbbing headache for two days.", "Blood pressure is 120 over 80."])
+    values = filled(result)
+    assert values["painScreening.character"] == "throbbing"
+    assert values["painScreening.duration"] == "2 days"
+    assert values["physicalExamination.constitutional.recordThreeVitalSigns"] == "BP 120/80 mmHg"
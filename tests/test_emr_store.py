@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+import emr_store
+from emr_store import EMRStore
+
+
+def test_unserializable_report_fails_only_its_own_save(tmp_path):
+    async def scenario():
+        store = EMRStore(str(tmp_path / "emr.db"), batch_wait=0)
+        store.start()
+        try:
+            with pytest.raises(TypeError):
+                await store.save("a1", {"bad": object()})
+            saved = await store.save("a2", {"diagnosis": "otitis"}, patient_id=7, transcript="Doctor: hello")
+            assert store.running
+            assert saved["appointmentId"] == "a2"
+            record = await store.get("a2")
+            assert record["emrReport"] == {"diagnosis": "otitis"}
+            assert record["transcript"] == "Doctor: hello"
+            assert record["patientId"] == "7"
+            assert await store.get("a1") is None
+        finally:
+            await store.stop()
+
+    asyncio.run(scenario())
+
+
+def test_writer_survives_errors_it_did_not_expect(tmp_path):
+    async def scenario():
+        store = EMRStore(str(tmp_path / "emr.db"), batch_wait=0)
+        store.start()
+        deep = []
+        for _ in range(100000):
+            deep = [deep]
+        try:
+            with pytest.raises(RecursionError):
+                await asyncio.wait_for(store.save("a1", deep), 5)
+            assert store.running
+            saved = await asyncio.wait_for(store.save("a2", {"diagnosis": "otitis"}), 5)
+            assert saved["appointmentId"] == "a2"
+        finally:
+            await store.stop()
+
+    asyncio.run(scenario())
+
+
+def test_compression_runs_off_the_event_loop(tmp_path, monkeypatch):
+    threads = []
+    original = emr_store.compress
+
+    def compress(value, level=6):
+        threads.append(threading.current_thread())
+        return original(value, level)
+
+    monkeypatch.setattr(emr_store, "compress", compress)
+
+    async def scenario():
+        store = EMRStore(str(tmp_path / "emr.db"), batch_wait=0)
+        store.start()
+        try:
+            await store.save("a1", {"diagnosis": "otitis"}, transcript="Doctor: hello")
+        finally:
+            await store.stop()
+
+    asyncio.run(scenario())
+    assert threads and threading.main_thread() not in threads
@@ -0,0 +1,52 @@
+import asyncio
+
+from outbound import OutboundQueue
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+    async def close(self, code=1000):
+        self.closed = True
+
+
+def test_partial_sent_before_the_next_is_not_counted_twice():
+    async def scenario():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, max_size=4, heartbeat_interval=0)
+        queue.start()
+        for index in range(10):
+            assert queue.put({"type": "partial", "text": str(index)})
+            await asyncio.sleep(0.01)
+        assert queue._live == 0
+        assert len(websocket.sent) == 10
+
+        # The bound still holds for messages that cannot be dropped
+        queue.stop()
+        for index in range(4):
+            assert queue.put({"type": "final", "segment": index})
+        assert not queue.put({"type": "final", "segment": 4})
+        assert queue.dead
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+
+
+def test_queued_partial_is_replaced():
+    async def scenario():
+        websocket = FakeWebSocket()
+        queue = OutboundQueue(websocket, heartbeat_interval=0)
+        queue.put({"type": "partial", "text": "a"})
+        queue.put({"type": "partial", "text": "b"})
+        assert queue._live == 1
+        queue.start()
+        await queue.drain(timeout=1.0)
+        queue.stop()
+        assert len(websocket.sent) == 1 and '"b"' in websocket.sent[0]
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+import asyncio
+
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+from streaming import HypothesisBuffer, StreamingTranscriber, words_from_segments
+from vad import EnergyVAD
+
+SAMPLE_RATE = 16000
+
+
+def words(text, start=0.0, step=0.5):
+    return [(start + index * step, start + (index + 1) * step, word) for index, word in enumerate(text.split())]
+
+
+def texts(committed):
+    return [word[2] for word in committed]
+
+
+def test_words_are_committed_once_two_decodes_agree():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert(words("the patient has"))
+    assert hypothesis.flush() == []
+    assert texts(hypothesis.tentative()) == ["the", "patient", "has"]
+
+    hypothesis.insert(words("the patient had a cough"))
+    assert texts(hypothesis.flush()) == ["the", "patient"]
+    assert texts(hypothesis.tentative()) == ["had", "a", "cough"]
+
+    # The prefix is decoded again from its start and repeats the committed words
+    hypothesis.insert(words("the patient had a cough"))
+    assert texts(hypothesis.flush()) == ["had", "a", "cough"]
+    assert texts(hypothesis.committed) == ["the", "patient", "had", "a", "cough"]
+
+
+def test_agreement_ignores_case_and_punctuation():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert(words("Hello, doctor"))
+    hypothesis.flush()
+    hypothesis.insert(words("hello doctor."))
+    assert texts(hypothesis.flush()) == ["hello", "doctor."]
+
+
+def test_revised_prefix_drops_the_repeated_committed_tail():
+    hypothesis = HypothesisBuffer()
+    for _ in range(2):
+        hypothesis.insert(words("no chest pain"))
+        hypothesis.flush()
+    assert texts(hypothesis.committed) == ["no", "chest", "pain"]
+    # The decode no longer starts with the committed words, but repeats their tail
+    hypothesis.insert(words("chest pain today", start=1.4))
+    assert texts(hypothesis.current) == ["today"]
+
+
+def test_force_commit_takes_the_tentative_words():
+    hypothesis = HypothesisBuffer()
+    hypothesis.insert(words("mild fever"))
+    hypothesis.flush()
+    assert texts(hypothesis.force_commit()) == ["mild", "fever"]
+    assert hypothesis.tentative() == []
+
+
+def test_interpolated_word_times():
+    timed = words_from_segments([{"start": 0.0, "end": 2.0, "text": " ab abcdef"}], offset=10.0)
+    assert [word[2] for word in timed] == ["ab", "abcdef"]
+    assert timed[0][0] == 10.0 and timed[-1][1] == 12.0
+    assert abs(timed[0][1] - 10.5) < 1e-9
+
+
+def test_transcriber_commits_across_steps():
+    transcript = "my knee has been hurting for two weeks"
+
+    async def decode(audio, prompt):
+        # Each step hears one more word of the sentence
+        heard = transcript.split()[:len(audio) // SAMPLE_RATE + 2]
+        return {"segments": [{"start": 0.0, "end": len(audio) / SAMPLE_RATE, "text": " ".join(heard)}]}
+
+    async def scenario():
+        buffer = AudioRingBuffer(SAMPLE_RATE * 30)
+        transcriber = StreamingTranscriber(
+            buffer, decode, SAMPLE_RATE, min_step=1.0, trim_duration=20.0, max_duration=25.0, vad=EnergyVAD()
+        )
+        t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+        second = (0.3 * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+        committed = []
+        for _ in range(8):
+            buffer.write(second)
+            assert transcriber.ready()
+            final, _ = await transcriber.step()
+            committed += final
+        return committed + transcriber.finish()
+
+    committed = asyncio.run(scenario())
+    assert texts(committed) == transcript.split()
@@ -0,0 +1,57 @@
+import numpy as np
+
+from audio_buffer import AudioRingBuffer
+from vad import EnergyVAD, SpeechSegmenter, contains_speech
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * np.sin(2 * np.pi * 200 * t)).astype(np.float32)
+
+
+def segment(audio, buffer, segmenter, block=1024):
+    utterances = []
+    for start in range(0, len(audio), block):
+        buffer.write(audio[start:start + block])
+        utterances += segmenter.process(buffer)
+    return utterances + segmenter.flush()
+
+
+def test_long_speech_is_split_to_fit_the_window():
+    # Starting off the frame grid, so frames and padding do not add up to 25 s
+    audio = np.concatenate([np.zeros(int(1.0123 * SAMPLE_RATE), dtype=np.float32), tone(60)])
+    buffer = AudioRingBuffer(SAMPLE_RATE * 90)
+    segmenter = SpeechSegmenter(EnergyVAD(), max_utterance=25.0)
+    window = np.zeros(SAMPLE_RATE * 25, dtype=np.float32)
+
+    utterances = segment(audio, buffer, segmenter)
+
+    assert len(utterances) == 3
+    assert all(end - start <= len(window) for start, end in utterances)
+    assert [end - start for start, end in utterances[:2]] == [len(window)] * 2
+    # Consecutive pieces join without a gap
+    assert all(previous[1] == following[0] for previous, following in zip(utterances, utterances[1:]))
+    for start, end in utterances:
+        buffer.read(start, end - start, out=window)
+
+
+def test_pauses_close_utterances_with_padding():
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    audio = np.concatenate([silence, tone(2), silence, tone(1), silence])
+    segmenter = SpeechSegmenter(EnergyVAD(), padding=0.2, hangover=0.5)
+
+    utterances = segment(audio, AudioRingBuffer(SAMPLE_RATE * 10), segmenter)
+
+    assert len(utterances) == 2
+    (first_start, first_end), (second_start, _) = utterances
+    assert abs(first_start - int(0.8 * SAMPLE_RATE)) <= segmenter.frame_size
+    assert abs(first_end - int(3.2 * SAMPLE_RATE)) <= segmenter.frame_size
+    assert second_start >= first_end
+
+
+def test_contains_speech():
+    vad = EnergyVAD()
+    assert contains_speech(vad, tone(0.5))
+    assert not contains_speech(EnergyVAD(), np.zeros(SAMPLE_RATE, dtype=np.float32))
@@ -0,0 +1,92 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Words, runs of punctuation and line breaks with their indentation, roughly how BPE tokenizers split text
+PIECE = re.compile(r"\w+|[^\w\s]+|\n\s*")
+# Chat formatting overhead per message (role markers and separators)
+MESSAGE_OVERHEAD = 4
+
+_encoding = None
+_encoding_checked = False
+
+
+def _tiktoken():
+    """A tiktoken encoding if the optional package and its data are available, else None."""
+    global _encoding, _encoding_checked
+    if not _encoding_checked:
+        _encoding_checked = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.info(f"tiktoken unavailable ({e}), estimating token counts")
+    return _encoding
+
+
+def estimate_tokens(text):
+    """Token count of `text`: exact with tiktoken, otherwise a close local estimate.
+
+    The estimate counts a token per word plus one for every further 6
+    characters of a long word, one per two punctuation marks in a run and
+    one per line break with its indentation. That is close enough to cl100k
+    counts on English transcripts and JSON to budget prompts with.
+    """
+    if not text:
+        return 0
+    encoding = _tiktoken()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    tokens = 0
+    for piece in PIECE.findall(text):
+        if piece[0].isalnum() or piece[0] == "_":
+            tokens += 1 + (len(piece) - 1) // 6
+        elif piece[0] == "\n":
+            tokens += 1
+        else:
+            tokens += (len(piece) + 1) // 2
+    return tokens
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD for message in messages)
+
+
+def split_to_budget(text, budget):
+    """Split `text` into pieces of at most `budget` tokens, at line or sentence boundaries.
+
+    A single sentence longer than the budget is cut between words.
+    """
+    if estimate_tokens(text) <= budget:
+        return [text]
+    units = []
+    for line in text.splitlines():
+        units.extend(part for part in re.split(r"(?<=[.?!])\s+", line) if part.strip())
+        if units:
+            units[-1] += "\n"
+
+    pieces, current, used = [], [], 0
+    for unit in units:
+        tokens = estimate_tokens(unit)
+        if tokens > budget:
+            words = unit.split()
+            per_word = tokens / max(len(words), 1)
+            step = max(int(budget / per_word), 1)
+            sub_units = [" ".join(words[start:start + step]) for start in range(0, len(words), step)]
+        else:
+            sub_units = [unit]
+        for sub_unit in sub_units:
+            tokens = estimate_tokens(sub_unit)
+            if current and used + tokens > budget:
+                pieces.append(_join(current))
+                current, used = [], 0
+            current.append(sub_unit)
+            used += tokens
+    if current:
+        pieces.append(_join(current))
+    return pieces
+
+
+def _join(units):
+    return "".join(unit if unit.endswith("\n") else unit + " " for unit in units).strip()
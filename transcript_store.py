@@ -0,0 +1,130 @@
+import json
+import logging
+import math
+import os
+import tempfile
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptStore:
+    """Append-only store of transcribed segments for one session.
+
+    Each segment keeps its start/end sample offsets (ring buffer cursor
+    space), text, speaker, average log probability and no-speech
+    probability in compact typed columns, so appends are amortised O(1) and
+    the joined text is only built when it is asked for (and cached until the
+    next append).
+    Once the in-memory text exceeds `max_memory_chars` the oldest segments
+    are spilled to an append-only JSON lines file in `spill_dir`.
+    """
+
+    def __init__(self, spill_dir=None, max_memory_chars=200_000):
+        self.spill_dir = spill_dir
+        self.max_memory_chars = max_memory_chars
+        self.starts = array("q")
+        self.ends = array("q")
+        self.avg_logprobs = array("f")
+        self.no_speech_probs = array("f")
+        # -1 when diarization is off or could not tell
+        self.speakers = array("b")
+        self.texts = []
+        self.memory_chars = 0
+        self.spilled = 0
+        self.spilled_chars = 0
+        self.spill_path = None
+        self._spill_file = None
+        self._text = None
+
+    def __len__(self):
+        return self.spilled + len(self.texts)
+
+    @property
+    def char_count(self):
+        # Length of text() without building it
+        count = len(self)
+        return self.spilled_chars + self.memory_chars + max(count - 1, 0)
+
+    def append(self, text, start=-1, end=-1, avg_logprob=None, no_speech_prob=None, speaker=None):
+        """Add a segment and return its index."""
+        text = text.strip()
+        self.starts.append(int(start))
+        self.ends.append(int(end))
+        self.avg_logprobs.append(math.nan if avg_logprob is None else avg_logprob)
+        self.no_speech_probs.append(math.nan if no_speech_prob is None else no_speech_prob)
+        self.speakers.append(-1 if speaker is None else speaker)
+        self.texts.append(text)
+        self.memory_chars += len(text)
+        self._text = None
+        if self.spill_dir and self.memory_chars > self.max_memory_chars:
+            self._spill()
+        return len(self) - 1
+
+    def _entry(self, offset):
+        avg_logprob = self.avg_logprobs[offset]
+        no_speech_prob = self.no_speech_probs[offset]
+        speaker = self.speakers[offset]
+        return {
+            "index": self.spilled + offset,
+            "start": self.starts[offset],
+            "end": self.ends[offset],
+            "text": self.texts[offset],
+            "speaker": None if speaker < 0 else speaker,
+            "avg_logprob": None if math.isnan(avg_logprob) else round(avg_logprob, 4),
+            "no_speech_prob": None if math.isnan(no_speech_prob) else round(no_speech_prob, 4),
+        }
+
+    def _spill(self):
+        if self._spill_file is None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            fd, self.spill_path = tempfile.mkstemp(prefix="transcript_", suffix=".jsonl", dir=self.spill_dir)
+            self._spill_file = os.fdopen(fd, "w", encoding="utf-8")
+        # Keep the newest half in memory so text near the end stays cheap to read
+        keep = self.max_memory_chars // 2
+        count = 0
+        chars = self.memory_chars
+        while count < len(self.texts) - 1 and chars > keep:
+            chars -= len(self.texts[count])
+            count += 1
+        for offset in range(count):
+            self._spill_file.write(json.dumps(self._entry(offset), ensure_ascii=False) + "\n")
+        self._spill_file.flush()
+        spilled_chars = self.memory_chars - chars
+        for column in (self.starts, self.ends, self.avg_logprobs, self.no_speech_probs, self.speakers, self.texts):
+            del column[:count]
+        self.spilled += count
+        self.spilled_chars += spilled_chars
+        self.memory_chars = chars
+        logger.info(f"Spilled {count} transcript segments to {self.spill_path}")
+
+    def segments(self, since=0):
+        """Yield segment dicts from index `since` onwards, reading spilled ones from disk."""
+        if since < self.spilled:
+            with open(self.spill_path, encoding="utf-8") as f:
+                for index, line in enumerate(f):
+                    if index >= since:
+                        yield json.loads(line)
+        for offset in range(max(since - self.spilled, 0), len(self.texts)):
+            yield self._entry(offset)
+
+    def text(self):
+        if self._text is None:
+            if self.spilled:
+                self._text = " ".join(segment["text"] for segment in self.segments())
+            else:
+                self._text = " ".join(self.texts)
+        return self._text
+
+    def clear(self):
+        self.close()
+        self.__init__(self.spill_dir, self.max_memory_chars)
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            try:
+                os.remove(self.spill_path)
+            except OSError:
+                pass
@@ -1,18 +1,46 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-import whisper
-import sounddevice as sd
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
 import numpy as np
 import json
 import asyncio
-from collections import deque
-import requests
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 import re
-# Enable CUDA if available
-import torch
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-MODEL = whisper.load_model("medium.en", device=DEVICE)
+import os
+import time
+from audio_buffer import AudioRingBuffer
+from audio_ingest import ClientAudioDecoder
+from batch_jobs import BatchTranscriber
+from diarization import OnlineDiarizer, labeled_transcript
+from emr_cache import EMRCache, cache_key, prompt_version
+from emr_incremental import IncrementalEMRExtractor, apply_merged_text, merge_partials
+from emr_parser import StreamingJSONParser, parse_json_object
+from emr_prompt import TranscriptCompactor, compact_segments, completion_budget, fit_transcript, system_prompt
+from emr_rules import BOOLEAN_PATHS, extract_fields
+from emr_schema import covered, missing_sections, validate_emr, validate_field
+from emr_store import EMRStore, parse_time
+from llm_client import LLMClient, LLMRequestError
+from load_control import AdaptiveController, load_levels
+from mel_features import IncrementalLogMel, n_mels_for
+from metrics import DEFAULT_REGISTRY as METRICS, Counter, Gauge, Histogram, RATIO_BUCKETS
+from outbound import OutboundQueue
+from inference_scheduler import InferenceScheduler
+from model_registry import ModelRegistry
+from worker_pool import ProcessWorkerPool, WorkerPoolBusy
+from session_store import SessionJournal, SessionRegistry, new_session_id, valid_session_id
+from streaming import StreamingTranscriber
+from transcript_store import TranscriptStore
+from vad import SpeechSegmenter, contains_speech, make_vad
+
+# Server-side microphone capture is a fallback source; PortAudio may not exist on inference nodes
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    sd = None
+
+# Whisper models are loaded on first use or by the startup hook, never at import time
+REGISTRY = ModelRegistry.from_env()
+PRELOAD_MODEL = os.getenv("WHISPER_PRELOAD", "1") == "1"
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -33,29 +61,640 @@ app.add_middleware(
 SAMPLE_RATE = 16000
 CHUNK_DURATION = 3
 CHUNK_SIZE = SAMPLE_RATE * CHUNK_DURATION
-BUFFER_DURATION = 10
+BUFFER_DURATION = 30
+# Streaming (local agreement) mode: decode step, prefix trim point and hard cap, in seconds
+STREAM_MIN_STEP = 1.0
+STREAM_TRIM_DURATION = 6
+STREAM_MAX_DURATION = 15
+# Voice activity detection: backend ("energy", "webrtc", "silero") and utterance shaping, in seconds
+VAD_BACKEND = os.getenv("VAD_BACKEND", "energy")
+VAD_MIN_SPEECH = 0.25
+VAD_HANGOVER = 0.5
+VAD_PADDING = 0.2
+VAD_MAX_UTTERANCE = 25
+# Optional CPU speaker diarization: tags segments with a speaker and labels the EMR prompt by role
+DIARIZATION = os.getenv("DIARIZATION", "0") == "1"
+DIARIZATION_MAX_SPEAKERS = int(os.getenv("DIARIZATION_MAX_SPEAKERS", "3"))
+DIARIZATION_THRESHOLD = float(os.getenv("DIARIZATION_THRESHOLD", "0.55"))
+# Batched inference shared by all sessions
+MAX_BATCH_SIZE = int(os.getenv("WHISPER_MAX_BATCH_SIZE", "8"))
+MAX_BATCH_WAIT = float(os.getenv("WHISPER_MAX_BATCH_WAIT", "0.05"))
+
+# Overlapping windows reuse cached log-mel frames so only each new hop is analysed;
+# needs in-process inference with a backend that accepts log-mel inputs
+INCREMENTAL_FEATURES = os.getenv("INCREMENTAL_FEATURES", "1") == "1"
+
+# Scale-out behind gateway.py: recording sessions this node is sized for, and whether it
+# is draining (finishing its sessions, taking no new ones)
+NODE_CAPACITY = int(os.getenv("NODE_CAPACITY", "8"))
+DRAINING = False
+
+# Optional process pool; 0 keeps inference in this process behind the batch scheduler
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+WORKER_SLOTS = int(os.getenv("INFERENCE_WORKER_SLOTS", "2"))
+
+SCHEDULER = InferenceScheduler(
+    lambda audios, prompts, model=None, **inputs: REGISTRY.decoder(model)(audios, prompts, **inputs),
+    max_batch_size=MAX_BATCH_SIZE,
+    max_wait=MAX_BATCH_WAIT,
+)
+WORKER_POOL = None
+
+# Sessions degrade (bigger windows, less overlap, no prompt, then a smaller model)
+# when inference cannot keep up, and recover once it can; workers serve a single model
+ADAPTIVE_LOAD = os.getenv("ADAPTIVE_LOAD", "1") == "1"
+WHISPER_FALLBACK_MODEL = os.getenv("WHISPER_FALLBACK_MODEL", "")
+LOAD_LEVELS = load_levels(WHISPER_FALLBACK_MODEL if INFERENCE_WORKERS == 0 else None)
+
+# Whatever serves inference for the sessions: the scheduler or the worker pool
+INFERENCE = SCHEDULER
+
+async def preload_model():
+    try:
+        await asyncio.to_thread(REGISTRY.warm_up, None, SAMPLE_RATE)
+    except Exception as e:
+        logger.error(f"Model preload failed: {e}")
+
+@app.on_event("startup")
+async def start_inference():
+    global WORKER_POOL, INFERENCE
+    if INFERENCE_WORKERS > 0:
+        # Workers load their own models; the config is read here so CLI overrides apply
+        WORKER_POOL = ProcessWorkerPool(
+            INFERENCE_WORKERS,
+            {
+                "default_model": REGISTRY.default_model,
+                "device": REGISTRY.requested_device,
+                "compute_type": REGISTRY.requested_compute_type,
+                "backend": REGISTRY.backend,
+            },
+            slots_per_worker=WORKER_SLOTS,
+        )
+        WORKER_POOL.start()
+        INFERENCE = WORKER_POOL
+        return
+    SCHEDULER.start()
+    if PRELOAD_MODEL:
+        # Load and warm up in the background so the server accepts connections right away
+        asyncio.create_task(preload_model())
+
+@app.get("/ready")
+async def readiness():
+    if WORKER_POOL:
+        status = {"ready": WORKER_POOL.is_ready(), **WORKER_POOL.metrics()}
+    else:
+        status = REGISTRY.status()
+    # A draining node stays up for its sessions but should get no new ones
+    status["draining"] = DRAINING
+    ready = status["ready"] and not DRAINING
+    return JSONResponse(status, status_code=200 if ready else 503)
+
+@app.post("/workers/{index}/restart")
+async def restart_worker(index: int):
+    if not WORKER_POOL or not 0 <= index < len(WORKER_POOL.workers):
+        return JSONResponse({"error": "No such inference worker"}, status_code=404)
+    await WORKER_POOL.restart_worker(index)
+    return {"restarted": index}
+
+@app.on_event("shutdown")
+async def stop_inference():
+    await INFERENCE.stop()
+    await LLM.close()
+    EMR_CACHE.close()
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    return INFERENCE.metrics()
+
+# Prometheus metrics; the inference and LLM modules register their own
+AUDIO_CALLBACK_TIME = Histogram("audio_callback_seconds", "Time spent in the audio capture callback")
+AUDIO_CALLBACK_DROPS = Counter("audio_callback_status", "Audio callbacks reporting an over/underflow status")
+BUFFER_BACKLOG = Histogram(
+    "audio_buffer_backlog_ratio", "Untranscribed audio relative to the ring buffer capacity, per decode",
+    labels=("mode",), buckets=RATIO_BUCKETS
+)
+WINDOW_TIME = Histogram("transcription_window_seconds", "Queue wait plus inference time of one window", labels=("mode",))
+WINDOW_RTF = Histogram(
+    "transcription_window_rtf", "Processing time divided by audio duration, per window",
+    labels=("mode",), buckets=RATIO_BUCKETS
+)
+SILENT_WINDOWS = Counter("transcription_silent_windows", "Windows skipped because they contain no speech")
+SHED_WINDOWS = Counter("transcription_shed_windows", "Windows dropped because all inference workers were busy")
+ERRORS = Counter("errors", "Errors by pipeline stage", labels=("stage",))
+DROPPED_AUDIO = Counter("transcription_dropped_audio_seconds", "Audio overwritten before it was transcribed")
+RULE_TIME = Histogram("emr_rules_seconds", "Time to fill EMR fields with the local rule extractor")
+FEATURE_TIME = Histogram("log_mel_seconds", "Time to update cached log-mel frames and assemble one window's input")
+DIARIZATION_TIME = Histogram("diarization_seconds", "Time to embed and cluster one segment's speaker")
+LOAD_LEVEL_CHANGES = Counter("load_level_changes", "Session load level changes, by new level", labels=("level",))
+Gauge("inference_queue_depth", "Windows waiting for inference", function=lambda: INFERENCE.metrics().get("queue_depth", 0))
+Gauge("sessions", "Transcription sessions, attached or detached", function=lambda: len(SESSIONS.sessions))
+Gauge("batch_jobs_running", "Batch transcription jobs in progress", function=lambda: sum(job.status == "running" for job in BATCH.jobs.values()))
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+# Pre-recorded audio is transcribed as background jobs through the same inference path
+BATCH_PARALLEL = int(os.getenv("BATCH_PARALLEL", "16"))
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", "2"))
+BATCH_UPLOAD_DIR = os.getenv("BATCH_UPLOAD_DIR", "")
+BATCH_MAX_UPLOAD_MB = int(os.getenv("BATCH_MAX_UPLOAD_MB", "1024"))
+BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", "3600"))
+
+BATCH = BatchTranscriber(
+    lambda session_id, audio: INFERENCE.submit(session_id, audio),
+    sample_rate=SAMPLE_RATE,
+    vad_backend=VAD_BACKEND,
+    max_parallel=BATCH_PARALLEL,
+    max_jobs=BATCH_MAX_JOBS,
+    upload_dir=BATCH_UPLOAD_DIR,
+    max_upload_bytes=BATCH_MAX_UPLOAD_MB << 20,
+    ttl=BATCH_JOB_TTL,
+    min_speech=VAD_MIN_SPEECH,
+    hangover=VAD_HANGOVER,
+    padding=VAD_PADDING,
+    max_utterance=VAD_MAX_UTTERANCE,
+)
+
+@app.post("/jobs")
+async def create_job(request: Request, filename: str = "upload.wav"):
+    # The request body is the audio file itself, streamed straight to disk
+    try:
+        job = await BATCH.submit(request.stream(), filename=os.path.basename(filename))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(job.summary(), status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = BATCH.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "No such job"}, status_code=404)
+    return job.result() if job.status == "completed" else job.summary()
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if not BATCH.cancel(job_id):
+        return JSONResponse({"error": "No such running job"}, status_code=404)
+    return {"cancelled": job_id}
+
+@app.websocket("/jobs/{job_id}/events")
+async def job_events(websocket: WebSocket, job_id: str):
+    await websocket.accept()
+    job = BATCH.get(job_id)
+    if job is None:
+        await websocket.send_json({"type": "error", "message": "No such job"})
+        await websocket.close()
+        return
+    queue = BATCH.subscribe(job)
+    # Segments decoded before the client subscribed; later ones also arrive on the queue
+    replayed = list(job.segments)
+    last_replayed = len(replayed) - 1
+    try:
+        await websocket.send_json({"type": "progress", **job.summary()})
+        for segment in sorted(replayed, key=lambda segment: segment["start"]):
+            await websocket.send_json({"type": "segment", **segment})
+        while job.finished is None:
+            event = await queue.get()
+            if event["type"] == "segment" and event["index"] <= last_replayed:
+                continue
+            await websocket.send_json(event)
+            if event["type"] == "done":
+                break
+        if job.status == "completed":
+            await websocket.send_json({"type": "result", **job.result()})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        BATCH.unsubscribe(job, queue)
+
+# EMR generation through OpenRouter
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY", "")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://openrouter.ai/api/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "qwen/qwen2.5-vl-72b-instruct:free")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_STREAM = os.getenv("LLM_STREAM", "1") == "1"
+
+LLM = LLMClient(
+    LLM_BASE_URL,
+    OPENROUTER_API_KEY,
+    LLM_MODEL,
+    headers={
+        "HTTP-Referer": "https://github.com/OpenRouterTeam/openrouter",
+        "X-Title": "Vitalis Medical Transcription"
+    },
+    timeout=LLM_TIMEOUT,
+    max_retries=LLM_MAX_RETRIES,
+)
+
+# The EMR prompt is generated from the schema in emr_schema.py; transcripts are
+# compacted and, beyond EMR_TRANSCRIPT_TOKENS, split into pieces extracted separately
+EMR_SYSTEM_PROMPT = system_prompt()
+EMR_TRANSCRIPT_TOKENS = int(os.getenv("EMR_TRANSCRIPT_TOKENS", "6000"))
+EMR_MAX_COMPLETION_TOKENS = int(os.getenv("EMR_MAX_COMPLETION_TOKENS", "2000"))
+
+# Transcript segments beyond this many characters are spilled to TRANSCRIPT_SPILL_DIR
+TRANSCRIPT_SPILL_DIR = os.getenv("TRANSCRIPT_SPILL_DIR", "")
+TRANSCRIPT_MEMORY_CHARS = int(os.getenv("TRANSCRIPT_MEMORY_CHARS", "200000"))
+
+# Outbound WebSocket messages go through a bounded per-connection queue and writer task
+OUTBOUND_QUEUE_SIZE = int(os.getenv("OUTBOUND_QUEUE_SIZE", "256"))
+HEARTBEAT_INTERVAL = float(os.getenv("HEARTBEAT_INTERVAL", "15"))
+SEND_TIMEOUT = float(os.getenv("SEND_TIMEOUT", "10"))
+CLIENT_TIMEOUT = float(os.getenv("CLIENT_TIMEOUT", "45"))
+
+# Sessions survive their socket for SESSION_TTL seconds (0 disables resuming); with
+# SESSION_JOURNAL_DIR set, segments and raw audio are also journaled to disk
+SESSION_TTL = float(os.getenv("SESSION_TTL", "300"))
+SESSION_JOURNAL_DIR = os.getenv("SESSION_JOURNAL_DIR", "")
+
+SESSIONS = SessionRegistry(ttl=SESSION_TTL)
+
+@app.on_event("startup")
+async def start_sessions():
+    SESSIONS.start()
+
+@app.on_event("shutdown")
+async def stop_sessions():
+    await SESSIONS.stop()
+
+@app.get("/sessions/stats")
+async def session_stats():
+    return SESSIONS.stats()
+
+def is_recording(manager):
+    return manager.transcription_task is not None and not manager.transcription_task.done()
+
+@app.get("/sessions/{session_id}")
+async def session_info(session_id: str):
+    # Lets the gateway find the node holding a session it has no route for
+    manager = SESSIONS.get(session_id) if valid_session_id(session_id) else None
+    if manager is not None:
+        return {
+            "sessionId": session_id,
+            "live": True,
+            "attached": session_id not in SESSIONS.detached,
+            "recording": is_recording(manager),
+        }
+    if valid_session_id(session_id) and SESSION_JOURNAL_DIR and SessionJournal.exists(SESSION_JOURNAL_DIR, session_id):
+        return {"sessionId": session_id, "live": False, "attached": False, "recording": False}
+    return JSONResponse({"error": "Session not found"}, status_code=404)
+
+@app.get("/node/status")
+async def node_status():
+    """Load report polled by the gateway to place new sessions."""
+    active = [manager for manager in SESSIONS.sessions.values() if is_recording(manager)]
+    ready = WORKER_POOL.is_ready() if WORKER_POOL else REGISTRY.is_ready()
+    return {
+        "ready": ready,
+        "draining": DRAINING,
+        "capacity": NODE_CAPACITY,
+        "sessions": len(SESSIONS.sessions),
+        "detached": len(SESSIONS.detached),
+        "recording": len(active),
+        "degraded": sum(manager.level is not LOAD_LEVELS[0] for manager in active),
+        "queue_depth": INFERENCE.queue_depth,
+    }
+
+@app.post("/node/drain")
+async def start_draining():
+    global DRAINING
+    DRAINING = True
+    logger.info("Draining: no new sessions will be routed to this node")
+    return await node_status()
+
+@app.delete("/node/drain")
+async def stop_draining():
+    global DRAINING
+    DRAINING = False
+    logger.info("No longer draining")
+    return await node_status()
+
+# Symptom booleans and short spans (durations, scores, vitals) come from local
+# NegEx-style rules; the LLM is only asked for what they leave open
+RULE_EXTRACTION = os.getenv("RULE_EXTRACTION", "1") == "1"
+
+# Parsed analyses keyed by (model, prompt version, normalized transcript)
+EMR_CACHE_SIZE = int(os.getenv("EMR_CACHE_SIZE", "256"))
+EMR_CACHE_DB = os.getenv("EMR_CACHE_DB", "")
+EMR_CACHE_TTL = float(os.getenv("EMR_CACHE_TTL", str(7 * 24 * 3600)))
+EMR_CACHE_MAX_DISK_ENTRIES = int(os.getenv("EMR_CACHE_MAX_DISK_ENTRIES", "10000"))
+EMR_PROMPT_VERSION = prompt_version(EMR_SYSTEM_PROMPT + ("\n[rules]" if RULE_EXTRACTION else ""))
+
+EMR_CACHE = EMRCache(
+    max_entries=EMR_CACHE_SIZE,
+    db_path=EMR_CACHE_DB or None,
+    ttl=EMR_CACHE_TTL,
+    max_disk_entries=EMR_CACHE_MAX_DISK_ENTRIES,
+)
+
+@app.get("/emr-cache/stats")
+async def emr_cache_stats():
+    return EMR_CACHE.stats()
+
+# Saved EMR reports with their transcripts, in the SQLite (WAL) file EMR_STORE_DB (saving
+# is off without it); concurrent saves share a commit, and query pages hold at most
+# EMR_STORE_MAX_PAGE reports
+EMR_STORE_DB = os.getenv("EMR_STORE_DB", "")
+EMR_STORE_BATCH_SIZE = int(os.getenv("EMR_STORE_BATCH_SIZE", "64"))
+EMR_STORE_MAX_PAGE = int(os.getenv("EMR_STORE_MAX_PAGE", "200"))
+EMR_STORE = None
+
+@app.on_event("startup")
+async def start_emr_store():
+    global EMR_STORE
+    if not EMR_STORE_DB:
+        logger.warning("EMR_STORE_DB is not set, EMR reports cannot be saved")
+        return
+    EMR_STORE = await asyncio.to_thread(EMRStore, EMR_STORE_DB, batch_size=EMR_STORE_BATCH_SIZE)
+    EMR_STORE.start()
+
+@app.on_event("shutdown")
+async def stop_emr_store():
+    global EMR_STORE
+    if EMR_STORE is not None:
+        await EMR_STORE.stop()
+        EMR_STORE = None
+
+def emr_store_missing():
+    return JSONResponse({"error": "EMR store is not configured"}, status_code=503)
+
+@app.post("/emr-reports")
+@app.post("/save-emr")
+async def save_emr(request: Request):
+    if EMR_STORE is None:
+        return emr_store_missing()
+    try:
+        data = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "Request body must be JSON"}, status_code=400)
+    report = data.get("emrReport")
+    appointment_id = data.get("appointmentId")
+    if not isinstance(report, dict):
+        return JSONResponse({"error": "No EMR report provided"}, status_code=400)
+    if appointment_id in (None, ""):
+        return JSONResponse({"error": "No appointment ID provided"}, status_code=400)
+
+    session_id = data.get("sessionId")
+    transcript = data.get("transcript")
+    analysis = data.get("analysis")
+    # A client that recorded the consultation only needs to send its session ID
+    manager = SESSIONS.get(session_id) if valid_session_id(session_id) else None
+    if manager is not None:
+        if transcript is None and manager.transcript:
+            transcript = manager.transcript.text()
+        if analysis is None:
+            analysis = manager.analysis
+
+    try:
+        saved = await EMR_STORE.save(
+            appointment_id,
+            report,
+            patient_id=data.get("patientId"),
+            session_id=session_id if valid_session_id(session_id) else None,
+            transcript=transcript,
+            analysis=analysis,
+        )
+    except Exception as e:
+        ERRORS.inc(stage="emr_store")
+        logger.error(f"Error saving EMR for appointment {appointment_id}: {e}")
+        return JSONResponse({"error": "Failed to save EMR report"}, status_code=500)
+    return {"message": "EMR report saved successfully", **saved}
+
+@app.get("/emr-reports")
+async def list_emr_reports(patientId: str = None, since: str = None, until: str = None, limit: int = 50, cursor: str = None):
+    if EMR_STORE is None:
+        return emr_store_missing()
+    try:
+        return await EMR_STORE.query(
+            patient_id=patientId,
+            since=parse_time(since),
+            until=parse_time(until),
+            limit=max(1, min(limit, EMR_STORE_MAX_PAGE)),
+            cursor=cursor,
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+@app.get("/emr-reports/{appointment_id}")
+async def get_emr_report(appointment_id: str):
+    if EMR_STORE is None:
+        return emr_store_missing()
+    record = await EMR_STORE.get(appointment_id)
+    if record is None:
+        return JSONResponse({"error": "No EMR report for this appointment"}, status_code=404)
+    return record
+
+@app.get("/emr-store/stats")
+async def emr_store_stats():
+    if EMR_STORE is None:
+        return emr_store_missing()
+    return EMR_STORE.stats()
+
+# Extract partial EMRs per transcript segment while recording, merge them at stop
+INCREMENTAL_EMR = os.getenv("INCREMENTAL_EMR", "1") == "1"
+EMR_SEGMENT_CHARS = int(os.getenv("EMR_SEGMENT_CHARS", "2500"))
+
+EMR_PARAMS = {
+    "response_format": { "type": "json_object" },
+    "temperature": 0.1
+}
+
+def emr_params(sections=None, exclude=()):
+    """Request parameters with max_tokens sized to the fields being asked for."""
+    return {**EMR_PARAMS, "max_tokens": completion_budget(sections, exclude, EMR_MAX_COMPLETION_TOKENS)}
+
+EMR_MERGE_PROMPT = """You merge fields of an EMR report that were extracted from different parts of the same doctor-patient conversation. You receive a JSON object mapping each field path to the list of values found. Respond ONLY with a JSON object mapping every field path to a single concise string that combines the values without repeating information."""
+
+def emr_messages(transcript, labeled=False, exclude=()):
+    """Chat messages for an EMR request; fields in `exclude` are filled elsewhere and left out of the prompt."""
+    if labeled:
+        transcript = f"Each line is labeled with the speaker's role by automatic diarization, which can occasionally be wrong.\n\n{transcript}"
+    return [
+        {
+            "role": "system",
+            "content": system_prompt(exclude=exclude) if exclude else EMR_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"Analyze this doctor-patient conversation and create a detailed EMR report:\n\n{transcript}"
+        }
+    ]
+
+async def complete_emr_sections(transcript, analysis, missing):
+    """Fill the sections listed in `missing` with a request for just those sections.
+
+    Sections missing from a truncated or incomplete reply are requested again on their own.
+    """
+    sections = missing_sections(missing)
+    logger.info(f"EMR reply was missing {len(missing)} field(s), requesting sections: {', '.join(sections)}")
+    try:
+        result, _ = await LLM.complete(
+            [
+                {"role": "system", "content": system_prompt(sections)},
+                {"role": "user", "content": f"Analyze this doctor-patient conversation:\n\n{transcript}"}
+            ],
+            **emr_params(sections)
+        )
+        completed, _ = validate_emr(parse_json_object(result))
+    except (LLMRequestError, ValueError) as e:
+        # The documented defaults are already in place for anything still missing
+        logger.warning(f"Could not complete missing EMR sections: {e}")
+        return analysis
+    # Fields the first reply did provide are kept
+    for path in missing:
+        *parents, leaf = path.split(".")
+        target, source = analysis, completed
+        for key in parents:
+            target, source = target[key], source[key]
+        target[leaf] = source[leaf]
+    return analysis
+
+async def parse_emr_reply(transcript, parser, exclude=()):
+    """Validate a parsed reply against the EMR schema, re-requesting missing sections.
+
+    Fields in `exclude` were not asked for, so their absence is expected.
+    """
+    analysis, missing = validate_emr(parser.finish())
+    if parser.repairs:
+        logger.info(f"Repaired EMR reply: {'; '.join(parser.repairs)}")
+    missing = [path for path in missing if not covered(path, exclude)]
+    if missing:
+        analysis = await complete_emr_sections(transcript, analysis, missing)
+    return analysis
+
+async def extract_emr_segment(transcript, labeled=False, exclude=None):
+    if exclude is None:
+        # Symptom booleans are decided by the rules over the whole transcript at stop
+        exclude = BOOLEAN_PATHS if RULE_EXTRACTION else ()
+    result, _ = await LLM.complete(emr_messages(transcript, labeled, exclude), **emr_params(exclude=exclude))
+    # Partial reports only need defaults for what a segment does not mention
+    analysis, _ = validate_emr(parse_json_object(result))
+    return analysis
+
+async def extract_emr_pieces(pieces, labeled=False, exclude=()):
+    """Map-reduce extraction for a transcript too long for one request."""
+    partials = await asyncio.gather(*(extract_emr_segment(piece, labeled, exclude) for piece in pieces))
+    merged, conflicts = merge_partials(partials)
+    if conflicts:
+        try:
+            merged = apply_merged_text(merged, await merge_emr_text(conflicts))
+        except (LLMRequestError, ValueError) as e:
+            # Each conflicting field keeps the value from the earliest piece
+            logger.warning(f"Could not merge EMR text fields, keeping the first values: {e}")
+    analysis, _ = validate_emr(merged)
+    return analysis
+
+async def merge_emr_text(conflicts):
+    result, _ = await LLM.complete(
+        [
+            {"role": "system", "content": EMR_MERGE_PROMPT},
+            {"role": "user", "content": json.dumps(conflicts)}
+        ],
+        response_format={ "type": "json_object" },
+        temperature=0.1,
+        max_tokens=1000
+    )
+    merged = parse_json_object(result)
+    return {path: str(value) for path, value in merged.items() if path in conflicts}
 
 class TranscriptionManager:
-    def __init__(self, websocket: WebSocket):
-        self.websocket = websocket
-        self.audio_buffer = deque(maxlen=SAMPLE_RATE * BUFFER_DURATION)
+    def __init__(self, websocket: WebSocket, session_id=None):
+        self.websocket = None
+        self.outbound = None
+        if websocket is not None:
+            self.attach(websocket)
+        self.session_id = session_id or new_session_id()
+        # Highest segment index the client has acknowledged, replayed from on resume
+        self.acked = -1
+        self.analysis = None
+        self.journal = None
+        self.transcription_task = None
+        self.audio_buffer = AudioRingBuffer(SAMPLE_RATE * BUFFER_DURATION)
+        # Scratch windows reused for every inference so reads are a single memcpy
+        self.window = np.zeros(int(SAMPLE_RATE * max(level["chunk"] for level in LOAD_LEVELS)), dtype=np.float32)
+        self.utterance_window = np.zeros(SAMPLE_RATE * VAD_MAX_UTTERANCE, dtype=np.float32)
+        self.features = None
         self.stop_streaming = False
-        self.conversation_transcript = ""
+        self.transcript = TranscriptStore(TRANSCRIPT_SPILL_DIR or None, TRANSCRIPT_MEMORY_CHARS)
         self.stream = None
         self.is_connected = True
+        # "server" captures the local microphone, "client" receives binary audio frames
+        self.source = "server"
+        self.client_decoder = None
+        self.extractor = None
+        self.compactor = None
+        # "overlap" re-transcribes fixed windows, "streaming" commits words via local agreement,
+        # "vad" transcribes whole utterances cut at pauses
+        self.mode = "overlap"
+        self.streamer = None
+        self.vad = make_vad(VAD_BACKEND, SAMPLE_RATE)
+        self.segmenter = None
+        self.controller = AdaptiveController(
+            LOAD_LEVELS,
+            queue_high=2 * MAX_BATCH_SIZE,
+            queue_low=MAX_BATCH_SIZE // 2,
+        ) if ADAPTIVE_LOAD else None
+        self.level = LOAD_LEVELS[0]
+        self.backlog = 0.0
+        self.diarizer = OnlineDiarizer(
+            SAMPLE_RATE,
+            max_speakers=DIARIZATION_MAX_SPEAKERS,
+            threshold=DIARIZATION_THRESHOLD,
+        ) if DIARIZATION else None
         
-    def audio_callback(self, indata, frames, time, status):
+    def audio_callback(self, indata, frames, time_info, status):
+        started = time.perf_counter()
         if status:
+            AUDIO_CALLBACK_DROPS.inc()
             logger.warning(f"Audio callback status: {status}")
         try:
             # Convert to mono and add to buffer
-            audio_data = indata[:, 0]
-            self.audio_buffer.extend(audio_data)
+            self.audio_buffer.write(indata[:, 0])
+            if self.journal:
+                self.journal.write_audio(indata[:, 0])
         except Exception as e:
+            ERRORS.inc(stage="audio")
             logger.error(f"Error in audio callback: {e}")
+        AUDIO_CALLBACK_TIME.observe(time.perf_counter() - started)
+
+    def start_client_stream(self, audio_format, sample_rate, channels):
+        logger.info(f"Starting client audio stream ({audio_format}, {sample_rate} Hz, {channels} ch)")
+        try:
+            self.client_decoder = ClientAudioDecoder(audio_format, sample_rate, channels, target_rate=SAMPLE_RATE)
+        except Exception as e:
+            logger.error(f"Error starting client audio stream: {e}")
+            return False
+        if self.stream:
+            try:
+                self.stream.stop()
+                self.stream.close()
+            except Exception as e:
+                logger.error(f"Error closing existing stream: {e}")
+            self.stream = None
+        self.audio_buffer.clear()
+        self.source = "client"
+        return True
+
+    def ingest(self, payload):
+        if self.source != "client" or not self.client_decoder or self.stop_streaming:
+            return
+        try:
+            samples = self.client_decoder.decode(payload)
+            self.audio_buffer.write(samples)
+            if self.journal:
+                self.journal.write_audio(samples)
+        except Exception as e:
+            ERRORS.inc(stage="audio")
+            logger.error(f"Error decoding client audio: {e}")
 
     def start_audio_stream(self):
         logger.info("Starting audio stream...")
+        if sd is None:
+            logger.error("sounddevice is not available, server-side capture is disabled")
+            return False
         try:
             if self.stream:
                 try:
@@ -64,6 +703,8 @@ class TranscriptionManager:
                 except Exception as e:
                     logger.error(f"Error closing existing stream: {e}")
                 
+            self.audio_buffer.clear()
+            self.source = "server"
             self.stream = sd.InputStream(
                 samplerate=SAMPLE_RATE,
                 channels=1,
@@ -78,83 +719,318 @@ class TranscriptionManager:
             return False
 
     async def safe_send(self, data):
-        if self.is_connected:
-            try:
-                await self.websocket.send_json(data)
-                return True
-            except Exception as e:
-                logger.error(f"Error sending data: {e}")
-                self.is_connected = False
-                return False
+        if data.get("type") == "final_analysis":
+            # Kept so a client that reconnects after stop still receives its report
+            self.analysis = data["analysis"]
+        if not self.is_connected:
+            return False
+        if self.outbound is None:
+            # Detached: transcription carries on and segments are replayed on resume
+            return True
+        # Queued for the writer task, so a slow client never blocks transcription
+        if self.outbound.put(data):
+            return True
+        if SESSIONS.enabled:
+            # The client is gone or too slow: detach now, so the session can be
+            # resumed and is evicted after SESSION_TTL if it is not
+            self.detach()
+            SESSIONS.detach(self.session_id)
+            return True
+        self.is_connected = False
         return False
 
+    def attach(self, websocket):
+        if self.outbound:
+            self.outbound.stop()
+        self.websocket = websocket
+        self.outbound = OutboundQueue(
+            websocket,
+            max_size=OUTBOUND_QUEUE_SIZE,
+            heartbeat_interval=HEARTBEAT_INTERVAL,
+            send_timeout=SEND_TIMEOUT,
+            client_timeout=CLIENT_TIMEOUT,
+        )
+        self.outbound.start()
+
+    def detach(self):
+        logger.info(f"Session {self.session_id} detached")
+        if self.outbound:
+            self.outbound.stop()
+        self.websocket = None
+        self.outbound = None
+
     async def transcribe_audio(self):
-        if not MODEL:
-            logger.error("Whisper model not loaded")
+        if REGISTRY.error:
+            logger.error(f"Whisper model not loaded: {REGISTRY.error}")
             await self.safe_send({
                 "type": "error",
                 "message": "Transcription service not available"
             })
             return
 
+        if self.mode == "streaming":
+            await self.transcribe_streaming()
+        elif self.mode == "vad":
+            await self.transcribe_utterances()
+        else:
+            await self.transcribe_overlapping()
+
+    async def infer(self, audio, prompt=None, mel=None):
+        started = time.perf_counter()
+        try:
+            result = await INFERENCE.submit(id(self), audio, prompt=prompt, model=self.level["model"], mel=mel)
+        except WorkerPoolBusy:
+            SHED_WINDOWS.inc()
+            logger.warning("All inference workers busy, skipping window")
+            return None
+        elapsed = time.perf_counter() - started
+        WINDOW_TIME.observe(elapsed, mode=self.mode)
+        WINDOW_RTF.observe(elapsed * SAMPLE_RATE / max(len(audio), 1), mode=self.mode)
+        if self.controller:
+            level = self.controller.observe(elapsed / self.time_budget(len(audio)), INFERENCE.queue_depth, self.backlog)
+            if level:
+                await self.apply_level(level)
+        return result
+
+    def time_budget(self, samples):
+        """Seconds a decode may take for this session to keep up with real time."""
+        if self.mode == "overlap":
+            return self.level["chunk"] * (1 - self.level["overlap"]) or self.level["chunk"]
+        if self.mode == "streaming":
+            return self.level["step"]
+        return max(samples / SAMPLE_RATE, 0.1)
+
+    async def apply_level(self, level, dropped=0):
+        self.level = level
+        if self.streamer:
+            self.streamer.min_step = int(level["step"] * SAMPLE_RATE)
+            self.streamer.use_prompt = level["prompt"]
+        LOAD_LEVEL_CHANGES.inc(level=level["name"])
+        await self.safe_send({
+            "type": "degraded",
+            "droppedSeconds": dropped / SAMPLE_RATE,
+            **self.controller.status()
+        })
+
+    async def report_dropped(self, samples):
+        """Audio was overwritten before it could be transcribed: say so and shed load."""
+        logger.warning(f"Transcription fell behind, skipping {samples} samples")
+        DROPPED_AUDIO.inc(samples / SAMPLE_RATE)
+        level = self.controller.escalate("audio was dropped") if self.controller else None
+        if level:
+            await self.apply_level(level, dropped=samples)
+        else:
+            await self.safe_send({
+                "type": "degraded",
+                "droppedSeconds": samples / SAMPLE_RATE,
+                **(self.controller.status() if self.controller else {"degraded": True})
+            })
+
+    def observe_backlog(self, position):
+        self.backlog = (self.audio_buffer.write_pos - position) / self.audio_buffer.capacity
+        BUFFER_BACKLOG.observe(self.backlog, mode=self.mode)
+
+    async def transcribe_streaming(self):
+        logger.info("Starting streaming transcription loop")
+        self.streamer = StreamingTranscriber(
+            self.audio_buffer,
+            self.infer,
+            SAMPLE_RATE,
+            min_step=STREAM_MIN_STEP,
+            trim_duration=STREAM_TRIM_DURATION,
+            max_duration=STREAM_MAX_DURATION,
+            vad=self.vad,
+        )
+        self.streamer.min_step = int(self.level["step"] * SAMPLE_RATE)
+        self.streamer.use_prompt = self.level["prompt"]
+
+        while not self.stop_streaming and self.is_connected:
+            try:
+                if not self.streamer.ready():
+                    await asyncio.sleep(0.1)
+                    continue
+
+                self.observe_backlog(self.streamer.decoded_until)
+                final, partial = await self.streamer.step()
+                if final and not await self.send_final(final):
+                    break
+                if partial and not await self.safe_send({
+                    "type": "partial",
+                    "text": " ".join(word[2] for word in partial)
+                }):
+                    break
+
+                # Allow other tasks to run
+                await asyncio.sleep(0.01)
+
+            except Exception as e:
+                ERRORS.inc(stage="transcription")
+                logger.error(f"Error in streaming transcription: {e}")
+                await self.safe_send({
+                    "type": "error",
+                    "message": "Transcription error occurred"
+                })
+                break
+
+    async def transcribe_utterances(self):
+        logger.info("Starting VAD-gated transcription loop")
+        self.segmenter = SpeechSegmenter(
+            self.vad,
+            SAMPLE_RATE,
+            min_speech=VAD_MIN_SPEECH,
+            hangover=VAD_HANGOVER,
+            padding=VAD_PADDING,
+            max_utterance=VAD_MAX_UTTERANCE,
+        )
+        self.segmenter.reset(self.audio_buffer.write_pos)
+
+        while not self.stop_streaming and self.is_connected:
+            try:
+                utterances = self.segmenter.process(self.audio_buffer)
+                if not utterances:
+                    await asyncio.sleep(0.1)
+                    continue
+                for start, end in utterances:
+                    if not await self.transcribe_utterance(start, end):
+                        return
+            except Exception as e:
+                ERRORS.inc(stage="transcription")
+                logger.error(f"Error in VAD transcription: {e}")
+                await self.safe_send({
+                    "type": "error",
+                    "message": "Transcription error occurred"
+                })
+                break
+
+    async def transcribe_utterance(self, start, end):
+        if start < self.audio_buffer.start_pos:
+            await self.report_dropped(end - start)
+            return True
+        self.observe_backlog(start)
+        audio = self.audio_buffer.read(start, end - start, out=self.utterance_window)
+
+        # Normalize audio in place
+        peak = np.abs(audio).max()
+        if peak > 0:
+            audio *= 1.0 / peak
+
+        result = await self.infer(audio)
+        if result is None:
+            return True
+        text = result["text"].strip()
+        if not text:
+            return True
+        logger.debug(f"Transcribed: {text}")
+        speaker = await self.diarize(audio, peak)
+        index = self.append_transcript(text, start, end, result, speaker)
+        return await self.safe_send({
+            "type": "transcription",
+            "segment": index,
+            "text": text,
+            "start": start / SAMPLE_RATE,
+            "end": end / SAMPLE_RATE,
+            "speaker": speaker
+        })
+
+    async def send_final(self, words):
+        text = " ".join(word[2] for word in words)
+        logger.debug(f"Committed: {text}")
+        start, end = int(words[0][0] * SAMPLE_RATE), int(words[-1][1] * SAMPLE_RATE)
+        speaker = None
+        # Word timestamps can run past the audio received so far
+        start_pos = max(start, self.audio_buffer.start_pos)
+        end_pos = min(end, self.audio_buffer.write_pos)
+        if self.diarizer and end_pos > start_pos:
+            # A copy: the diarizer thread must not see the ring buffer being overwritten
+            length = end_pos - start_pos
+            audio = self.audio_buffer.read(start_pos, length, out=np.empty(length, dtype=np.float32))
+            speaker = await self.diarize(audio)
+        index = self.append_transcript(text, start, end, speaker=speaker)
+        return await self.safe_send({
+            "type": "final",
+            "segment": index,
+            "text": text,
+            "start": words[0][0],
+            "end": words[-1][1],
+            "speaker": speaker
+        })
+
+    def window_features(self, start, audio, peak):
+        """Log-mel input for an overlap window from the cached frames, or None to let the decoder compute it."""
+        if self.features is None:
+            return None
+        started = time.perf_counter()
+        self.features.update(self.audio_buffer, since=start)
+        mel = self.features.window(start, audio, peak)
+        FEATURE_TIME.observe(time.perf_counter() - started)
+        return mel
+
+    async def diarize(self, audio, peak=1.0):
+        """Speaker index for a transcribed segment, or None when diarization is off or unsure."""
+        if self.diarizer is None:
+            return None
+        return await asyncio.to_thread(self._assign_speaker, audio, peak)
+
+    def _assign_speaker(self, audio, peak):
+        with DIARIZATION_TIME.time():
+            return self.diarizer.assign(audio, peak)
+
+    async def transcribe_overlapping(self):
         logger.info("Starting transcription loop")
-        # Keep track of the last processed position
-        last_processed = 0
+        # Absolute sample position (ring buffer cursor space) of the next window
+        last_processed = self.audio_buffer.start_pos
+        if INCREMENTAL_FEATURES and INFERENCE is SCHEDULER and REGISTRY.log_mel_input:
+            self.features = IncrementalLogMel(self.audio_buffer.capacity, n_mels_for(REGISTRY.default_model))
         
         while not self.stop_streaming and self.is_connected:
             try:
-                buffer_size = len(self.audio_buffer)
-                if buffer_size >= CHUNK_SIZE and buffer_size - last_processed >= CHUNK_SIZE // 2:
-                    # Extract audio chunk with 50% overlap from previous chunk
-                    buffer_list = list(self.audio_buffer)
-                    audio_chunk = np.array(buffer_list[last_processed:last_processed+CHUNK_SIZE], dtype=np.float32)
+                # Window size and overlap follow the current load level
+                chunk_size = int(self.level["chunk"] * SAMPLE_RATE)
+                if self.audio_buffer.write_pos - last_processed >= chunk_size:
+                    # Audio older than the ring capacity has been overwritten; skip ahead
+                    if last_processed < self.audio_buffer.start_pos:
+                        await self.report_dropped(self.audio_buffer.start_pos - last_processed)
+                        last_processed = self.audio_buffer.start_pos
                     
-                    # Update the last processed position with overlap
-                    last_processed += CHUNK_SIZE // 2
-                    # Ensure we don't go beyond buffer size
-                    if last_processed > len(self.audio_buffer) - CHUNK_SIZE // 2:
-                        last_processed = len(self.audio_buffer) - CHUNK_SIZE // 2
+                    # Extract audio chunk overlapping the previous one
+                    window_start = last_processed
+                    self.observe_backlog(window_start)
+                    audio_chunk = self.audio_buffer.read(window_start, chunk_size, out=self.window)
+                    last_processed += max(round(chunk_size * (1 - self.level["overlap"])), 1)
                     
-                    # Skip silent sections
-                    if np.abs(audio_chunk).mean() < 0.005:  # Threshold for silence
+                    # Skip sections without speech
+                    if not contains_speech(self.vad, audio_chunk):
+                        SILENT_WINDOWS.inc()
                         await asyncio.sleep(0.05)
                         continue
                     
-                    # Normalize audio
-                    if np.abs(audio_chunk).max() > 0:
-                        audio_chunk = audio_chunk / np.abs(audio_chunk).max()
+                    # Normalize audio in place
+                    peak = np.abs(audio_chunk).max()
+                    if peak > 0:
+                        audio_chunk *= 1.0 / peak
                     
-                    # Transcribe asynchronously to avoid blocking the event loop
-                    result = await asyncio.to_thread(lambda: MODEL.transcribe(
-                        audio_chunk, 
-                        fp16=False,
-                        language="en",
-                        beam_size=1,
-                        best_of=1,
-                        temperature=0
-                    ))
+                    # Queue the window for the shared batched decoder
+                    result = await self.infer(audio_chunk, mel=self.window_features(window_start, audio_chunk, peak))
+                    if result is None:
+                        continue
                     
                     text = result["text"].strip()
                     
                     if text:
-                        logger.info(f"Transcribed: {text}")
-                        self.conversation_transcript += " " + text
+                        logger.debug(f"Transcribed: {text}")
+                        speaker = await self.diarize(audio_chunk, peak)
+                        index = self.append_transcript(text, window_start, window_start + chunk_size, result, speaker)
                         
                         if not await self.safe_send({
                             "type": "transcription",
-                            "text": text
+                            "segment": index,
+                            "text": text,
+                            "start": window_start / SAMPLE_RATE,
+                            "end": (window_start + chunk_size) / SAMPLE_RATE,
+                            "speaker": speaker
                         }):
                             break
                             
-                    # Instead of clearing the buffer, just prune it if it gets too large
-                    if len(self.audio_buffer) > SAMPLE_RATE * BUFFER_DURATION * 1.5:
-                        # Keep the most recent audio data
-                        to_remove = len(self.audio_buffer) - (SAMPLE_RATE * BUFFER_DURATION)
-                        for _ in range(to_remove):
-                            self.audio_buffer.popleft()
-                        # Adjust last_processed
-                        last_processed = max(0, last_processed - to_remove)
-                    
                     # Allow other tasks to run
                     await asyncio.sleep(0.01)
                 else:
@@ -162,6 +1038,7 @@ class TranscriptionManager:
                     await asyncio.sleep(0.1)
                     
             except Exception as e:
+                ERRORS.inc(stage="transcription")
                 logger.error(f"Error in transcription: {e}")
                 await self.safe_send({
                     "type": "error",
@@ -169,7 +1046,7 @@ class TranscriptionManager:
                 })
                 break
 
-    async def stop_recording(self):
+    async def stop_recording(self, transcription_task=None):
         logger.info("Stopping recording")
         self.stop_streaming = True
         if self.stream:
@@ -178,204 +1055,221 @@ class TranscriptionManager:
                 self.stream.close()
             except Exception as e:
                 logger.error(f"Error stopping stream: {e}")
+
+        # Let an in-flight decode finish so its words make it into the transcript
+        if transcription_task:
+            try:
+                await transcription_task
+            except Exception as e:
+                logger.error(f"Error finishing transcription task: {e}")
+
+        if self.streamer:
+            remaining = self.streamer.finish()
+            if remaining:
+                await self.send_final(remaining)
+            self.streamer = None
+
+        if self.segmenter:
+            for start, end in self.segmenter.flush():
+                await self.transcribe_utterance(start, end)
+            logger.info(f"VAD speech fraction: {self.segmenter.speech_fraction():.2f}")
+            self.segmenter = None
         
-        if self.conversation_transcript.strip():
-            await self.process_final_transcript()
+        if self.transcript:
+            await self.process_final_transcript(incremental=True)
 
-    async def process_final_transcript(self):
+    def reset_transcript(self):
+        self.transcript.clear()
+        self.acked = -1
+        self.analysis = None
+        if self.diarizer:
+            self.diarizer.reset()
+        if SESSION_JOURNAL_DIR:
+            if self.journal is None:
+                self.journal = SessionJournal(SESSION_JOURNAL_DIR, self.session_id)
+            self.journal.write_segment({"reset": True})
+        if self.extractor:
+            self.extractor.cancel()
+        self.compactor = TranscriptCompactor(overlapping=self.mode == "overlap")
+        self.extractor = IncrementalEMRExtractor(
+            extract_emr_segment,
+            merge_emr_text,
+            segment_chars=EMR_SEGMENT_CHARS,
+        ) if INCREMENTAL_EMR else None
+
+    def append_transcript(self, text, start=-1, end=-1, result=None, speaker=None):
+        index = self.transcript.append(
+            text,
+            start,
+            end,
+            avg_logprob=result.get("avg_logprob") if result else None,
+            no_speech_prob=result.get("no_speech_prob") if result else None,
+            speaker=speaker,
+        )
+        if self.journal:
+            self.journal.write_segment(next(self.transcript.segments(since=index)))
+        if self.extractor:
+            text = self.compactor.add(text, start, end)
+            # Roles are only settled at the end, but turns already help the partial extractions
+            if text:
+                self.extractor.add_text(f"Speaker {speaker + 1}: {text}" if speaker is not None else text)
+        return index
+
+    async def process_final_transcript(self, incremental=False):
         if not self.is_connected:
             return
 
-        if not self.conversation_transcript.strip():
+        # Fillers and text repeated by overlapping windows are dropped before anything reaches the LLM
+        segments, compactor = compact_segments(self.transcript.segments(), overlapping=self.mode == "overlap")
+        if not segments:
             await self.safe_send({
                 "type": "error",
                 "message": "No conversation recorded"
             })
             return
 
-        logger.info("Processing final transcript")
-        logger.info(f"Conversation transcript: {self.conversation_transcript}")
+        # With speakers known, the LLM gets "Doctor: ..." / "Patient: ..." turns instead of one block
+        labeled = any(segment["speaker"] is not None for segment in segments)
+        if labeled:
+            transcript = labeled_transcript(segments)
+            await self.safe_send({
+                "type": "speakers",
+                "transcript": transcript,
+                **(self.diarizer.stats() if self.diarizer else {})
+            })
+        else:
+            transcript = " ".join(segment["text"] for segment in segments)
+        pieces, tokens = fit_transcript(transcript, EMR_TRANSCRIPT_TOKENS)
+
+        logger.info(
+            f"Processing final transcript ({len(self.transcript)} segments, {compactor.input_chars} chars, "
+            f"{len(transcript)} after compaction, ~{tokens} tokens in {len(pieces)} piece(s))"
+        )
+        logger.debug(f"Conversation transcript: {transcript}")
+
+        # Retries with an identical transcript are answered without calling the LLM
+        key = cache_key(LLM_MODEL, EMR_PROMPT_VERSION, transcript)
+        cached = await EMR_CACHE.get(key)
+        if cached is not None:
+            logger.info("EMR served from cache")
+            await self.safe_send({
+                "type": "final_analysis",
+                "shouldNavigate": True,
+                "analysis": cached,
+                "cached": True
+            })
+            return
+
+        # Rule-filled fields are instant and work without the LLM
+        rules = None
+        if RULE_EXTRACTION:
+            started = time.perf_counter()
+            rules = extract_fields(segment["text"] for segment in segments)
+            RULE_TIME.observe(time.perf_counter() - started)
+            await self.safe_send({
+                "type": "emr_preliminary",
+                "analysis": rules.report(),
+                "fields": sorted(rules.paths)
+            })
 
+        if incremental and self.extractor:
+            # Only the transcript tail and the merge are left to do at this point
+            try:
+                analysis = await self.extractor.finalize()
+            except Exception as e:
+                logger.warning(f"Incremental EMR extraction failed, falling back to a full request: {e}")
+                analysis = None
+            if analysis is not None:
+                if rules:
+                    analysis = rules.report(analysis)
+                await EMR_CACHE.put(key, analysis)
+                await self.safe_send({
+                    "type": "final_analysis",
+                    "shouldNavigate": True,
+                    "analysis": analysis
+                })
+                logger.info("EMR data sent successfully")
+                return
+
+        exclude = rules.paths if rules else ()
+        messages = emr_messages(transcript, labeled, exclude)
+        params = emr_params(exclude=exclude)
+        usage = {}
+
+        result = ""
         try:
             logger.info("Sending request to OpenRouter API")
-            response = await asyncio.to_thread(
-                lambda: requests.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
-                    json={
-                        "model": "qwen/qwen2.5-vl-72b-instruct:free",
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": """You are a medical professional analyzing doctor-patient conversations. You must respond ONLY with a valid JSON object containing the following fields. DO NOT include any other text or explanations.
-
-Required JSON structure:
-{
-    "consultationDetails": "string",
-    "consultationType": "string",
-    "chiefComplaint": "string",
-    "otherComplaints": ["string"],
-    "historyOfPresentIllness": {
-        "location": "string",
-        "duration": "string",
-        "quality": "string",
-        "timing": "string",
-        "severity": "string",
-        "associatedSignsSymptoms": "string",
-        "other": "string"
-    },
-    "reviewOfSymptoms": {
-        "constitutional": {
-            "fever": false,
-            "chills": false,
-            "nightSweats": false,
-            "fatigue": false
-        },
-        "neurological": {
-            "headache": false,
-            "numbness": false,
-            "weakness": false,
-            "dizziness": false
-        },
-        "cardiovascular": {
-            "chestPain": false,
-            "palpitations": false,
-            "dyspnea": false,
-            "heartbeatIrregular": false
-        },
-        "musculoskeletal": {
-            "arthralgias": false,
-            "myalgias": false,
-            "swellingInJoints": false,
-            "other": false
-        }
-    },
-    "physicalExamination": {
-        "constitutional": {
-            "recordThreeVitalSigns": "string",
-            "nutritionGood": "string",
-            "appearance": "string",
-            "other": "string"
-        },
-        "neurological": {
-            "focalNeuroDeficits": "string",
-            "asterixis": "string",
-            "other": "string"
-        },
-        "cardiovascular": {
-            "heartSoundsAbnormal": "string",
-            "pulseHeartRhythmAbnormal": "string",
-            "peripheralEdema": "string",
-            "other": "string"
-        },
-        "musculoskeletal": {
-            "normalGaitAndStation": "string",
-            "clubbing": "string",
-            "muscleWeakness": "string",
-            "other": "string"
-        }
-    },
-    "painScreening": {
-        "pain": "string",
-        "location": "string",
-        "duration": "string",
-        "frequency": "string",
-        "character": "string",
-        "score": "string",
-        "management": "string"
-    }
-}
-
-Rules:
-1. ONLY output valid JSON - no other text
-2. ALL fields must be included
-3. Use empty strings "" for unknown text fields
-4. Use false for unknown boolean fields
-5. Use empty arrays [] for unknown array fields
-6. ALL property names must be in double quotes
-7. ALL string values must be in double quotes
-8. Boolean values must be true or false (no quotes)
-9. Ensure proper nesting and closing of all brackets
-10. No trailing commas
-11. No comments or explanations
-12. No line breaks in string values - use \\n if needed"""
-                            },
-                            {
-                                "role": "user",
-                                "content": f"Analyze this doctor-patient conversation and create a detailed EMR report:\n\n{self.conversation_transcript}"
-                            }
-                        ],
-                        "response_format": { "type": "json_object" },
-                        "temperature": 0.1,
-                        "max_tokens": 2000
-                    },
-                    headers={
-                        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                        "Content-Type": "application/json",
-                        "HTTP-Referer": "https://github.com/OpenRouterTeam/openrouter",
-                        "X-Title": "Vitalis Medical Transcription"
-                    },
-                    timeout=30
-                )
-            )
-            
-            # Log the raw response for debugging
-            logger.info(f"Raw API response: {response.text}")
-            
-            # Check response status
-            response.raise_for_status()
-            
-            # Parse response JSON
-            response_data = response.json()
-            logger.info(f"Parsed response data: {response_data}")
-            
-            # Validate response structure
-            if 'choices' not in response_data:
-                raise ValueError(f"Missing 'choices' in API response: {response_data}")
-            
-            if not response_data['choices'] or 'message' not in response_data['choices'][0]:
-                raise ValueError(f"Invalid response structure: {response_data}")
-            
-            result = response_data['choices'][0]['message']['content']
-            logger.info(f"Extracted content: {result}")
-            
-            # Validate and clean the result
+            if len(pieces) > 1:
+                analysis = await extract_emr_pieces(pieces, labeled, exclude)
+                if rules:
+                    analysis = rules.report(analysis)
+                await EMR_CACHE.put(key, analysis)
+                await self.safe_send({
+                    "type": "final_analysis",
+                    "shouldNavigate": True,
+                    "analysis": analysis
+                })
+                logger.info(f"EMR data sent successfully ({len(pieces)} pieces)")
+                return
+            if LLM_STREAM:
+                # Forward each top-level EMR field to the frontend as soon as it is complete
+                parser = StreamingJSONParser()
+                chunks = []
+                async for delta in LLM.stream(messages, usage=usage, **params):
+                    chunks.append(delta)
+                    for field, value in parser.feed(delta):
+                        value = validate_field(field, value)
+                        await self.safe_send({
+                            "type": "emr_partial",
+                            "field": field,
+                            "value": rules.apply(value, field) if rules else value
+                        })
+                result = "".join(chunks)
+            else:
+                result, data = await LLM.complete(messages, **params)
+                usage = data["usage"]
+                parser = StreamingJSONParser()
+                parser.feed(result)
+            logger.debug(f"Extracted content: {result}")
             if not result.strip():
                 raise ValueError("Empty result from API")
-            
-            # Clean the JSON string
-            result = result.strip()
-            if not result.startswith('{'):
-                start_idx = result.find('{')
-                if start_idx == -1:
-                    raise ValueError(f"No JSON object found in result: {result}")
-                result = result[start_idx:]
-            if not result.endswith('}'):
-                end_idx = result.rfind('}')
-                if end_idx == -1:
-                    raise ValueError(f"No closing brace found in result: {result}")
-                result = result[:end_idx + 1]
-            
-            # Parse the cleaned JSON
-            analysis = json.loads(result)
+
+            # Repair and validate the reply, filling in anything it left out
+            analysis = await parse_emr_reply(transcript, parser, exclude)
+            if rules:
+                analysis = rules.report(analysis)
+            await EMR_CACHE.put(key, analysis)
             
             # Create the response data structure
             response_data = {
                 "type": "final_analysis",
                 "shouldNavigate": True,
-                "analysis": analysis
+                "analysis": analysis,
+                "usage": usage
             }
 
             # Send to frontend
             await self.safe_send(response_data)
             logger.info("EMR data sent successfully")
             
-        except requests.exceptions.RequestException as e:
+        except LLMRequestError as e:
+            ERRORS.inc(stage="llm")
             logger.error(f"API request error: {e}")
+            if rules:
+                # Not cached, so a retry once the LLM is reachable gets the full report
+                await self.safe_send({
+                    "type": "final_analysis",
+                    "shouldNavigate": True,
+                    "analysis": rules.report(),
+                    "degraded": True
+                })
+                return
             await self.safe_send({
                 "type": "error",
                 "message": "Failed to connect to the transcription service. Please try again."
             })
         except json.JSONDecodeError as e:
+            ERRORS.inc(stage="emr")
             logger.error(f"JSON parsing error: {e}")
             logger.error(f"Problematic JSON: {result}")
             await self.safe_send({
@@ -383,12 +1277,14 @@ Rules:
                 "message": "Failed to parse the generated EMR data. Please try again."
             })
         except ValueError as e:
+            ERRORS.inc(stage="emr")
             logger.error(f"Validation error: {e}")
             await self.safe_send({
                 "type": "error",
                 "message": f"Invalid response from transcription service: {str(e)}"
             })
         except Exception as e:
+            ERRORS.inc(stage="emr")
             logger.error(f"Error processing transcript: {e}")
             await self.safe_send({
                 "type": "error",
@@ -399,6 +1295,13 @@ Rules:
         logger.info("Cleaning up resources")
         self.stop_streaming = True
         self.is_connected = False
+        if self.extractor:
+            self.extractor.cancel()
+        self.transcript.close()
+        if self.journal:
+            self.journal.close()
+        if self.outbound:
+            self.outbound.stop()
         if self.stream:
             try:
                 self.stream.stop()
@@ -406,6 +1309,31 @@ Rules:
             except:
                 pass
 
+def resume_session(session_id):
+    """Find a live session or rebuild one from its journal; None if neither exists."""
+    if not SESSIONS.enabled or not valid_session_id(session_id):
+        return None
+    manager = SESSIONS.attach(session_id)
+    if manager is not None:
+        return manager
+    if not SESSION_JOURNAL_DIR or not SessionJournal.exists(SESSION_JOURNAL_DIR, session_id):
+        return None
+
+    manager = TranscriptionManager(None, session_id=session_id)
+    for segment in SessionJournal.load_segments(SESSION_JOURNAL_DIR, session_id):
+        manager.transcript.append(
+            segment["text"],
+            segment["start"],
+            segment["end"],
+            avg_logprob=segment.get("avg_logprob"),
+            no_speech_prob=segment.get("no_speech_prob"),
+            speaker=segment.get("speaker"),
+        )
+    manager.journal = SessionJournal(SESSION_JOURNAL_DIR, session_id)
+    SESSIONS.add(session_id, manager)
+    logger.info(f"Restored session {session_id} from journal ({len(manager.transcript)} segments)")
+    return manager
+
 @app.websocket("/transcription")
 async def transcription_endpoint(websocket: WebSocket):
     client_id = id(websocket)
@@ -416,30 +1344,59 @@ async def transcription_endpoint(websocket: WebSocket):
         logger.info(f"WebSocket connection accepted for client {client_id}")
         
         manager = TranscriptionManager(websocket)
-        transcription_task = None
+        SESSIONS.add(manager.session_id, manager)
         
         try:
             while True:
                 try:
-                    data = await websocket.receive_json()
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    if manager.outbound:
+                        manager.outbound.mark_alive()
+                    # Binary frames carry client-captured audio
+                    if message.get("bytes") is not None:
+                        manager.ingest(message["bytes"])
+                        continue
+                    data = json.loads(message.get("text") or "{}")
                     command = data.get("command")
                     logger.info(f"Received command '{command}' from client {client_id}")
                     
                     if command == "start":
                         # Stop any existing recording
-                        if transcription_task:
+                        if manager.transcription_task:
                             manager.stop_streaming = True
                             try:
-                                await transcription_task
+                                await manager.transcription_task
                             except:
                                 pass
                         
                         # Start new recording
                         manager.stop_streaming = False
-                        manager.conversation_transcript = ""
-                        if manager.start_audio_stream():
-                            transcription_task = asyncio.create_task(manager.transcribe_audio())
+                        # The mode decides whether the transcript compactor removes window overlap
+                        manager.mode = data.get("mode") if data.get("mode") in ("streaming", "vad") else "overlap"
+                        manager.reset_transcript()
+                        manager.streamer = None
+                        manager.segmenter = None
+                        source = data.get("source", "server")
+                        if source == "client":
+                            started = manager.start_client_stream(
+                                data.get("format", "pcm16"),
+                                int(data.get("sampleRate", SAMPLE_RATE)),
+                                int(data.get("channels", 1)),
+                            )
+                        else:
+                            started = manager.start_audio_stream()
+                        if started:
+                            manager.transcription_task = asyncio.create_task(manager.transcribe_audio())
                             logger.info(f"Started new transcription task for client {client_id}")
+                            await manager.safe_send({
+                                "type": "started",
+                                "sessionId": manager.session_id,
+                                "source": manager.source,
+                                "mode": manager.mode,
+                                "sampleRate": SAMPLE_RATE
+                            })
                         else:
                             await manager.safe_send({
                                 "type": "error",
@@ -447,10 +1404,45 @@ async def transcription_endpoint(websocket: WebSocket):
                             })
                     
                     elif command == "stop":
-                        if transcription_task:
-                            await manager.stop_recording()
-                            transcription_task = None
+                        if manager.transcription_task:
+                            task, manager.transcription_task = manager.transcription_task, None
+                            await manager.stop_recording(task)
                             logger.info(f"Stopped transcription for client {client_id}")
+
+                    elif command == "pong":
+                        if manager.outbound:
+                            manager.outbound.mark_alive(pong=True)
+
+                    elif command == "ack":
+                        manager.acked = max(manager.acked, int(data.get("segment", -1)))
+
+                    elif command == "resume":
+                        session_id = data.get("sessionId")
+                        resumed = resume_session(session_id)
+                        if resumed is None:
+                            await manager.safe_send({
+                                "type": "error",
+                                "message": "Session not found or expired"
+                            })
+                            continue
+                        if resumed is not manager:
+                            # The session created for this connection was never used
+                            SESSIONS.remove(manager.session_id)
+                            manager = resumed
+                        manager.attach(websocket)
+                        last_segment = data.get("lastSegment")
+                        since = (manager.acked if last_segment is None else int(last_segment)) + 1
+                        logger.info(f"Client {client_id} resumed session {session_id} from segment {since}")
+                        await manager.safe_send({
+                            "type": "resumed",
+                            "sessionId": manager.session_id,
+                            "source": manager.source,
+                            "mode": manager.mode,
+                            "recording": manager.transcription_task is not None and not manager.transcription_task.done(),
+                            "sampleRate": SAMPLE_RATE,
+                            "segments": list(manager.transcript.segments(since=max(since, 0))),
+                            "analysis": manager.analysis
+                        })
                             
                     elif command == "generate_emr":
                         # Get the transcript from the message
@@ -458,8 +1450,8 @@ async def transcription_endpoint(websocket: WebSocket):
                         
                         if transcript:
                             # Use the existing transcript if provided, otherwise use what we've collected
-                            if not manager.conversation_transcript:
-                                manager.conversation_transcript = transcript
+                            if not manager.transcript:
+                                manager.transcript.append(transcript)
                             
                             # Process the transcript
                             await manager.process_final_transcript()
@@ -481,18 +1473,46 @@ async def transcription_endpoint(websocket: WebSocket):
             logger.error(f"WebSocket error for client {client_id}: {e}")
         
         finally:
-            logger.info(f"Cleaning up connection for client {client_id}")
-            manager.cleanup()
-            if transcription_task:
-                try:
-                    await transcription_task
-                except:
-                    pass
+            if SESSIONS.enabled and manager.is_connected:
+                # Keep transcribing what was captured; the client may resume this session
+                if manager.websocket is websocket:
+                    manager.detach()
+                    SESSIONS.detach(manager.session_id)
+            else:
+                logger.info(f"Cleaning up connection for client {client_id}")
+                # Removing the session cleans it up
+                SESSIONS.remove(manager.session_id)
+                if manager.transcription_task:
+                    try:
+                        await manager.transcription_task
+                    except:
+                        pass
     
     except Exception as e:
         logger.error(f"Error accepting WebSocket connection for client {client_id}: {e}")
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
+    from inference_backends import BACKENDS
+    from model_registry import COMPUTE_TYPES, WHISPER_MODELS
+
+    parser = argparse.ArgumentParser(description="Vitalis transcription server")
+    parser.add_argument("--model", choices=WHISPER_MODELS, help="Whisper model (default: $WHISPER_MODEL or medium.en)")
+    parser.add_argument("--device", help="Device for inference: auto, cpu or cuda (default: $WHISPER_DEVICE or auto)")
+    parser.add_argument("--compute-type", choices=COMPUTE_TYPES, help="Compute dtype (default depends on backend and device)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), help="Inference backend (default: $WHISPER_BACKEND or whisper)")
+    parser.add_argument("--threads", type=int, help="CPU threads for the inference backend (default: $WHISPER_THREADS)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    REGISTRY.configure(
+        model=args.model,
+        device=args.device,
+        compute_type=args.compute_type,
+        backend=args.backend,
+        threads=args.threads,
+    )
+
     logger.info("Starting transcription server")
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
\ No newline at end of file
+    uvicorn.run(app, host=args.host, port=args.port, log_level="info")
\ No newline at end of file
@@ -0,0 +1,201 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EnergyVAD:
+    """Frame-level voice activity detector using RMS energy and zero-crossing rate.
+
+    The energy threshold follows an estimate of the room's noise floor, so a
+    steady hum or fan does not count as speech. Frames whose zero-crossing rate
+    is very high (hiss, clicks) need clearly more energy to qualify.
+    """
+
+    def __init__(self, sample_rate=16000, frame_ms=30, min_rms=0.006, noise_ratio=3.0, max_zcr=0.35):
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.min_rms = min_rms
+        self.noise_ratio = noise_ratio
+        self.max_zcr = max_zcr
+        self.noise_floor = min_rms / noise_ratio
+
+    def classify(self, frames):
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        zcr = np.count_nonzero(np.diff(np.signbit(frames), axis=1), axis=1) / frames.shape[1]
+        threshold = max(self.min_rms, self.noise_floor * self.noise_ratio)
+        speech = ((rms > threshold) & (zcr < self.max_zcr)) | (rms > threshold * 2)
+
+        # Track the noise floor on non-speech frames only
+        quiet = rms[~speech]
+        if quiet.size:
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * float(np.median(quiet))
+        return speech
+
+
+class WebRTCVAD:
+    """Wrapper around the optional `webrtcvad` package (GMM-based, CPU only)."""
+
+    def __init__(self, sample_rate=16000, frame_ms=30, aggressiveness=2):
+        try:
+            import webrtcvad
+        except ImportError:
+            raise ImportError("The webrtc VAD backend requires the 'webrtcvad' package")
+        if frame_ms not in (10, 20, 30):
+            raise ValueError("WebRTC VAD frames must be 10, 20 or 30 ms")
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.vad = webrtcvad.Vad(aggressiveness)
+
+    def classify(self, frames):
+        pcm = (np.clip(frames, -1.0, 1.0) * 32767).astype(np.int16)
+        return np.array([self.vad.is_speech(frame.tobytes(), self.sample_rate) for frame in pcm])
+
+
+class SileroVAD:
+    """Wrapper around the Silero VAD model loaded through torch.hub (CPU only)."""
+
+    def __init__(self, sample_rate=16000, threshold=0.5):
+        import torch
+
+        self.torch = torch
+        self.sample_rate = sample_rate
+        # Silero expects 512-sample frames at 16 kHz
+        self.frame_size = 512 if sample_rate == 16000 else 256
+        self.threshold = threshold
+        self.model, _ = torch.hub.load("snakers4/silero-vad", "silero_vad", trust_repo=True)
+        self.model.eval()
+
+    def classify(self, frames):
+        with self.torch.no_grad():
+            probs = [
+                float(self.model(self.torch.from_numpy(np.ascontiguousarray(frame)), self.sample_rate))
+                for frame in frames
+            ]
+        return np.array(probs) > self.threshold
+
+
+VAD_BACKENDS = {
+    "energy": EnergyVAD,
+    "webrtc": WebRTCVAD,
+    "silero": SileroVAD,
+}
+
+
+def make_vad(name="energy", sample_rate=16000):
+    if name not in VAD_BACKENDS:
+        raise ValueError(f"Unknown VAD backend '{name}', expected one of {sorted(VAD_BACKENDS)}")
+    return VAD_BACKENDS[name](sample_rate=sample_rate)
+
+
+def contains_speech(vad, audio, min_frames=3):
+    """True if `audio` holds at least `min_frames` speech frames."""
+    n_frames = len(audio) // vad.frame_size
+    if n_frames == 0:
+        return False
+    frames = audio[:n_frames * vad.frame_size].reshape(n_frames, vad.frame_size)
+    return int(np.count_nonzero(vad.classify(frames))) >= min_frames
+
+
+class SpeechSegmenter:
+    """Turns a stream of VAD frame decisions into whole utterances.
+
+    An utterance opens after `min_speech` seconds of consecutive speech and
+    closes once `hangover` seconds of non-speech follow it. `padding` seconds
+    of context are kept on both sides, and utterances longer than
+    `max_utterance` are split so they still fit one model window. Positions
+    are absolute sample offsets into an AudioRingBuffer.
+    """
+
+    def __init__(self, vad, sample_rate=16000, min_speech=0.25, hangover=0.5, padding=0.2, max_utterance=25.0):
+        if padding > hangover:
+            raise ValueError("VAD padding must not exceed the hangover")
+        self.vad = vad
+        self.frame_size = vad.frame_size
+        self.min_speech_frames = max(1, int(min_speech * sample_rate / self.frame_size))
+        self.hangover_frames = max(1, int(hangover * sample_rate / self.frame_size))
+        self.padding = int(padding * sample_rate)
+        self.max_utterance = int(max_utterance * sample_rate)
+        self.reset(0)
+
+    def reset(self, position):
+        self.position = position
+        self.triggered = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.candidate_start = position
+        self.utterance_start = position
+        self.last_speech_end = position
+        self.last_end = position
+        # Statistics
+        self.frames_total = 0
+        self.frames_speech = 0
+
+    def process(self, audio_buffer):
+        """Classify all new full frames and return finished (start, end) utterances."""
+        if self.position < audio_buffer.start_pos:
+            logger.warning(f"VAD fell behind, skipping {audio_buffer.start_pos - self.position} samples")
+            self.reset(audio_buffer.start_pos)
+        n_frames = (audio_buffer.write_pos - self.position) // self.frame_size
+        if n_frames <= 0:
+            return []
+        audio = audio_buffer.read(self.position, n_frames * self.frame_size)
+        flags = self.vad.classify(audio.reshape(n_frames, self.frame_size))
+        self.frames_total += n_frames
+        self.frames_speech += int(np.count_nonzero(flags))
+
+        utterances = []
+        for speech in flags:
+            frame_start = self.position
+            frame_end = frame_start + self.frame_size
+            self.position = frame_end
+            if not self.triggered:
+                if not speech:
+                    self.speech_run = 0
+                    continue
+                if self.speech_run == 0:
+                    self.candidate_start = frame_start
+                self.speech_run += 1
+                if self.speech_run >= self.min_speech_frames:
+                    self.triggered = True
+                    self.silence_run = 0
+                    self.utterance_start = max(self.candidate_start - self.padding, self.last_end, audio_buffer.start_pos)
+                    self.last_speech_end = frame_end
+                continue
+
+            if speech:
+                self.last_speech_end = frame_end
+                self.silence_run = 0
+            else:
+                self.silence_run += 1
+                if self.silence_run >= self.hangover_frames:
+                    utterances.append(self._close(min(self.last_speech_end + self.padding, frame_end)))
+                    continue
+            if frame_end - self.utterance_start >= self.max_utterance:
+                # Split overly long speech at exactly max_utterance; the next piece starts right there
+                split = self.utterance_start + self.max_utterance
+                utterances.append(self._close(split))
+                self.triggered = True
+                self.utterance_start = split
+                self.last_speech_end = frame_end
+        return utterances
+
+    def flush(self):
+        """Close the open utterance, if any, e.g. when recording stops."""
+        if not self.triggered:
+            return []
+        return [self._close(min(self.last_speech_end + self.padding, self.position))]
+
+    def speech_fraction(self):
+        return self.frames_speech / self.frames_total if self.frames_total else 0.0
+
+    def _close(self, end):
+        # Frames and padding do not line up with max_utterance; never hand out more than fits a window
+        end = min(end, self.utterance_start + self.max_utterance)
+        utterance = (self.utterance_start, end)
+        self.triggered = False
+        self.speech_run = 0
+        self.silence_run = 0
+        self.last_end = end
+        return utterance
@@ -0,0 +1,373 @@
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from inference_scheduler import INFERENCE_TIME, QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+# Longest window a slot can hold; Whisper never looks past 30 s
+MAX_WINDOW_SAMPLES = SAMPLE_RATE * 30
+# Consecutive crashes before becoming ready after which a worker is given up on
+MAX_STARTUP_CRASHES = 3
+
+
+class WorkerPoolBusy(RuntimeError):
+    pass
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+class WorkerPoolFailed(RuntimeError):
+    pass
+
+
+def _worker_main(index, shm_name, slots, slot_samples, cores, backend_config, requests, results):
+    # Runs in the child process: pin to our cores, load a model, decode jobs until told to stop
+    from model_registry import ModelRegistry
+
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    shm = SharedMemory(name=shm_name)
+    audio_slots = np.ndarray((slots, slot_samples), dtype=np.float32, buffer=shm.buf)
+    try:
+        registry = ModelRegistry(**backend_config, threads=len(cores) if cores else None)
+        registry.warm_up(sample_rate=SAMPLE_RATE)
+        decode = registry.decoder()
+    except Exception as e:
+        results.put(("failed", index, None, str(e)))
+        shm.close()
+        return
+    results.put(("ready", index, None, None))
+
+    stopping = False
+    while not stopping:
+        job = requests.get()
+        if job is None:
+            break
+        # Decode everything already queued for this worker as one batch
+        jobs = [job]
+        while len(jobs) < slots:
+            try:
+                job = requests.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                stopping = True
+                break
+            jobs.append(job)
+
+        audios = [audio_slots[slot, :length] for _, slot, length, _ in jobs]
+        try:
+            outputs = decode(audios, [prompt for _, _, _, prompt in jobs])
+        except Exception as e:
+            for job_id, _, _, _ in jobs:
+                results.put(("error", index, job_id, str(e)))
+            continue
+        for (job_id, _, _, _), output in zip(jobs, outputs):
+            results.put(("result", index, job_id, output))
+
+    del audio_slots
+    shm.close()
+
+
+class _Worker:
+    def __init__(self, index, cores, slots, slot_samples):
+        self.index = index
+        self.cores = cores
+        self.shm = SharedMemory(create=True, size=slots * slot_samples * np.dtype(np.float32).itemsize)
+        self.audio_slots = np.ndarray((slots, slot_samples), dtype=np.float32, buffer=self.shm.buf)
+        self.free_slots = list(range(slots))
+        self.in_flight = {}
+        self.process = None
+        self.requests = None
+        self.ready = False
+        self.failed = None
+        self.draining = False
+        self.restarts = 0
+        self.startup_crashes = 0
+        self.jobs_done = 0
+
+    def available(self):
+        return self.ready and not self.draining and bool(self.free_slots) and self.process.is_alive()
+
+
+class ProcessWorkerPool:
+    """Runs inference in N worker processes, each with its own model instance.
+
+    Audio windows are copied into per-worker shared-memory slots, so only a
+    small job descriptor crosses the process boundary. When every slot is
+    taken, `submit` waits for one to free up; once `max_pending` callers are
+    already waiting it raises WorkerPoolBusy so sessions can shed load
+    instead of queuing without bound. Crashed workers are respawned
+    automatically and `restart_worker` recycles one gracefully.
+    """
+
+    def __init__(self, num_workers, backend_config, slots_per_worker=2, max_pending=None,
+                 slot_samples=MAX_WINDOW_SAMPLES):
+        self.num_workers = int(num_workers)
+        self.backend_config = dict(backend_config)
+        self.slots_per_worker = int(slots_per_worker)
+        self.slot_samples = int(slot_samples)
+        self.max_pending = max_pending if max_pending is not None else self.num_workers * self.slots_per_worker * 4
+        self.workers = []
+        self._jobs = {}
+        self._job_ids = itertools.count()
+        self._waiting = 0
+        self._slot_freed = None
+        self._results = None
+        self._reader = None
+        self._monitor = None
+        self._loop = None
+        self._context = mp.get_context("spawn")
+        self._stopping = False
+
+    def _core_sets(self):
+        if hasattr(os, "sched_getaffinity"):
+            cores = sorted(os.sched_getaffinity(0))
+        else:
+            cores = list(range(os.cpu_count() or 1))
+        per_worker = max(1, len(cores) // self.num_workers)
+        return [
+            set(cores[(i * per_worker) % len(cores):(i * per_worker) % len(cores) + per_worker])
+            for i in range(self.num_workers)
+        ]
+
+    def start(self):
+        if self.workers:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._slot_freed = asyncio.Event()
+        self._results = self._context.Queue()
+        for index, cores in enumerate(self._core_sets()):
+            worker = _Worker(index, cores, self.slots_per_worker, self.slot_samples)
+            self.workers.append(worker)
+            self._spawn(worker)
+        self._reader = threading.Thread(target=self._read_results, name="worker-pool-results", daemon=True)
+        self._reader.start()
+        self._monitor = asyncio.create_task(self._watch_workers())
+        logger.info(f"Started {self.num_workers} inference worker processes")
+
+    def _spawn(self, worker):
+        worker.ready = False
+        worker.failed = None
+        worker.requests = self._context.Queue()
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(
+                worker.index,
+                worker.shm.name,
+                self.slots_per_worker,
+                self.slot_samples,
+                worker.cores,
+                self.backend_config,
+                worker.requests,
+                self._results,
+            ),
+            name=f"inference-worker-{worker.index}",
+            daemon=True,
+        )
+        worker.process.start()
+
+    def _read_results(self):
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            self._loop.call_soon_threadsafe(self._handle_result, *message)
+
+    def _handle_result(self, kind, index, job_id, payload):
+        if index >= len(self.workers):
+            return
+        worker = self.workers[index]
+        if kind == "ready":
+            worker.ready = True
+            worker.startup_crashes = 0
+            self._slot_freed.set()
+            logger.info(f"Inference worker {index} ready (pid {worker.process.pid}, cores {sorted(worker.cores)})")
+            return
+        if kind == "failed":
+            # Not respawned automatically: a bad model configuration would fail again
+            worker.failed = payload
+            logger.error(f"Inference worker {index} failed to start: {payload}")
+            # Wake waiters so they notice when no worker is left
+            self._slot_freed.set()
+            return
+
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            # Result of a job that was already failed when its worker was restarted
+            return
+        _, slot, future, dispatched = job
+        INFERENCE_TIME.observe(time.perf_counter() - dispatched, executor="workers")
+        self._release(worker, job_id, slot)
+        worker.jobs_done += 1
+        if future.done():
+            return
+        if kind == "result":
+            future.set_result(payload)
+        else:
+            future.set_exception(RuntimeError(payload))
+
+    def _release(self, worker, job_id, slot):
+        worker.in_flight.pop(job_id, None)
+        worker.free_slots.append(slot)
+        self._slot_freed.set()
+
+    def _check_failed(self):
+        # Failed workers are never restarted, so nothing would free a slot again
+        if all(worker.failed for worker in self.workers):
+            raise WorkerPoolFailed("Every inference worker has failed")
+
+    def _pick_worker(self):
+        candidates = [worker for worker in self.workers if worker.available()]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda worker: len(worker.free_slots))
+
+    @property
+    def busy(self):
+        return self._pick_worker() is None
+
+    @property
+    def queue_depth(self):
+        return self._waiting
+
+    async def submit(self, session_id, audio, prompt=None, model=None, mel=None):
+        # Workers serve the model they were started with and compute their own
+        # features; `model` and `mel` are accepted for interface parity with
+        # InferenceScheduler and ignored
+        if not self.workers:
+            raise RuntimeError("Inference worker pool is not running")
+        waiting_since = time.perf_counter()
+        worker = self._pick_worker()
+        if worker is None:
+            self._check_failed()
+            # Backpressure: wait for a free slot, but only up to max_pending waiters
+            if self._waiting >= self.max_pending:
+                raise WorkerPoolBusy("All inference workers are busy")
+            self._waiting += 1
+            try:
+                while (worker := self._pick_worker()) is None:
+                    self._slot_freed.clear()
+                    await self._slot_freed.wait()
+                    self._check_failed()
+            finally:
+                self._waiting -= 1
+
+        length = len(audio)
+        if length > self.slot_samples:
+            logger.warning(f"Window of {length} samples exceeds the worker slot, truncating")
+            audio = audio[-self.slot_samples:]
+            length = self.slot_samples
+
+        QUEUE_WAIT.observe(time.perf_counter() - waiting_since, executor="workers")
+        slot = worker.free_slots.pop()
+        worker.audio_slots[slot, :length] = audio
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        self._jobs[job_id] = (worker, slot, future, time.perf_counter())
+        worker.in_flight[job_id] = slot
+        worker.requests.put((job_id, slot, length, prompt))
+        return await future
+
+    def _fail_in_flight(self, worker, error):
+        for job_id, slot in list(worker.in_flight.items()):
+            job = self._jobs.pop(job_id, None)
+            self._release(worker, job_id, slot)
+            if job and not job[2].done():
+                job[2].set_exception(error)
+
+    async def _watch_workers(self):
+        while not self._stopping:
+            await asyncio.sleep(1.0)
+            for worker in self.workers:
+                if worker.draining or worker.failed or worker.process.is_alive():
+                    continue
+                self._fail_in_flight(worker, WorkerCrashed(f"Inference worker {worker.index} crashed"))
+                if not worker.ready:
+                    worker.startup_crashes += 1
+                    if worker.startup_crashes >= MAX_STARTUP_CRASHES:
+                        worker.failed = f"Crashed {worker.startup_crashes} times during startup"
+                        logger.error(f"Inference worker {worker.index} keeps crashing during startup, giving up")
+                        self._slot_freed.set()
+                        continue
+                logger.error(f"Inference worker {worker.index} exited with code {worker.process.exitcode}, restarting")
+                worker.restarts += 1
+                self._spawn(worker)
+
+    async def restart_worker(self, index, timeout=30.0):
+        """Stop routing to a worker, let its jobs finish, then replace the process."""
+        worker = self.workers[index]
+        worker.draining = True
+        try:
+            deadline = time.monotonic() + timeout
+            while worker.in_flight and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            worker.requests.put(None)
+            await asyncio.to_thread(worker.process.join, timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._fail_in_flight(worker, WorkerCrashed(f"Inference worker {index} was restarted"))
+            worker.restarts += 1
+            self._spawn(worker)
+        finally:
+            worker.draining = False
+        logger.info(f"Restarted inference worker {index}")
+
+    async def stop(self):
+        self._stopping = True
+        if self._monitor:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+        for worker in self.workers:
+            worker.requests.put(None)
+        for worker in self.workers:
+            await asyncio.to_thread(worker.process.join, 10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            self._fail_in_flight(worker, WorkerCrashed("Inference worker pool stopped"))
+            worker.audio_slots = None
+            worker.shm.close()
+            worker.shm.unlink()
+        if self._results:
+            self._results.put(None)
+        self.workers = []
+
+    def is_ready(self):
+        return bool(self.workers) and all(worker.ready for worker in self.workers)
+
+    def metrics(self):
+        return {
+            "workers": [
+                {
+                    "index": worker.index,
+                    "pid": worker.process.pid if worker.process else None,
+                    "alive": bool(worker.process and worker.process.is_alive()),
+                    "ready": worker.ready,
+                    "failed": worker.failed,
+                    "draining": worker.draining,
+                    "in_flight": len(worker.in_flight),
+                    "jobs_done": worker.jobs_done,
+                    "restarts": worker.restarts,
+                    "cores": sorted(worker.cores),
+                }
+                for worker in self.workers
+            ],
+            "queue_depth": self._waiting,
+            "max_pending": self.max_pending,
+        }